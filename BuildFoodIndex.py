@@ -0,0 +1,167 @@
+import argparse
+import csv
+import os
+import struct
+import sys
+import time
+
+import CatalogSync
+from fitfriend.catalog import trigrams
+
+""" --- Build the memory-mapped universal food index fitfriend.foods reads --- """
+
+DEFAULT_OUTPUT = os.path.join(CatalogSync.CATALOG_DIRECTORY, 'foods.idx')
+
+MAGIC = b'FFDX'
+FORMAT_VERSION = 3
+# magic, format version, reserved, food count, offset of the name blob
+HEADER = struct.Struct('<4sHHII')
+# trigram count, offset of the trigram table
+TRIGRAM_HEADER = struct.Struct('<II')
+# name offset in the blob, name length, serving grams, calorie, protein, carbohydrate, fat, fiber, sugar, sodium
+RECORD = struct.Struct('<IHHHHHHHHH')
+# trigram in UTF-8 padded with NULs, offset of its postings, posting count. The table is sorted by trigram and each
+# posting is the position of a record whose name holds it, so "did you mean" reads the postings it needs in place.
+# Three characters of at most four UTF-8 bytes each.
+TRIGRAM_BYTES = 12
+TRIGRAM = struct.Struct('<{}sII'.format(TRIGRAM_BYTES))
+POSTING = struct.Struct('<I')
+MAX_VALUE = 0xFFFF
+
+# Source columns for (name, serving grams, calorie, protein, carbohydrate, fat), then the optional columns for
+# (fiber, sugar, sodium in mg). A serving column of None means the dataset reports every nutrient per 100 g, and a
+# missing or blank optional column reads as zero.
+PRESETS = {
+    'fitfriend': {'delimiter': ',', 'columns': ['FoodName', 'Serving', 'Calorie', 'Protein', 'Carbohydrate', 'Fat'],
+                  'optional': ['Fiber', 'Sugar', 'Sodium']},
+    'openfoodfacts': {'delimiter': '\t', 'columns': ['product_name', None, 'energy-kcal_100g', 'proteins_100g',
+                                                     'carbohydrates_100g', 'fat_100g'],
+                      'optional': ['fiber_100g', 'sugars_100g', 'sodium_100g'], 'sodium_grams': True},
+    'usda': {'delimiter': ',', 'columns': ['description', None, 'Energy (KCAL)', 'Protein (G)',
+                                           'Carbohydrate, by difference (G)', 'Total lipid (fat) (G)'],
+             'optional': ['Fiber, total dietary (G)', 'Sugars, total including NLEA (G)', 'Sodium, Na (MG)']},
+}
+MICRONUTRIENTS = ['Fiber', 'Sugar', 'Sodium']
+
+
+def to_amount(value, scale=1):
+    amount = float(str(value).replace(',', '').strip()) * scale
+    if amount < 0 or amount != amount:
+        raise ValueError(value)
+    return int(round(amount))
+
+
+def to_optional_amount(value, scale=1):
+    if value is None or not str(value).strip():
+        return 0
+    return to_amount(value, scale)
+
+
+def read_dataset(path, preset):
+    """
+    Yield (name, serving, calorie, protein, carbohydrate, fat, fiber, sugar, sodium) for every usable row of a
+    nutrition dataset.
+    """
+
+    csv.field_size_limit(sys.maxsize)
+    name_column, serving_column, calorie, protein, carbohydrate, fat = preset['columns']
+    fiber, sugar, sodium = preset['optional']
+    # Open Food Facts reports sodium in grams, the index stores milligrams.
+    sodium_scale = 1000 if preset.get('sodium_grams') else 1
+    with open(path, newline='', encoding='utf-8', errors='replace') as dataset:
+        for row in csv.DictReader(dataset, delimiter=preset['delimiter']):
+            name = ' '.join((row.get(name_column) or '').lower().split())
+            if not name:
+                continue
+            try:
+                serving = to_amount(row[serving_column]) if serving_column else 100
+                values = [to_amount(row[column]) for column in (calorie, protein, carbohydrate, fat)]
+                values += [to_optional_amount(row.get(fiber)), to_optional_amount(row.get(sugar)),
+                           to_optional_amount(row.get(sodium), sodium_scale)]
+            except (KeyError, TypeError, ValueError):
+                continue
+            if serving == 0 or max([serving] + values) > MAX_VALUE:
+                continue
+            yield tuple([name, serving] + values)
+
+
+def catalog_foods(directory):
+    for name, item in CatalogSync.load_catalog('foods', directory)[1].items():
+        yield (name, int(item['Serving']), int(item['Calorie']), int(item['Protein']), int(item['Carbohydrate']),
+               int(item['Fat'])) + tuple(int(item.get(nutrient, 0)) for nutrient in MICRONUTRIENTS)
+
+
+def trigram_postings(names):
+    """
+    Map every trigram, as the padded UTF-8 key the index sorts by, to the positions of the names holding it.
+    """
+
+    postings = {}
+    for position, name in enumerate(names):
+        for gram in trigrams(name.decode('utf-8')):
+            postings.setdefault(gram.encode('utf-8').ljust(TRIGRAM_BYTES, b'\0'), []).append(position)
+    return postings
+
+
+def write_index(foods, path):
+    """
+    Write the foods sorted by UTF-8 name, keeping the first entry for every name, followed by the trigram postings
+    of their names. Returns the number written.
+    """
+
+    unique = {}
+    for food in foods:
+        key = food[0].encode('utf-8')
+        if key not in unique and len(key) <= MAX_VALUE:
+            unique[key] = food[1:]
+    names = sorted(unique)
+    postings = trigram_postings(names)
+    grams = sorted(postings)
+    names_offset = HEADER.size + TRIGRAM_HEADER.size + RECORD.size * len(names)
+    trigrams_offset = names_offset + sum(len(name) for name in names)
+    with open(path + '.tmp', 'wb') as index_file:
+        index_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(names), names_offset))
+        index_file.write(TRIGRAM_HEADER.pack(len(grams), trigrams_offset))
+        offset = 0
+        for name in names:
+            index_file.write(RECORD.pack(offset, len(name), *unique[name]))
+            offset += len(name)
+        for name in names:
+            index_file.write(name)
+        offset = trigrams_offset + TRIGRAM.size * len(grams)
+        for gram in grams:
+            index_file.write(TRIGRAM.pack(gram, offset, len(postings[gram])))
+            offset += POSTING.size * len(postings[gram])
+        for gram in grams:
+            index_file.write(struct.pack('<{}I'.format(len(postings[gram])), *postings[gram]))
+    os.replace(path + '.tmp', path)
+    return len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the memory-mapped universal food index from nutrition data.')
+    parser.add_argument('datasets', nargs='*', help='CSV or TSV nutrition datasets to include')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='fitfriend', help='dataset column layout')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--catalog-directory', default=CatalogSync.CATALOG_DIRECTORY)
+    parser.add_argument('--no-catalog', action='store_true', help='leave out catalog/foods.json')
+    args = parser.parse_args()
+
+    started = time.time()
+
+    def foods():
+        # Catalog foods come first so they win over dataset rows with the same name.
+        if not args.no_catalog:
+            for food in catalog_foods(args.catalog_directory):
+                yield food
+        for path in args.datasets:
+            for food in read_dataset(path, PRESETS[args.preset]):
+                yield food
+
+    count = write_index(foods(), args.output)
+    print('{} foods written to {} ({} bytes) in {:.1f}s'.format(count, args.output, os.path.getsize(args.output),
+                                                               time.time() - started))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+from fitfriend import CATALOG_DIRECTORY
+from fitfriend.catalog import BLOOM_HEADER, BLOOM_MAGIC
+from fitfriend.muscle_groups import MUSCLE_GROUP_INDEX
+
+""" --- Idempotent sync of the 'universal' food and exercise catalog from versioned data files --- """
+
+# kind: (table, name attribute, data file, required attributes)
+CATALOGS = {
+    'exercises': ('Exercises', 'ExerciseName', 'exercises.json', ['MuscleGroup', 'HowTo']),
+    'foods': ('Foods', 'FoodName', 'foods.json', ['Serving', 'Calorie', 'Protein', 'Carbohydrate', 'Fat']),
+}
+
+# The version stamp lives outside the 'universal' partition so the hooks never see it as a food or exercise.
+VERSION_OWNER = 'catalog'
+VERSION_NAME = 'version'
+
+# The stamp also carries a Bloom filter of every universal name, so the hooks can skip the universal get_item for
+# names that are definitely not in the catalog. BLOOM_MAGIC and BLOOM_HEADER are the format the hooks read.
+BLOOM_FORMAT_VERSION = 1
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+# Leaves room for the stamp's other attributes under DynamoDB's 400 KB item limit.
+BLOOM_MAX_BYTES = 350 * 1024
+
+# Spoken variants of universal exercise names. The hooks read this file directly, it is never synced to DynamoDB.
+ALIASES_FILE = 'exercise_aliases.json'
+
+
+class CatalogError(Exception):
+    pass
+
+
+def load_catalog(kind, directory=CATALOG_DIRECTORY):
+    """
+    Read and validate one catalog data file, returning (version, {name: item}).
+    """
+
+    table_name, name_key, file_name, required = CATALOGS[kind]
+    path = os.path.join(directory, file_name)
+    with open(path) as data_file:
+        data = json.load(data_file)
+    if not isinstance(data.get('version'), int):
+        raise CatalogError('{} needs an integer "version"'.format(path))
+    items = {}
+    for item in data['items']:
+        name = item.get(name_key)
+        if not name or name != name.lower().strip():
+            raise CatalogError('{}: {} must be lowercase and trimmed, got {!r}'.format(path, name_key, name))
+        if name in items:
+            raise CatalogError('{}: {} is listed twice'.format(path, name))
+        missing = [attribute for attribute in required if attribute not in item]
+        if missing:
+            raise CatalogError('{}: {} is missing {}'.format(path, name, ', '.join(missing)))
+        if any(not isinstance(value, str) for value in item.values()):
+            raise CatalogError('{}: every attribute of {} must be a string'.format(path, name))
+        items[name] = item
+    return data['version'], items
+
+
+def load_aliases(directory=CATALOG_DIRECTORY):
+    """
+    Read and validate the exercise alias table, returning {alias: canonical ExerciseName}.
+    """
+
+    path = os.path.join(directory, ALIASES_FILE)
+    with open(path) as data_file:
+        data = json.load(data_file)
+    exercise_names = load_catalog('exercises', directory)[1]
+    aliases = {}
+    for canonical, variants in data['aliases'].items():
+        if canonical not in exercise_names:
+            raise CatalogError('{}: {} is not a universal exercise'.format(path, canonical))
+        for variant in variants:
+            if variant != ' '.join(variant.lower().split()):
+                raise CatalogError('{}: alias must be lowercase and trimmed, got {!r}'.format(path, variant))
+            if variant in exercise_names or variant in aliases:
+                raise CatalogError('{}: {} is already an exercise or an alias'.format(path, variant))
+            aliases[variant] = canonical
+    return aliases
+
+
+def catalog_digest(items):
+    canonical = json.dumps([items[name] for name in sorted(items)], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def bloom_positions(name, hash_count, bit_count):
+    digest = hashlib.blake2b(name.encode('utf-8'), digest_size=16).digest()
+    first = int.from_bytes(digest[:8], 'little')
+    step = int.from_bytes(digest[8:], 'little') | 1
+    return [(first + index * step) % bit_count for index in range(hash_count)]
+
+
+def build_bloom(names, false_positive_rate=BLOOM_FALSE_POSITIVE_RATE):
+    """
+    Pack a Bloom filter of the names sized for false_positive_rate, or return None when it would not fit in the
+    version stamp.
+    """
+
+    count = max(1, len(names))
+    bit_count = int(math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2 / 8)) * 8
+    if bit_count // 8 > BLOOM_MAX_BYTES:
+        return None
+    hash_count = max(1, int(round(bit_count / count * math.log(2))))
+    bits = bytearray(bit_count // 8)
+    for name in names:
+        for position in bloom_positions(name, hash_count, bit_count):
+            bits[position >> 3] |= 1 << (position & 7)
+    return BLOOM_HEADER.pack(BLOOM_MAGIC, BLOOM_FORMAT_VERSION, hash_count, 0, bit_count) + bytes(bits)
+
+
+def get_version(table, name_key):
+    response = table.get_item(
+        Key={
+            'UserID': VERSION_OWNER,
+            name_key: VERSION_NAME
+        }
+    )
+    return response.get('Item')
+
+
+def read_universal(table, name_key):
+    items = {}
+    kwargs = {'KeyConditionExpression': Key('UserID').eq('universal')}
+    while True:
+        response = table.query(**kwargs)
+        for item in response['Items']:
+            item = dict(item)
+            item.pop('UserID')
+            items[item[name_key]] = item
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def diff_catalog(current, desired, prune):
+    puts = [desired[name] for name in sorted(desired) if current.get(name) != desired[name]]
+    deletes = sorted(name for name in current if name not in desired) if prune else []
+    return puts, deletes
+
+
+def write_batch(table, name_key, puts, deletes):
+    with table.batch_writer() as batch:
+        for item in puts:
+            batch.put_item(Item=dict(item, UserID='universal'))
+        for name in deletes:
+            batch.delete_item(Key={'UserID': 'universal', name_key: name})
+    return len(puts) + len(deletes)
+
+
+def write_changes(table, name_key, puts, deletes, workers=8, batch_size=500):
+    """
+    Split the changes into batch_size slices and flush each slice through its own batch_writer on a worker thread.
+    """
+
+    slices = [(puts[start:start + batch_size], []) for start in range(0, len(puts), batch_size)]
+    slices += [([], deletes[start:start + batch_size]) for start in range(0, len(deletes), batch_size)]
+    if not slices:
+        return 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(slices)))) as executor:
+        return sum(executor.map(lambda changes: write_batch(table, name_key, *changes), slices))
+
+
+def sync_catalog(dynamodb, kind, directory=CATALOG_DIRECTORY, workers=8, prune=False, force=False, dry_run=False):
+    """
+    Bring the 'universal' partition of one catalog in line with its data file and stamp the file's version.
+    Re-running against an up-to-date table costs one read.
+    """
+
+    table_name, name_key, _, _ = CATALOGS[kind]
+    table = dynamodb.Table(table_name)
+    version, desired = load_catalog(kind, directory)
+    digest = catalog_digest(desired)
+    bloom = build_bloom(desired)
+    stamp = get_version(table, name_key)
+    result = {'catalog': kind, 'version': version, 'items': len(desired), 'puts': 0, 'deletes': 0, 'changed': False}
+    if stamp is not None:
+        if int(stamp['Version']) > version and not force:
+            raise CatalogError('{} catalog in {} is at version {}, newer than the data file\'s {}'.format(
+                kind, table_name, stamp['Version'], version))
+        if int(stamp['Version']) == version and stamp['Digest'] == digest and ('Bloom' in stamp or bloom is None) \
+                and not prune and not force:
+            return result
+        if int(stamp['Version']) == version and stamp['Digest'] != digest and not force:
+            raise CatalogError('{} catalog changed without a version bump; raise "version" above {}'.format(
+                kind, version))
+
+    puts, deletes = diff_catalog(read_universal(table, name_key), desired, prune)
+    result.update(puts=len(puts), deletes=len(deletes))
+    if dry_run:
+        result['names'] = [item[name_key] for item in puts] + deletes
+        return result
+    write_changes(table, name_key, puts, deletes, workers)
+    if puts or deletes or stamp is None or stamp['Digest'] != digest or int(stamp['Version']) != version or \
+            ('Bloom' not in stamp and bloom is not None):
+        # Hooks reload the filter every CATALOG_CACHE_SECONDS, so names added here can read as unknown until then.
+        stamp = {
+            'UserID': VERSION_OWNER,
+            name_key: VERSION_NAME,
+            'Version': version,
+            'Digest': digest,
+            'Items': len(desired),
+            'SyncedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        }
+        if bloom is not None:
+            stamp['Bloom'] = bloom
+        table.put_item(Item=stamp)
+        result['changed'] = True
+    return result
+
+
+def create_muscle_group_index(dynamodb):
+    """
+    Add the (UserID, MuscleGroup) index to the Exercises table unless it already exists. DynamoDB backfills it in
+    the background; returns False when there was nothing to do.
+    """
+
+    table = dynamodb.Table(CATALOGS['exercises'][0])
+    if any(index['IndexName'] == MUSCLE_GROUP_INDEX for index in table.global_secondary_indexes or []):
+        return False
+    index = {
+        'IndexName': MUSCLE_GROUP_INDEX,
+        'KeySchema': [
+            {'AttributeName': 'UserID', 'KeyType': 'HASH'},
+            {'AttributeName': 'MuscleGroup', 'KeyType': 'RANGE'}
+        ],
+        'Projection': {'ProjectionType': 'KEYS_ONLY'}
+    }
+    if (table.billing_mode_summary or {}).get('BillingMode') != 'PAY_PER_REQUEST':
+        index['ProvisionedThroughput'] = {
+            'ReadCapacityUnits': table.provisioned_throughput['ReadCapacityUnits'],
+            'WriteCapacityUnits': table.provisioned_throughput['WriteCapacityUnits']
+        }
+    dynamodb.meta.client.update_table(
+        TableName=table.name,
+        AttributeDefinitions=[
+            {'AttributeName': 'UserID', 'AttributeType': 'S'},
+            {'AttributeName': 'MuscleGroup', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexUpdates=[{'Create': index}]
+    )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync the universal food and exercise catalog from data files.')
+    parser.add_argument('--catalog', choices=sorted(CATALOGS) + ['all'], default='all')
+    parser.add_argument('--directory', default=CATALOG_DIRECTORY, help='folder holding the catalog data files')
+    parser.add_argument('--workers', type=int, default=8, help='parallel batch writers')
+    parser.add_argument('--prune', action='store_true', help='delete universal items missing from the data file')
+    parser.add_argument('--force', action='store_true', help='sync even when the table holds a newer version')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would change')
+    parser.add_argument('--create-indexes', action='store_true', help='add the Exercises MuscleGroupIndex if missing')
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    if args.create_indexes:
+        print('{} {}'.format(MUSCLE_GROUP_INDEX, 'is being created' if create_muscle_group_index(dynamodb) else
+                             'already exists'))
+    kinds = sorted(CATALOGS) if args.catalog == 'all' else [args.catalog]
+    if 'exercises' in kinds:
+        try:
+            print('{} exercise aliases checked'.format(len(load_aliases(args.directory))))
+        except CatalogError as e:
+            print(e)
+            sys.exit(1)
+    for kind in kinds:
+        started = time.time()
+        try:
+            result = sync_catalog(dynamodb, kind, args.directory, args.workers, args.prune, args.force, args.dry_run)
+        except CatalogError as e:
+            print(e)
+            sys.exit(1)
+        print('{}: version {}, {} items, {} written, {} deleted{} in {:.2f}s'.format(
+            kind, result['version'], result['items'], result['puts'], result['deletes'],
+            ' (dry run)' if args.dry_run else '' if result['changed'] else ' (already up to date)',
+            time.time() - started))
+        for name in result.get('names', []):
+            print('  ' + name)
+
+
+if __name__ == '__main__':
+    main()
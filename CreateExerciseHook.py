@@ -1,11 +1,9 @@
-import boto3
 import time
 import os
 import logging
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-exercises = dynamodb.Table('Exercises')
-users = dynamodb.Table('Users')
+from fitfriend.tables import emit_invocation_metrics, exercises, start_invocation_metrics, users
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -110,12 +108,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -261,9 +254,12 @@ def create_exercise(intent_request):
         Item={
             "UserID": intent_request['userId'],
             "ExerciseName": exercise_name,
-            "MuscleGroup": muscle_group
+            # Lowercase so the MuscleGroupIndex range key matches the catalog's values.
+            "MuscleGroup": muscle_group.lower()
         }
     )
+    # Tells the lookup hooks in this session that their cached misses for this user are stale.
+    session_attributes['catalogUpdatedAt'] = str(time.time())
     if try_ex(lambda: session_attributes['chainRecordWeightLift']):
         try_ex(lambda: session_attributes.pop('chainRecordWeightLift'))
         return confirm_intent(
@@ -302,7 +298,7 @@ def create_exercise(intent_request):
             }
         )
     else:
-        return close(intent_request['sessionAttributes'],
+        return close(session_attributes,
                      'Fulfilled',
                      {'contentType': 'PlainText',
                       'content': 'Got it! {} has been added to your exercises'.format(exercise_name)})
@@ -340,5 +336,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
@@ -1,11 +1,15 @@
-import boto3
 import time
 import os
 import logging
+from fractions import Fraction
+
+from fitfriend.foods import get_food_items, get_indexed_food
+from fitfriend.meals import (assemble_meal, calculate_nutrition, generate_meal_string, generate_nutrition_string,
+                             meal_food_names, parse_meal, unit_table)
+from fitfriend.model import CORE_NUTRIENTS, NUTRIENTS, Food, NutritionVector, to_number
+from fitfriend.tables import emit_invocation_metrics, foods, start_invocation_metrics, users
+from fitfriend.text import generate_list_string
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-foods = dynamodb.Table('Foods')
-users = dynamodb.Table('Users')
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -110,12 +114,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -159,12 +158,206 @@ def build_validation_result(is_valid, violated_slot, message_content):
 
 
 def validate_create_food(food_name, serving, calorie, protein, carbohydrate, fat):
+    # RecordMeal finds a universal index food before the user's own, so a user food of that name would never be used.
+    if food_name is not None and get_indexed_food(' '.join(food_name.lower().split())) is not None:
+        return build_validation_result(False, 'FoodName', 'There is already a food called {}, so you can log it '
+                                                          'right away. What else would you like to call '
+                                                          'yours?'.format(food_name))
+    return build_validation_result(True, None, None)
+
+
+""" --- Recipes --- """
+
+RECIPE_MAX_INGREDIENTS = 10
+RECIPE_MAX_SERVINGS = 100
+
+
+def build_recipe(recipe_name, entries, servings, ingredient_foods, owner):
+    """
+    Return the recipe's Foods row. Serving and the nutrients describe one serving, so RecordMeal logs a recipe like
+    any other food; Ingredients and Servings are kept to recompute it when an ingredient changes.
+    """
+
+    total, grams = NutritionVector(), 0
+    for entry in entries:
+        food = ingredient_foods[entry['FoodName']]
+        total = total + calculate_nutrition(food, entry['Measurement'], entry['MeasurementType'])
+        grams += unit_table.to_grams(food, to_number(entry['Measurement']), entry['MeasurementType'])
+    item = Food(recipe_name, max(int(round(grams / servings)), 1), total.scaled(Fraction(1, servings))).to_item(owner)
+    item['Servings'] = servings
+    item['Ingredients'] = [{'FoodName': entry['FoodName'], 'Measurement': entry['Measurement'],
+                            'MeasurementType': entry['MeasurementType']} for entry in entries]
+    return item
+
+
+def recipe_dependents(recipe_index, food_name):
+    """
+    Every recipe that uses food_name, directly or through another recipe.
+    """
+
+    dependents, pending = [], [food_name]
+    while pending:
+        for recipe_name in recipe_index.get(pending.pop(), []):
+            if recipe_name not in dependents:
+                dependents.append(recipe_name)
+                pending.append(recipe_name)
+    return dependents
+
+
+def index_recipe(recipe_index, recipe_name, ingredient_names):
+    """
+    Return the user's recipeIndex, which maps each ingredient to the recipes using it, with recipe_name listed
+    under exactly its current ingredients.
+    """
+
+    index = {}
+    for ingredient, recipe_names in recipe_index.items():
+        index[ingredient] = set(recipe_names) - {recipe_name}
+    for ingredient in ingredient_names:
+        index.setdefault(ingredient, set()).add(recipe_name)
+    return {ingredient: sorted(recipe_names) for ingredient, recipe_names in index.items() if recipe_names}
+
+
+def store_recipe_index(recipe_index, user, intent_request):
+    users.update_item(
+        Key={
+            'user': intent_request['userId']
+        },
+        UpdateExpression="set recipeIndex = :r",
+        ExpressionAttributeValues={
+            ':r': recipe_index
+        },
+    )
+    user['Item']['recipeIndex'] = recipe_index
+
+
+def refresh_recipes(food_name, food, user, intent_request):
+    """
+    Recompute the stored nutrition of every recipe that depends on food_name, which has just changed to food, each
+    recipe after the recipes it is made from. Returns the names of the recipes rewritten.
+    """
+
+    dependents = recipe_dependents(user['Item'].get('recipeIndex', {}), food_name)
+    if not dependents:
+        return []
+    items = get_food_items(dependents + [food_name], intent_request)
+    if food_name in items and items[food_name]['UserID'] == 'universal':
+        # The universal food shadows the user's, so the recipes never used the changed row.
+        return []
+    recipes = {name: items[name] for name in dependents
+               if name in items and items[name]['UserID'] != 'universal' and 'Ingredients' in items[name]}
+    ingredient_names = set(ingredient['FoodName']
+                           for recipe in recipes.values() for ingredient in recipe['Ingredients'])
+    ingredient_foods = {name: Food.from_item(item) for name, item in get_food_items(
+        [name for name in ingredient_names if name not in recipes and name != food_name], intent_request).items()}
+    ingredient_foods[food_name] = food
+    refreshed = []
+
+    def refresh(recipe_name):
+        recipe = recipes.pop(recipe_name)
+        for ingredient in recipe['Ingredients']:
+            if ingredient['FoodName'] in recipes:
+                refresh(ingredient['FoodName'])
+        if any(ingredient['FoodName'] not in ingredient_foods for ingredient in recipe['Ingredients']):
+            return
+        item = build_recipe(recipe_name, recipe['Ingredients'], int(recipe['Servings']), ingredient_foods,
+                            intent_request['userId'])
+        foods.put_item(Item=item)
+        ingredient_foods[recipe_name] = Food.from_item(item)
+        refreshed.append(recipe_name)
+
+    for recipe_name in dependents:
+        if recipe_name in recipes:
+            refresh(recipe_name)
+    return refreshed
+
+
+def forget_recent_foods(names, user, intent_request):
+    """
+    Drop changed foods from the user's recentFoods, which RecordMealHook answers lookups from, so their next use
+    resolves the new row. Costs one update_item, and only when one of them is there.
+    """
+
+    recent_items = user['Item'].get('recentFoods', [])
+    kept = [item for item in recent_items if item['FoodName'] not in names]
+    if len(kept) == len(recent_items):
+        return
+    users.update_item(
+        Key={
+            'user': intent_request['userId']
+        },
+        UpdateExpression="set recentFoods = :r",
+        ExpressionAttributeValues={
+            ':r': kept
+        },
+    )
+    user['Item']['recentFoods'] = kept
+
+
+def generate_refreshed_string(refreshed):
+    if not refreshed:
+        return ''
+    return ' I also updated {}, which {} it.'.format(generate_list_string(refreshed),
+                                                     'uses' if len(refreshed) == 1 else 'use')
+
+
+def validate_create_recipe(recipe_name, recipe_item, parts, entries, unknown_foods, servings, recipe_index):
+    if recipe_name is not None and recipe_item is not None and recipe_item['UserID'] == 'universal':
+        return build_validation_result(False, 'RecipeName', 'There is already a food called {}. What else would you '
+                                                            'like to call your recipe?'.format(recipe_name))
+    if parts is not None:
+        if not parts:
+            return build_validation_result(False, 'Ingredients', 'Sorry, what goes into it? You can list several '
+                                                                 'foods, like "1.5 cups of rice and 2 eggs".')
+        if len(parts) > RECIPE_MAX_INGREDIENTS:
+            return build_validation_result(False, 'Ingredients', 'Please keep it to at most {} '
+                                                                 'ingredients.'.format(RECIPE_MAX_INGREDIENTS))
+        if unknown_foods:
+            pronoun = 'it' if len(unknown_foods) == 1 else 'them'
+            return build_validation_result(False, 'Ingredients', 'I don\'t know {}. Please add {} as a food first, '
+                                                                 'or tell me the ingredients without {}.'.format(
+                generate_list_string(unknown_foods), pronoun, pronoun))
+        if recipe_name is not None:
+            names = set(entry['FoodName'] for entry in entries)
+            if names & set(recipe_dependents(recipe_index, recipe_name) + [recipe_name]):
+                return build_validation_result(False, 'Ingredients', 'A recipe can\'t be made from itself. What '
+                                                                     'goes into {}?'.format(recipe_name))
+    if servings is not None:
+        if not servings.isdigit() or not 1 <= int(servings) <= RECIPE_MAX_SERVINGS:
+            return build_validation_result(False, 'Servings', 'How many servings does it make? Please say a whole '
+                                                              'number from 1 to {}.'.format(RECIPE_MAX_SERVINGS))
     return build_validation_result(True, None, None)
 
 
 """ --- Functions that control the bot's behavior --- """
 
 
+def start_new_day(user, intent_request, session_attributes):
+    """
+    Create today's record, returning the GiveExcuse prompt when yesterday's workout was left unfinished.
+    """
+
+    exercises_remaining = get_previous_exercises_remaining(user)
+    create_new_day(user, intent_request)
+    if not len(exercises_remaining) == 0 and not exercises_remaining[0] == 'rest':
+        session_attributes['workoutViolationDate'] = \
+            sorted(list(user['Item']['dailyNutrientsAndWorkouts'].keys()))[-1]
+        return confirm_intent(
+            session_attributes,
+            "GiveExcuse",
+            {
+                'Excuse': None,
+                'Violation': 'workout'
+            },
+            {
+                'contentType': 'PlainText',
+                'content': 'Do you have a valid excuse for why you didn\'t finish your workout yesterday? {}'.format(
+                    generate_previous_exercises_remaining_string(exercises_remaining))
+            }
+        )
+    return None
+
+
 def create_food(intent_request):
     food_name = get_slots(intent_request)["FoodName"]
     serving = get_slots(intent_request)["Serving"]
@@ -186,24 +379,9 @@ def create_food(intent_request):
                              'content': "Glad to see you're so eager! Say \'hey fitfriend\' to get started!"
                          })
         if is_new_day(user):
-            exercises_remaining = get_previous_exercises_remaining(user)
-            create_new_day(user, intent_request)
-            if not len(exercises_remaining) == 0 and not exercises_remaining[0] == 'rest':
-                session_attributes['workoutViolationDate'] = \
-                    sorted(list(user['Item']['dailyNutrientsAndWorkouts'].keys()))[-1]
-                return confirm_intent(
-                    session_attributes,
-                    "GiveExcuse",
-                    {
-                        'Excuse': None,
-                        'Violation': 'workout'
-                    },
-                    {
-                        'contentType': 'PlainText',
-                        'content': 'Do you have a valid excuse for why you didn\'t finish your workout yesterday? {}'.format(
-                            generate_previous_exercises_remaining_string(exercises_remaining))
-                    }
-                )
+            response = start_new_day(user, intent_request, session_attributes)
+            if response is not None:
+                return response
         slots = get_slots(intent_request)
         validation_result = validate_create_food(food_name, serving, calorie, protein, carbohydrate, fat)
         if not validation_result['isValid']:
@@ -253,17 +431,19 @@ def create_food(intent_request):
 
         return delegate(session_attributes, get_slots(intent_request))
 
+    # Fiber, Sugar and Sodium are optional slots that are never elicited.
+    micronutrients = [to_number(try_ex(lambda: get_slots(intent_request)[nutrient.capitalize()]) or 0)
+                      for nutrient in NUTRIENTS[len(CORE_NUTRIENTS):]]
+    food = Food(food_name, to_number(serving), NutritionVector(to_number(calorie), to_number(protein),
+                                                               to_number(carbohydrate), to_number(fat),
+                                                               *micronutrients))
     foods.put_item(
-        Item={
-            "UserID": intent_request['userId'],
-            "FoodName": food_name,
-            "Serving": serving,
-            "Calorie": calorie,
-            "Protein": protein,
-            "Carbohydrate": carbohydrate,
-            "Fat": fat
-        }
+        Item=food.to_item(intent_request['userId'])
     )
+    refreshed = refresh_recipes(food_name.lower(), food, user, intent_request)
+    forget_recent_foods([food_name.lower()] + refreshed, user, intent_request)
+    # Tells the lookup hooks in this session that their cached misses for this user are stale.
+    session_attributes['catalogUpdatedAt'] = str(time.time())
     try_ex(lambda: session_attributes.pop('chainCreateFood'))
     if try_ex(lambda: session_attributes['chainRecordMeal']):
         try_ex(lambda: session_attributes.pop('chainRecordMeal'))
@@ -277,15 +457,83 @@ def create_food(intent_request):
             },
             {
                 'contentType': 'PlainText',
-                'content': 'Got it! {} has been added to your foods. Would you like to finish inputting your '
-                           'meal?'.format(food_name)
+                'content': 'Got it! {} has been added to your foods.{} Would you like to finish inputting your '
+                           'meal?'.format(food_name, generate_refreshed_string(refreshed))
             }
         )
     else:
-        return close(intent_request['sessionAttributes'],
+        return close(session_attributes,
                      'Fulfilled',
                      {'contentType': 'PlainText',
-                      'content': 'Got it! {} has been added to your foods'.format(food_name)})
+                      'content': 'Got it! {} has been added to your foods.{}'.format(
+                          food_name, generate_refreshed_string(refreshed))})
+
+
+def create_recipe(intent_request):
+    recipe_name = get_slots(intent_request)['RecipeName']
+    ingredients = get_slots(intent_request)['Ingredients']
+    servings = get_slots(intent_request)['Servings']
+    user = get_user(intent_request)
+    source = intent_request['invocationSource']
+    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    if recipe_name is not None:
+        recipe_name = ' '.join(recipe_name.lower().split())
+
+    if source == 'DialogCodeHook':
+        if not is_valid_user(user):
+            return close(intent_request['sessionAttributes'],
+                         'Fulfilled',
+                         {
+                             'contentType': 'PlainText',
+                             'content': "Glad to see you're so eager! Say \'hey fitfriend\' to get started!"
+                         })
+        if is_new_day(user):
+            response = start_new_day(user, intent_request, session_attributes)
+            if response is not None:
+                return response
+        slots = get_slots(intent_request)
+        parts = parse_meal(ingredients) if ingredients is not None else None
+        names = [recipe_name] if recipe_name is not None else []
+        if parts and len(parts) <= RECIPE_MAX_INGREDIENTS:
+            names += meal_food_names(parts)
+        entries, unknown_foods, items = [], [], {}
+        if names:
+            # The recipe name and every ingredient share one BatchGetItem.
+            items = get_food_items(names, intent_request)
+        if parts and len(parts) <= RECIPE_MAX_INGREDIENTS:
+            entries = assemble_meal(parts, items)
+            unknown_foods = [entry['FoodName'] for entry in entries if entry['FoodName'] not in items]
+        validation_result = validate_create_recipe(recipe_name, items.get(recipe_name), parts, entries, unknown_foods,
+                                                   servings, user['Item'].get('recipeIndex', {}))
+        if not validation_result['isValid']:
+            slots[validation_result['violatedSlot']] = None
+            return elicit_slot(session_attributes,
+                               intent_request['currentIntent']['name'],
+                               slots,
+                               validation_result['violatedSlot'],
+                               validation_result['message'])
+        return delegate(session_attributes, slots)
+
+    parts = parse_meal(ingredients)
+    items = get_food_items(meal_food_names(parts), intent_request)
+    entries = assemble_meal(parts, items)
+    recipe = build_recipe(recipe_name, entries, int(servings),
+                          {name: Food.from_item(item) for name, item in items.items()}, intent_request['userId'])
+    foods.put_item(
+        Item=recipe
+    )
+    store_recipe_index(index_recipe(user['Item'].get('recipeIndex', {}), recipe_name,
+                                    [entry['FoodName'] for entry in entries]), user, intent_request)
+    refreshed = refresh_recipes(recipe_name, Food.from_item(recipe), user, intent_request)
+    forget_recent_foods([recipe_name] + refreshed, user, intent_request)
+    session_attributes['catalogUpdatedAt'] = str(time.time())
+    return close(session_attributes,
+                 'Fulfilled',
+                 {'contentType': 'PlainText',
+                  'content': 'Got it! {} ({}) has been added to your foods, at {} per serving.{}'.format(
+                      recipe_name, generate_meal_string(entries),
+                      generate_nutrition_string(Food.from_item(recipe).nutrition),
+                      generate_refreshed_string(refreshed))})
 
 
 """ --- Intents --- """
@@ -304,6 +552,8 @@ def dispatch(intent_request):
     # Dispatch to your bot's intent handlers
     if intent_name == 'CreateFoods':
         return create_food(intent_request)
+    elif intent_name == 'CreateRecipe':
+        return create_recipe(intent_request)
 
     raise Exception('Intent with name ' + intent_name + ' not supported')
 
@@ -320,5 +570,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
@@ -1,11 +1,13 @@
-import boto3
 import time
 import os
 import logging
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-users = dynamodb.Table('Users')
-exercises = dynamodb.Table('Exercises')
+from fitfriend.aliases import canonical_exercise_name
+from fitfriend.catalog import get_catalog_item
+from fitfriend.muscle_groups import canonical_muscle_group, get_muscle_group_exercises
+from fitfriend.tables import emit_invocation_metrics, exercises, start_invocation_metrics, users
+from fitfriend.text import generate_list_string
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -110,12 +112,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -147,7 +144,13 @@ def generate_previous_exercises_remaining_string(workout):
 
 def generate_exercise_array(workout):
     if workout is not None:
-        return workout.split(', ')
+        return [canonical_exercise_name(exercise) for exercise in workout.split(', ')]
+    return workout
+
+
+def generate_exercise_string(workout):
+    if workout is not None:
+        return ', '.join(workout)
     return workout
 
 
@@ -166,72 +169,62 @@ def build_validation_result(is_valid, violated_slot, message_content):
 
 
 def is_valid_exercise(exercise, intent_request):
-    response = exercises.get_item(
-        Key={
-            'UserID': 'universal',
-            'ExerciseName': exercise.lower()
-        }
-    )
-    if 'Item' in response:
-        return True
-    else:
-        response = exercises.get_item(
-            Key={
-                'UserID': intent_request['userId'],
-                'ExerciseName': exercise.lower()
-            }
-        )
-        if 'Item' in response:
-            return True
-    return False
+    return get_catalog_item(exercise.lower(), exercises, 'ExerciseName', intent_request) is not None
+
+
+def is_builtin_exercise(exercise):
+    return exercise.lower() in ['rest', 'run']
+
+
+def substitute_muscle_groups(slots, intent_request):
+    """
+    Replace a muscle group named in place of an exercise ("Monday: chest, triceps extension") with up to
+    MUSCLE_GROUP_SUBSTITUTES exercises for it, the user's own first. Returns [(muscle group, substitutes)].
+    """
+
+    substitutions = []
+    for weekday in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']:
+        workout = generate_exercise_array(slots[weekday])
+        if workout is None:
+            continue
+        day = []
+        for exercise in workout:
+            muscle_group = canonical_muscle_group(exercise)
+            substitutes = []
+            if muscle_group is not None:
+                universal_names, user_names = get_muscle_group_exercises(muscle_group, intent_request)
+                substitutes = (user_names + universal_names)[:MUSCLE_GROUP_SUBSTITUTES]
+            if substitutes:
+                substitutions.append((exercise, substitutes))
+            day.extend(name for name in substitutes or [exercise] if name not in day)
+        slots[weekday] = generate_exercise_string(day)
+    return substitutions
 
 
 def validate_create_workout(monday, tuesday, wednesday, thursday, friday, saturday, sunday, intent_request):
-    if monday is not None:
-        for exercise in monday:
-            if not is_valid_exercise(exercise, intent_request):
-                return build_validation_result(False, 'Monday',
-                                               '{} is not recognized as one of your exercises. Would '
-                                               'you like to add it?'.format(exercise))
-    if tuesday is not None:
-        for exercise in tuesday:
-            if not is_valid_exercise(exercise, intent_request):
-                return build_validation_result(False, 'Tuesday',
-                                               '{} is not recognized as one of your exercises. Would '
-                                               'you like to add it?'.format(exercise))
-    if wednesday is not None:
-        for exercise in wednesday:
-            if not is_valid_exercise(exercise, intent_request):
-                return build_validation_result(False, 'Wednesday',
-                                               '{} is not recognized as one of your exercises. Would '
-                                               'you like to add it?'.format(exercise))
-    if thursday is not None:
-        for exercise in thursday:
-            if not is_valid_exercise(exercise, intent_request):
-                return build_validation_result(False, 'Thursday',
-                                               '{} is not recognized as one of your exercises. Would '
-                                               'you like to add it?'.format(exercise))
-    if friday is not None:
-        for exercise in friday:
-            if not is_valid_exercise(exercise, intent_request):
-                return build_validation_result(False, 'Friday',
-                                               '{} is not recognized as one of your exercises. Would '
-                                               'you like to add it?'.format(exercise))
-    if saturday is not None:
-        for exercise in saturday:
-            if not is_valid_exercise(exercise, intent_request):
-                return build_validation_result(False, 'Saturday',
-                                               '{} is not recognized as one of your exercises. Would '
-                                               'you like to add it?'.format(exercise))
-    if sunday is not None:
-        for exercise in sunday:
-            if not is_valid_exercise(exercise, intent_request):
-                return build_validation_result(False, 'Sunday',
-                                               '{} is not recognized as one of your exercises. Would '
-                                               'you like to add it?'.format(exercise))
+    workout_routine = [('Monday', monday), ('Tuesday', tuesday), ('Wednesday', wednesday), ('Thursday', thursday),
+                       ('Friday', friday), ('Saturday', saturday), ('Sunday', sunday)]
+    checked_exercises = {}
+    for weekday, workout in workout_routine:
+        if workout is not None:
+            for exercise in workout:
+                if exercise.lower() not in checked_exercises:
+                    checked_exercises[exercise.lower()] = is_builtin_exercise(exercise) or is_valid_exercise(
+                        exercise, intent_request)
+                if not checked_exercises[exercise.lower()]:
+                    validation_result = build_validation_result(False, weekday,
+                                                                '{} is not recognized as one of your exercises. '
+                                                                'Would you like to add it?'.format(exercise))
+                    validation_result['invalidExercise'] = exercise
+                    return validation_result
     return build_validation_result(True, None, None)
 
 
+""" --- Muscle groups --- """
+
+MUSCLE_GROUP_SUBSTITUTES = 3
+
+
 """ --- Functions that control the bot's behavior --- """
 
 
@@ -243,7 +236,10 @@ def create_workout(intent_request):
     friday = generate_exercise_array(get_slots(intent_request)["Friday"])
     saturday = generate_exercise_array(get_slots(intent_request)["Saturday"])
     sunday = generate_exercise_array(get_slots(intent_request)["Sunday"])
-    workout_routine = [monday, tuesday, wednesday, thursday, friday, saturday, sunday]
+    # Keep the slots in catalog names too, so the CreateExercise chain and fulfillment see the same schedule.
+    for weekday, workout in [('Monday', monday), ('Tuesday', tuesday), ('Wednesday', wednesday),
+                             ('Thursday', thursday), ('Friday', friday), ('Saturday', saturday), ('Sunday', sunday)]:
+        get_slots(intent_request)[weekday] = generate_exercise_string(workout)
     user = get_user(intent_request)
     source = intent_request['invocationSource']
     confirmation_status = intent_request['currentIntent']['confirmationStatus']
@@ -275,47 +271,51 @@ def create_workout(intent_request):
                             generate_previous_exercises_remaining_string(exercises_remaining))
                     }
                 )
-        slots = get_slots(intent_request)
-        validation_result = validate_create_workout(monday, tuesday, wednesday, thursday, friday, saturday, sunday,
-                                                    intent_request)
         if confirmation_status == 'Denied':
             try_ex(lambda: session_attributes.pop('chainCreateWorkout'))
             return close(intent_request['sessionAttributes'],
                          'Fulfilled',
                          {'contentType': 'PlainText',
                           'content': 'It\'s all good in the hood!'})
+        substitutions = substitute_muscle_groups(get_slots(intent_request), intent_request)
+        if substitutions:
+            return confirm_intent(
+                session_attributes,
+                intent_request['currentIntent']['name'],
+                get_slots(intent_request),
+                {
+                    'contentType': 'PlainText',
+                    'content': '{} Should I save this schedule?'.format(' '.join(
+                        'I filled in {} with {}.'.format(muscle_group, generate_list_string(substitutes))
+                        for muscle_group, substitutes in substitutions))
+                }
+            )
+        validation_result = validate_create_workout(monday, tuesday, wednesday, thursday, friday, saturday, sunday,
+                                                    intent_request)
         if not validation_result['isValid']:
-            for weekday in workout_routine:
-                if weekday is not None:
-                    for exercise in weekday:
-                        if not is_valid_exercise(exercise, intent_request):
-                            session_attributes['chainCreateWorkout'] = True
-                            session_attributes['Monday'] = get_slots(intent_request)["Monday"]
-                            session_attributes['Tuesday'] = get_slots(intent_request)["Tuesday"]
-                            session_attributes['Wednesday'] = get_slots(intent_request)["Wednesday"]
-                            session_attributes['Thursday'] = get_slots(intent_request)["Thursday"]
-                            session_attributes['Friday'] = get_slots(intent_request)["Friday"]
-                            session_attributes['Saturday'] = get_slots(intent_request)["Saturday"]
-                            session_attributes['Sunday'] = get_slots(intent_request)["Sunday"]
-                            return confirm_intent(
-                                session_attributes,
-                                'CreateExercise',
-                                {
-                                    'Exercise': exercise,
-                                    'MuscleGroup': None
-                                },
-                                {
-                                    'contentType': 'PlainText',
-                                    'content': '{} is not recognized as one of your exercises. Would '
-                                               'you like to add it?'.format(exercise)
-
-                                }
-                            )
-            return elicit_slot(intent_request['sessionAttributes'],
-                               intent_request['currentIntent']['name'],
-                               slots,
-                               validation_result['violatedSlot'],
-                               validation_result['message'])
+            exercise = validation_result['invalidExercise']
+            session_attributes['chainCreateWorkout'] = True
+            session_attributes['Monday'] = get_slots(intent_request)["Monday"]
+            session_attributes['Tuesday'] = get_slots(intent_request)["Tuesday"]
+            session_attributes['Wednesday'] = get_slots(intent_request)["Wednesday"]
+            session_attributes['Thursday'] = get_slots(intent_request)["Thursday"]
+            session_attributes['Friday'] = get_slots(intent_request)["Friday"]
+            session_attributes['Saturday'] = get_slots(intent_request)["Saturday"]
+            session_attributes['Sunday'] = get_slots(intent_request)["Sunday"]
+            return confirm_intent(
+                session_attributes,
+                'CreateExercise',
+                {
+                    'Exercise': exercise,
+                    'MuscleGroup': None
+                },
+                {
+                    'contentType': 'PlainText',
+                    'content': '{} is not recognized as one of your exercises. Would '
+                               'you like to add it?'.format(exercise)
+
+                }
+            )
 
         return delegate(session_attributes, get_slots(intent_request))
 
@@ -400,5 +400,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
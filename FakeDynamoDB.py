@@ -0,0 +1,633 @@
+import re
+import threading
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+
+""" --- In-memory stand-in for the DynamoDB tables used by the hooks --- """
+
+# (hash key, range key) for every table the hooks talk to.
+KEY_SCHEMAS = {
+    'Users': ('user', None),
+    'Foods': ('UserID', 'FoodName'),
+    'Exercises': ('UserID', 'ExerciseName'),
+    'UsersArchive': ('user', 'month'),
+}
+
+# {table: {index name: (hash key, range key)}}
+INDEX_SCHEMAS = {
+    'Exercises': {'MuscleGroupIndex': ('UserID', 'MuscleGroup')},
+}
+
+MAX_ITEM_SIZE = 400 * 1024
+MAX_PAGE_SIZE = 1024 * 1024
+
+recording = threading.local()
+
+""" --- Per-thread call recording --- """
+
+
+def start_recording():
+    recording.stats = {'calls': {}, 'bytesRead': 0, 'bytesWritten': 0, 'readCapacity': 0.0, 'writeCapacity': 0.0}
+    return recording.stats
+
+
+def stop_recording():
+    stats = getattr(recording, 'stats', None)
+    recording.stats = None
+    return stats
+
+
+def record(table_name, operation, bytes_read=0, bytes_written=0, read_capacity=0.0, write_capacity=0.0):
+    stats = getattr(recording, 'stats', None)
+    if stats is None:
+        return
+    key = table_name + '.' + operation
+    stats['calls'][key] = stats['calls'].get(key, 0) + 1
+    stats['bytesRead'] += bytes_read
+    stats['bytesWritten'] += bytes_written
+    stats['readCapacity'] += read_capacity
+    stats['writeCapacity'] += write_capacity
+
+
+""" --- Helper Functions --- """
+
+
+def client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def normalize(value):
+    # Copy a value into the shape boto3 hands back from DynamoDB: numbers become Decimal, bytes become Binary and
+    # floats are rejected exactly like boto3 rejects them.
+    if isinstance(value, dict):
+        return {name: normalize(element) for name, element in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(element) for element in value]
+    if value is None or isinstance(value, (bool, str, Decimal, Binary)):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, (bytes, bytearray)):
+        return Binary(bytes(value))
+    if isinstance(value, (set, frozenset)):
+        return set(normalize(element) for element in value)
+    raise TypeError('Unsupported type "{}" for value "{}"'.format(type(value), value))
+
+
+def value_size(value):
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, Binary):
+        return len(value.value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (int, Decimal)):
+        digits = str(abs(value)).replace('.', '').strip('0')
+        return (max(len(digits), 1) + 1) // 2 + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(name.encode('utf-8')) + value_size(element) + 1 for name, element in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(value_size(element) + 1 for element in value)
+    if isinstance(value, (set, frozenset)):
+        return sum(value_size(element) for element in value)
+    raise TypeError('Unsupported type {} for {}'.format(type(value), value))
+
+
+def item_size(item):
+    if item is None:
+        return 0
+    return sum(len(name.encode('utf-8')) + value_size(value) for name, value in item.items())
+
+
+def read_units(size, consistent_read=False):
+    units = max(1, -(-size // 4096))
+    return float(units) if consistent_read else units / 2.0
+
+
+def write_units(size):
+    return float(max(1, -(-size // 1024)))
+
+
+def consumed_capacity(table_name, capacity):
+    return {'TableName': table_name, 'CapacityUnits': capacity, 'Table': {'CapacityUnits': capacity}}
+
+
+def parse_path(path, names):
+    elements = []
+    for part in path.strip().split('.'):
+        match = re.match(r'^([^\[]+)((\[\d+\])*)$', part.strip())
+        if match is None:
+            raise client_error('ValidationException', 'Invalid document path: ' + path, 'UpdateItem')
+        name = match.group(1)
+        if name.startswith('#'):
+            name = names[name]
+        elements.append(name)
+        for index in re.findall(r'\[(\d+)\]', match.group(2)):
+            elements.append(int(index))
+    return elements
+
+
+def get_path(item, path):
+    current = item
+    for element in path:
+        if isinstance(element, int):
+            if not isinstance(current, list) or element >= len(current):
+                return None
+            current = current[element]
+        else:
+            if not isinstance(current, dict) or element not in current:
+                return None
+            current = current[element]
+    return current
+
+
+def set_path(item, path, value, operation='UpdateItem'):
+    parent = get_path(item, path[:-1]) if len(path) > 1 else item
+    if parent is None or not isinstance(parent, (dict, list)):
+        raise client_error('ValidationException',
+                           'The document path provided in the update expression is invalid for update', operation)
+    if isinstance(parent, list):
+        if path[-1] >= len(parent):
+            parent.append(value)
+        else:
+            parent[path[-1]] = value
+    else:
+        parent[path[-1]] = value
+
+
+def remove_path(item, path):
+    parent = get_path(item, path[:-1]) if len(path) > 1 else item
+    if isinstance(parent, dict):
+        parent.pop(path[-1], None)
+    elif isinstance(parent, list) and path[-1] < len(parent):
+        parent.pop(path[-1])
+
+
+def split_top_level(expression):
+    parts, depth, current = [], 0, ''
+    for character in expression:
+        if character == '(':
+            depth += 1
+        elif character == ')':
+            depth -= 1
+        if character == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += character
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def project(item, projection_expression, names):
+    if item is None or not projection_expression:
+        return item
+    projected = {}
+    for path in split_top_level(projection_expression):
+        elements = parse_path(path, names or {})
+        value = get_path(item, elements)
+        if value is None:
+            continue
+        target = projected
+        for element in elements[:-1]:
+            target = target.setdefault(element, {})
+        target[elements[-1]] = value
+    return projected
+
+
+def matches(condition, item):
+    if condition is None:
+        return True
+    expression = condition.get_expression()
+    operator = expression['operator']
+    values = expression['values']
+    if operator == 'AND':
+        return matches(values[0], item) and matches(values[1], item)
+    if operator == 'OR':
+        return matches(values[0], item) or matches(values[1], item)
+    if operator == 'NOT':
+        return not matches(values[0], item)
+    actual = get_path(item, values[0].name.split('.'))
+    if operator == 'attribute_exists':
+        return actual is not None
+    if operator == 'attribute_not_exists':
+        return actual is None
+    if actual is None:
+        return False
+    if operator == '=':
+        return actual == values[1]
+    if operator == '<>':
+        return actual != values[1]
+    if operator == '<':
+        return actual < values[1]
+    if operator == '<=':
+        return actual <= values[1]
+    if operator == '>':
+        return actual > values[1]
+    if operator == '>=':
+        return actual >= values[1]
+    if operator == 'BETWEEN':
+        return values[1] <= actual <= values[2]
+    if operator == 'begins_with':
+        return actual.startswith(values[1])
+    if operator == 'contains':
+        return values[1] in actual
+    if operator == 'IN':
+        return actual in values[1]
+    raise NotImplementedError('Condition operator {} is not supported'.format(operator))
+
+
+def matches_string_condition(condition, item, names):
+    match = re.match(r'^\s*(attribute_exists|attribute_not_exists)\s*\(\s*([^)]+)\)\s*$', condition)
+    if match is None:
+        raise NotImplementedError('Condition expression {} is not supported'.format(condition))
+    exists = get_path(item, parse_path(match.group(2), names)) is not None
+    return exists if match.group(1) == 'attribute_exists' else not exists
+
+
+""" --- Update expressions --- """
+
+
+def evaluate_operand(operand, item, names, values):
+    operand = operand.strip()
+    function = re.match(r'^(if_not_exists|list_append)\s*\((.*)\)$', operand)
+    if function is not None:
+        arguments = split_top_level(function.group(2))
+        if function.group(1) == 'if_not_exists':
+            existing = get_path(item, parse_path(arguments[0], names))
+            return existing if existing is not None else evaluate_operand(arguments[1], item, names, values)
+        return list(evaluate_operand(arguments[0], item, names, values)) + list(
+            evaluate_operand(arguments[1], item, names, values))
+    if operand.startswith(':'):
+        return values[operand]
+    return get_path(item, parse_path(operand, names))
+
+
+def evaluate_value(expression, item, names, values):
+    arithmetic = re.match(r'^(.+?)\s*([+-])\s*(.+)$', expression.strip())
+    if arithmetic is not None and '(' not in arithmetic.group(1):
+        left = evaluate_operand(arithmetic.group(1), item, names, values)
+        right = evaluate_operand(arithmetic.group(3), item, names, values)
+        if left is None or right is None:
+            raise client_error('ValidationException',
+                               'The provided expression refers to an attribute that does not exist in the item',
+                               'UpdateItem')
+        return left + right if arithmetic.group(2) == '+' else left - right
+    return evaluate_operand(expression, item, names, values)
+
+
+def apply_update(item, update_expression, names, values):
+    clauses = re.split(r'(?i)(?:^|\s)(set|add|remove|delete)\s', ' ' + update_expression)
+    updated = []
+    for action, body in zip(clauses[1::2], clauses[2::2]):
+        action = action.lower()
+        for part in split_top_level(body):
+            if action == 'set':
+                path, expression = part.split('=', 1)
+                elements = parse_path(path, names)
+                set_path(item, elements, evaluate_value(expression, item, names, values))
+            elif action == 'remove':
+                elements = parse_path(part, names)
+                remove_path(item, elements)
+            else:
+                path, operand = part.split()
+                elements = parse_path(path, names)
+                existing = get_path(item, elements)
+                delta = values[operand]
+                if action == 'add':
+                    if isinstance(delta, set):
+                        set_path(item, elements, (existing or set()) | delta)
+                    else:
+                        set_path(item, elements, (existing or 0) + delta)
+                elif existing is not None:
+                    set_path(item, elements, existing - delta)
+            updated.append(elements[0])
+    return updated
+
+
+""" --- Tables --- """
+
+
+class FakeTable(object):
+    def __init__(self, name, hash_key, range_key=None, indexes=None, latency=0.0, max_item_size=MAX_ITEM_SIZE):
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes or {}
+        self.latency = latency
+        self.max_item_size = max_item_size
+        self.items = {}
+        self.lock = threading.RLock()
+
+    def __repr__(self):
+        return 'FakeTable({!r})'.format(self.name)
+
+    @property
+    def item_count(self):
+        return len(self.items)
+
+    def key_of(self, item, operation):
+        try:
+            if self.range_key is None:
+                return (item[self.hash_key],)
+            return item[self.hash_key], item[self.range_key]
+        except KeyError:
+            raise client_error('ValidationException', 'The provided key element does not match the schema', operation)
+
+    def key_attributes(self, item):
+        key = {self.hash_key: item[self.hash_key]}
+        if self.range_key is not None:
+            key[self.range_key] = item[self.range_key]
+        return key
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def check_condition(self, existing, condition, names, operation):
+        if condition is None:
+            return
+        if isinstance(condition, str):
+            passed = matches_string_condition(condition, existing or {}, names or {})
+        else:
+            passed = matches(condition, existing or {})
+        if not passed:
+            raise client_error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+
+    def get_item(self, Key, ConsistentRead=False, ProjectionExpression=None, ExpressionAttributeNames=None,
+                 ReturnConsumedCapacity=None, **kwargs):
+        self.wait()
+        with self.lock:
+            stored = self.items.get(self.key_of(Key, 'GetItem'))
+            item = normalize(stored) if stored is not None else None
+        capacity = read_units(item_size(item), ConsistentRead)
+        item = project(item, ProjectionExpression, ExpressionAttributeNames)
+        record(self.name, 'GetItem', bytes_read=item_size(item), read_capacity=capacity)
+        response = {}
+        if item is not None:
+            response['Item'] = item
+        if ReturnConsumedCapacity in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = consumed_capacity(self.name, capacity)
+        return response
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None, ReturnValues='NONE',
+                 ReturnConsumedCapacity=None, **kwargs):
+        self.wait()
+        item = normalize(Item)
+        size = item_size(item)
+        if self.max_item_size and size > self.max_item_size:
+            raise client_error('ValidationException', 'Item size has exceeded the maximum allowed size', 'PutItem')
+        with self.lock:
+            key = self.key_of(item, 'PutItem')
+            existing = self.items.get(key)
+            self.check_condition(existing, ConditionExpression, ExpressionAttributeNames, 'PutItem')
+            self.items[key] = item
+        capacity = write_units(max(size, item_size(existing)))
+        record(self.name, 'PutItem', bytes_written=size, write_capacity=capacity)
+        response = {}
+        if ReturnValues == 'ALL_OLD' and existing is not None:
+            response['Attributes'] = normalize(existing)
+        if ReturnConsumedCapacity in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = consumed_capacity(self.name, capacity)
+        return response
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None, ExpressionAttributeNames=None,
+                    ConditionExpression=None, ReturnValues='NONE', ReturnConsumedCapacity=None, **kwargs):
+        self.wait()
+        names = ExpressionAttributeNames or {}
+        values = normalize(ExpressionAttributeValues or {})
+        with self.lock:
+            key = self.key_of(Key, 'UpdateItem')
+            existing = self.items.get(key)
+            self.check_condition(existing, ConditionExpression, names, 'UpdateItem')
+            item = normalize(existing) if existing is not None else normalize(Key)
+            updated = apply_update(item, UpdateExpression, names, values)
+            size = item_size(item)
+            if self.max_item_size and size > self.max_item_size:
+                raise client_error('ValidationException', 'Item size to update has exceeded the maximum allowed size',
+                                   'UpdateItem')
+            self.items[key] = item
+        capacity = write_units(max(size, item_size(existing)))
+        record(self.name, 'UpdateItem', bytes_written=size, write_capacity=capacity)
+        response = {}
+        if ReturnValues == 'ALL_NEW':
+            response['Attributes'] = normalize(item)
+        elif ReturnValues == 'ALL_OLD' and existing is not None:
+            response['Attributes'] = normalize(existing)
+        elif ReturnValues == 'UPDATED_NEW':
+            response['Attributes'] = normalize({name: item[name] for name in updated if name in item})
+        if ReturnConsumedCapacity in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = consumed_capacity(self.name, capacity)
+        return response
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None, ReturnValues='NONE',
+                    ReturnConsumedCapacity=None, **kwargs):
+        self.wait()
+        with self.lock:
+            key = self.key_of(Key, 'DeleteItem')
+            existing = self.items.get(key)
+            self.check_condition(existing, ConditionExpression, ExpressionAttributeNames, 'DeleteItem')
+            self.items.pop(key, None)
+        capacity = write_units(item_size(existing))
+        record(self.name, 'DeleteItem', write_capacity=capacity)
+        response = {}
+        if ReturnValues == 'ALL_OLD' and existing is not None:
+            response['Attributes'] = normalize(existing)
+        if ReturnConsumedCapacity in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = consumed_capacity(self.name, capacity)
+        return response
+
+    def page(self, operation, candidates, hash_key, range_key, Limit, ExclusiveStartKey, Select, ProjectionExpression,
+             ExpressionAttributeNames, FilterExpression, ReturnConsumedCapacity, ConsistentRead):
+        if ExclusiveStartKey is not None:
+            start = self.key_of(ExclusiveStartKey, operation)
+            keys = [self.key_of(item, operation) for item in candidates]
+            candidates = candidates[keys.index(start) + 1:] if start in keys else []
+        evaluated, returned, scanned_bytes = [], [], 0
+        last_key = None
+        for item in candidates:
+            if Limit is not None and len(evaluated) >= Limit:
+                last_key = evaluated[-1]
+                break
+            if scanned_bytes >= MAX_PAGE_SIZE:
+                last_key = evaluated[-1]
+                break
+            evaluated.append(item)
+            scanned_bytes += item_size(item)
+            if matches(FilterExpression, item):
+                returned.append(item)
+        capacity = read_units(scanned_bytes, ConsistentRead)
+        items = [project(normalize(item), ProjectionExpression, ExpressionAttributeNames) for item in returned]
+        record(self.name, operation, bytes_read=sum(item_size(item) for item in items), read_capacity=capacity)
+        response = {'Count': len(items), 'ScannedCount': len(evaluated)}
+        if Select != 'COUNT':
+            response['Items'] = items
+        if last_key is not None:
+            last_evaluated_key = self.key_attributes(last_key)
+            if hash_key not in last_evaluated_key:
+                last_evaluated_key[hash_key] = last_key[hash_key]
+            if range_key is not None and range_key in last_key:
+                last_evaluated_key[range_key] = last_key[range_key]
+            response['LastEvaluatedKey'] = normalize(last_evaluated_key)
+        if ReturnConsumedCapacity in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = consumed_capacity(self.name, capacity)
+        return response
+
+    def query(self, KeyConditionExpression, IndexName=None, Limit=None, ExclusiveStartKey=None, Select=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None, FilterExpression=None, ScanIndexForward=True,
+              ReturnConsumedCapacity=None, ConsistentRead=False, **kwargs):
+        self.wait()
+        if IndexName is not None:
+            if IndexName not in self.indexes:
+                raise client_error('ValidationException', 'The table does not have the specified index: ' + IndexName,
+                                   'Query')
+            hash_key, range_key = self.indexes[IndexName]
+        else:
+            hash_key, range_key = self.hash_key, self.range_key
+        with self.lock:
+            candidates = [item for item in self.items.values()
+                          if hash_key in item and (range_key is None or range_key in item)
+                          and matches(KeyConditionExpression, item)]
+        if range_key is not None:
+            candidates.sort(key=lambda item: (item[range_key], self.key_of(item, 'Query')),
+                            reverse=not ScanIndexForward)
+        return self.page('Query', candidates, hash_key, range_key, Limit, ExclusiveStartKey, Select,
+                         ProjectionExpression, ExpressionAttributeNames, FilterExpression, ReturnConsumedCapacity,
+                         ConsistentRead)
+
+    def scan(self, Segment=None, TotalSegments=None, Limit=None, ExclusiveStartKey=None, Select=None,
+             ProjectionExpression=None, ExpressionAttributeNames=None, FilterExpression=None,
+             ReturnConsumedCapacity=None, ConsistentRead=False, **kwargs):
+        self.wait()
+        with self.lock:
+            candidates = sorted(self.items.values(), key=lambda item: repr(self.key_of(item, 'Scan')))
+        if TotalSegments:
+            candidates = [item for item in candidates
+                          if hash(repr(item[self.hash_key])) % TotalSegments == Segment]
+        return self.page('Scan', candidates, self.hash_key, self.range_key, Limit, ExclusiveStartKey, Select,
+                         ProjectionExpression, ExpressionAttributeNames, FilterExpression, ReturnConsumedCapacity,
+                         ConsistentRead)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatchWriter(self)
+
+
+class FakeBatchWriter(object):
+    def __init__(self, table, flush_amount=25):
+        self.table = table
+        self.flush_amount = flush_amount
+        self.requests = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def put_item(self, Item):
+        self.requests.append(('put', Item))
+        if len(self.requests) >= self.flush_amount:
+            self.flush()
+
+    def delete_item(self, Key):
+        self.requests.append(('delete', Key))
+        if len(self.requests) >= self.flush_amount:
+            self.flush()
+
+    def flush(self):
+        if not self.requests:
+            return
+        requests, self.requests = self.requests, []
+        self.table.wait()
+        written, capacity = 0, 0.0
+        with self.table.lock:
+            for kind, payload in requests:
+                if kind == 'put':
+                    item = normalize(payload)
+                    size = item_size(item)
+                    if self.table.max_item_size and size > self.table.max_item_size:
+                        raise client_error('ValidationException', 'Item size has exceeded the maximum allowed size',
+                                           'BatchWriteItem')
+                    self.table.items[self.table.key_of(item, 'BatchWriteItem')] = item
+                    written += size
+                    capacity += write_units(size)
+                else:
+                    self.table.items.pop(self.table.key_of(payload, 'BatchWriteItem'), None)
+                    capacity += 1.0
+        record(self.table.name, 'BatchWriteItem', bytes_written=written, write_capacity=capacity)
+
+
+class FakeDynamoDB(object):
+    def __init__(self, latency=0.0, max_item_size=MAX_ITEM_SIZE):
+        self.latency = latency
+        self.max_item_size = max_item_size
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def Table(self, name):
+        with self.lock:
+            if name not in self.tables:
+                hash_key, range_key = KEY_SCHEMAS.get(name, ('id', None))
+                self.tables[name] = FakeTable(name, hash_key, range_key, dict(INDEX_SCHEMAS.get(name, {})),
+                                              self.latency, self.max_item_size)
+            return self.tables[name]
+
+    def batch_get_item(self, RequestItems, ReturnConsumedCapacity=None, **kwargs):
+        if sum(len(request['Keys']) for request in RequestItems.values()) > 100:
+            raise client_error('ValidationException', 'Too many items requested for the BatchGetItem call',
+                               'BatchGetItem')
+        self.wait()
+        responses, capacities = {}, []
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            items, size = [], 0
+            with table.lock:
+                for key in request['Keys']:
+                    stored = table.items.get(table.key_of(key, 'BatchGetItem'))
+                    if stored is not None:
+                        item = project(normalize(stored), request.get('ProjectionExpression'),
+                                       request.get('ExpressionAttributeNames'))
+                        items.append(item)
+                        size += item_size(item)
+            capacity = sum(read_units(item_size(item), request.get('ConsistentRead', False)) for item in items)
+            record(name, 'BatchGetItem', bytes_read=size, read_capacity=capacity)
+            responses[name] = items
+            capacities.append(consumed_capacity(name, capacity))
+        response = {'Responses': responses, 'UnprocessedKeys': {}}
+        if ReturnConsumedCapacity in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = capacities
+        return response
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+
+""" --- Installing the stand-in into hook modules --- """
+
+
+def install(module, fake):
+    """
+    Swap every boto3 DynamoDB resource and Table held at module level, including the Tables wrapped by the hooks'
+    InstrumentedTable, for the stand-in. A stand-in installed earlier is replaced too, so each test can start from an
+    empty one.
+    """
+
+    for name, value in list(vars(module).items()):
+        type_name = type(value).__name__
+        if type_name in ('dynamodb.ServiceResource', 'FakeDynamoDB'):
+            setattr(module, name, fake)
+        elif type_name in ('dynamodb.Table', 'FakeTable'):
+            setattr(module, name, fake.Table(value.name))
+        elif type(getattr(value, '__dict__', {}).get('table')).__name__ in ('dynamodb.Table', 'FakeTable'):
+            value.table = fake.Table(value.table.name)
+    return module
@@ -1,10 +1,12 @@
-import boto3
 import time
 import os
 import logging
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-users = dynamodb.Table('Users')
+from fitfriend.archive import load_archived_days
+from fitfriend.model import NutritionVector, get_day_record
+from fitfriend.rules import ViolationRules, generate_rules_string
+from fitfriend.tables import emit_invocation_metrics, start_invocation_metrics, users
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -109,12 +111,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -166,31 +163,22 @@ def generate_day_information_string(day, user):
     else:
         measurement = 'kgs'
         distance = 'km'
-    exercise_log = user['Item']['dailyNutrientsAndWorkouts'][day]['exerciseLog']
-    if not len(exercise_log) == 0:
+    record = get_day_record(user, day)
+    if not len(record.exercise_log) == 0:
         information_string += "You did "
-        for exercise_time, exercise in exercise_log.items():
-            if exercise['ExerciseName'] == 'run':
-                information_string += 'ran ' + str(exercise['Distance']) + distance + ' in ' + str(exercise['Duration']) + ', '
+        for exercise_time, exercise in record.exercise_log.items():
+            if exercise.is_run():
+                information_string += 'ran ' + str(exercise.distance) + distance + ' in ' + str(exercise.duration) + ', '
             else:
-                information_string += str(exercise['ExerciseName']) + ' at ' + str(exercise['Weight']) + measurement + ' for ' + \
-                                      str(exercise[
-                                          'Reps']) + ' reps and ' + str(exercise['Sets']) + ' sets, '
-    food_log = user['Item']['dailyNutrientsAndWorkouts'][day]['foodLog']
-    if not len(food_log) == 0:
-        for food_time, food in food_log.items():
+                information_string += exercise.name + ' at ' + exercise.sets_string(measurement) + ', '
+    if not len(record.food_log) == 0:
+        for food_time, food in record.food_log.items():
+            nutrition = food['FoodNutrition']
             information_string += 'you ate ' + str(food['Measurement']) + ' ' + str(
-                food['MeasurementType']) + ' of ' + str(food['FoodName']) + ' (' + str(
-                food['FoodNutrition']['calorie']) + 'cal, ' + str(food['FoodNutrition']['protein']) + ' p, ' + str(
-                food['FoodNutrition']['carbohydrate']) + ' c, ' + str(food['FoodNutrition']['fat']) + 'f), '
-        nutrient_goal = user['Item']['nutrientGoal']
-        nutrition_remaining = user['Item']['dailyNutrientsAndWorkouts'][day]['nutritionRemaining']
-        information_string += 'for a total of ' + str(
-            int(nutrient_goal['calorie']) - int(nutrition_remaining['calorie'])) + ' cals, ' + str(
-            int(nutrient_goal['protein']) - int(nutrition_remaining['protein'])) + ' p, ' + str(
-            int(nutrient_goal['carbohydrate']) - int(nutrition_remaining['carbohydrate'])) + ' c, ' + str(
-            int(nutrient_goal['fat']) - int(nutrition_remaining['fat'])) + ' f, '
-    violations = user['Item']['dailyNutrientsAndWorkouts'][day]['violations']
+                food['MeasurementType']) + ' of ' + str(food['FoodName']) + ' (' + str(nutrition) + '), '
+        eaten = NutritionVector.from_item(user['Item']['nutrientGoal']) - record.nutrition_remaining
+        information_string += 'for a total of ' + str(eaten) + ', '
+    violations = record.violations
     if not len(violations) == 0:
         if 'workout' in violations:
             information_string += 'you didn\'t finish all your workouts for today'
@@ -201,11 +189,28 @@ def generate_day_information_string(day, user):
                 continue
             information_string += violation + ', '
         information_string += 'limits.'
+    if day < time.strftime('%Y-%m-%d'):
+        # Floors can only be judged once the day is over.
+        eaten = NutritionVector.from_item(user['Item']['nutrientGoal']) - record.nutrition_remaining
+        broken = ViolationRules.for_user(user).broken(eaten, 'floor')
+        if len(broken) != 0:
+            if information_string.endswith('.'):
+                information_string += ' You finished '
+            else:
+                information_string += 'and you finished '
+            information_string += generate_rules_string(broken) + '.'
     if len(information_string) == 0:
         return 'Nothing yet!'
     return information_string
 
 
+def load_archived_day(day, user, intent_request):
+    if day in user['Item']['dailyNutrientsAndWorkouts']:
+        return
+    if day[:7] in user['Item'].get('archivedMonths', ()):
+        load_archived_days(user, intent_request, [day[:7]])
+
+
 def is_valid_day(day, user):
     if day in user['Item']['dailyNutrientsAndWorkouts']:
         return True
@@ -256,6 +261,8 @@ def get_day_information(intent_request):
                     }
                 )
         slots = get_slots(intent_request)
+        if day is not None:
+            load_archived_day(day, user, intent_request)
         validation_result = validate_get_day_information(day, user)
         if not validation_result['isValid']:
             slots[validation_result['violatedSlot']] = None
@@ -266,6 +273,7 @@ def get_day_information(intent_request):
                                validation_result['message'])
         return delegate(session_attributes, get_slots(intent_request))
 
+    load_archived_day(day, user, intent_request)
     return close(intent_request['sessionAttributes'],
                  'Fulfilled',
                  {'contentType': 'PlainText',
@@ -304,5 +312,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
@@ -1,12 +1,10 @@
-import boto3
 import time
 import os
 import logging
-from boto3.dynamodb.conditions import Key, Attr
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-exercises = dynamodb.Table('Exercises')
-users = dynamodb.Table('Users')
+from fitfriend.archive import load_archived_days
+from fitfriend.tables import emit_invocation_metrics, start_invocation_metrics, users
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -98,12 +96,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -187,6 +180,7 @@ def get_excuses(intent_request):
 
         return delegate(session_attributes, get_slots(intent_request))
 
+    load_archived_days(user, intent_request, user['Item'].get('archivedMonths', ()))
     return close(intent_request['sessionAttributes'],
                  'Fulfilled',
                  {
@@ -227,5 +221,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
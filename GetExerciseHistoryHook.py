@@ -1,11 +1,12 @@
-import boto3
 import time
 import os
 import logging
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-exercises = dynamodb.Table('Exercises')
-users = dynamodb.Table('Users')
+from fitfriend.aliases import canonical_exercise_name
+from fitfriend.archive import load_archived_days
+from fitfriend.model import ExerciseEntry
+from fitfriend.tables import emit_invocation_metrics, exercises, start_invocation_metrics, users
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -110,12 +111,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -186,14 +182,19 @@ def get_exercise_history_string(exercise, user):
     else:
         measurement = 'kgs'
     history = ""
+    best = None
     for day, components in user['Item']['dailyNutrientsAndWorkouts'].items():
-        for exercise_time, exercises in (components['exerciseLog']).items():
-            if exercise == exercises['ExerciseName']:
-                history += "On " + str(day) + ", you did " + str(exercises['Weight']) + measurement + ' for ' + str(
-                    exercises['Reps'] + ' reps and ' + str(exercises['Sets'] + ' sets. '))
+        for exercise_time, item in (components['exerciseLog']).items():
+            if 'Reps' in item and exercise == canonical_exercise_name(item['ExerciseName']):
+                lift = ExerciseEntry.from_item(item)
+                history += "On " + str(day) + ", you did " + lift.sets_string(measurement) + \
+                    ' (' + str(lift.volume()) + measurement + ' of volume). '
+                for weight, reps in zip(lift.weights, lift.reps):
+                    if best is None or (weight, reps) > best:
+                        best = (weight, reps)
     if history == "":
         return 'Nothing yet!'
-    return history
+    return history + 'Your best set was ' + str(best[0]) + measurement + ' for ' + str(best[1]) + ' reps.'
 
 
 def validate_how_to_exercise(exercise, intent_request):
@@ -210,6 +211,10 @@ def validate_how_to_exercise(exercise, intent_request):
 
 def get_exercise_history(intent_request):
     exercise_name = get_slots(intent_request)["Exercise"]
+    if exercise_name is not None:
+        # Entries logged before aliases existed are canonicalized on read, so old variants join the same history.
+        exercise_name = canonical_exercise_name(exercise_name)
+        get_slots(intent_request)["Exercise"] = exercise_name
     user = get_user(intent_request)
     source = intent_request['invocationSource']
     session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
@@ -253,6 +258,7 @@ def get_exercise_history(intent_request):
 
         return delegate(session_attributes, get_slots(intent_request))
 
+    load_archived_days(user, intent_request, user['Item'].get('archivedMonths', ()))
     return close(intent_request['sessionAttributes'],
                  'Fulfilled',
                  {
@@ -293,5 +299,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
@@ -0,0 +1,274 @@
+import time
+import os
+import logging
+
+from fitfriend.muscle_groups import canonical_muscle_group, get_muscle_group_exercises
+from fitfriend.tables import emit_invocation_metrics, start_invocation_metrics, users
+from fitfriend.text import generate_list_string
+
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+
+""" --- Helpers to build responses which match the structure of the necessary dialog actions --- """
+
+
+def get_slots(intent_request):
+    return intent_request['currentIntent']['slots']
+
+
+def elicit_slot(session_attributes, intent_name, slots, slot_to_elicit, message):
+    return {
+        'sessionAttributes': session_attributes,
+        'dialogAction': {
+            'type': 'ElicitSlot',
+            'intentName': intent_name,
+            'slots': slots,
+            'slotToElicit': slot_to_elicit,
+            'message': message
+        }
+    }
+
+
+def confirm_intent(session_attributes, intent_name, slots, message):
+    return {
+        'sessionAttributes': session_attributes,
+        'dialogAction': {
+            'type': 'ConfirmIntent',
+            'intentName': intent_name,
+            'slots': slots,
+            'message': message
+        }
+    }
+
+
+def close(session_attributes, fulfillment_state, message):
+    response = {
+        'sessionAttributes': session_attributes,
+        'dialogAction': {
+            'type': 'Close',
+            'fulfillmentState': fulfillment_state,
+            'message': message
+        }
+    }
+
+    return response
+
+
+def delegate(session_attributes, slots):
+    return {
+        'sessionAttributes': session_attributes,
+        'dialogAction': {
+            'type': 'Delegate',
+            'slots': slots
+        }
+    }
+
+
+""" --- Helper Functions --- """
+
+
+def try_ex(func):
+    """
+    Call passed in function in try block. If KeyError is encountered return None.
+    This function is intended to be used to safely access dictionary.
+
+    Note that this function would have negative impact on performance.
+    """
+
+    try:
+        return func()
+    except KeyError:
+        return None
+
+
+def get_user(intent_request):
+    response = users.get_item(
+        Key={
+            'user': intent_request['userId'],
+        }
+    )
+    return response
+
+
+def is_valid_user(user):
+    if 'Item' in user:
+        return True
+    return False
+
+
+def is_new_day(user):
+    if not time.strftime("%Y-%m-%d") in user['Item']['dailyNutrientsAndWorkouts']:
+        return True
+    return False
+
+
+def create_new_day(user, intent_request):
+    users.update_item(
+        Key={
+            'user': intent_request['userId']
+        },
+        UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
+        ExpressionAttributeValues={
+            ':d': {
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
+                "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
+                "violations": [],
+                "foodLog": {},
+                "exerciseLog": {},
+                "excuses": {}
+            },
+
+        },
+        ExpressionAttributeNames={
+            '#day': time.strftime("%Y-%m-%d"),
+        },
+    )
+
+
+def get_previous_exercises_remaining(user):
+    latest_day = sorted(list(user['Item']['dailyNutrientsAndWorkouts'].keys()))[-1]
+    return user['Item']['dailyNutrientsAndWorkouts'][latest_day]['exercisesRemaining']
+
+
+def generate_previous_exercises_remaining_string(workout):
+    if len(workout) == 1:
+        return "You had " + workout[0] + " left."
+    workout_string = "You had "
+    for item in workout[0:-1]:
+        workout_string += item + ", "
+    workout_string += "and " + workout[-1] + " left. "
+    return workout_string
+
+
+def build_validation_result(is_valid, violated_slot, message_content):
+    if message_content is None:
+        return {
+            "isValid": is_valid,
+            "violatedSlot": violated_slot,
+        }
+
+    return {
+        'isValid': is_valid,
+        'violatedSlot': violated_slot,
+        'message': {'contentType': 'PlainText', 'content': message_content}
+    }
+
+
+""" --- Muscle groups --- """
+
+
+def validate_get_exercises_for_muscle_group(muscle_group):
+    if muscle_group is not None:
+        if canonical_muscle_group(muscle_group) is None:
+            return build_validation_result(False, 'MuscleGroup', 'Which muscle group would you like exercises for: '
+                                                                 'arms, back, chest, core, legs or shoulder?')
+
+    return build_validation_result(True, None, None)
+
+
+""" --- Functions that control the bot's behavior --- """
+
+
+def get_exercises_for_muscle_group(intent_request):
+    muscle_group = get_slots(intent_request)["MuscleGroup"]
+    user = get_user(intent_request)
+    source = intent_request['invocationSource']
+    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    if source == 'DialogCodeHook':
+        if not is_valid_user(user):
+            return close(intent_request['sessionAttributes'],
+                         'Fulfilled',
+                         {
+                             'contentType': 'PlainText',
+                             'content': "Glad to see you're so eager! Say \'hey fitfriend\' to get started!"
+                         })
+        if is_new_day(user):
+            exercises_remaining = get_previous_exercises_remaining(user)
+            create_new_day(user, intent_request)
+            if not len(exercises_remaining) == 0 and not exercises_remaining[0] == 'rest':
+                session_attributes['workoutViolationDate'] = \
+                    sorted(list(user['Item']['dailyNutrientsAndWorkouts'].keys()))[-1]
+                return confirm_intent(
+                    session_attributes,
+                    "GiveExcuse",
+                    {
+                        'Excuse': None,
+                        'Violation': 'workout'
+                    },
+                    {
+                        'contentType': 'PlainText',
+                        'content': 'Do you have a valid excuse for why you didn\'t finish your workout yesterday? {}'.format(
+                            generate_previous_exercises_remaining_string(exercises_remaining))
+                    }
+                )
+        slots = get_slots(intent_request)
+
+        validation_result = validate_get_exercises_for_muscle_group(muscle_group)
+        if not validation_result['isValid']:
+            slots[validation_result['violatedSlot']] = None
+            return elicit_slot(intent_request['sessionAttributes'],
+                               intent_request['currentIntent']['name'],
+                               slots,
+                               validation_result['violatedSlot'],
+                               validation_result['message'])
+        if muscle_group is not None:
+            slots['MuscleGroup'] = canonical_muscle_group(muscle_group)
+
+        return delegate(session_attributes, slots)
+
+    muscle_group = canonical_muscle_group(muscle_group)
+    # A cold container reads the user's exercises from the index instead of prefetching their whole catalog.
+    universal_names, user_names = get_muscle_group_exercises(muscle_group, intent_request, prefetch=False)
+    answers = []
+    if universal_names:
+        answers.append('For your {}, try {}.'.format(muscle_group, generate_list_string(universal_names)))
+    if user_names:
+        answers.append('From your own exercises: {}.'.format(generate_list_string(user_names)))
+    if not answers:
+        answers.append('I don\'t know any {} exercises yet. You can add your own by creating an exercise.'.format(
+            muscle_group))
+    return close(intent_request['sessionAttributes'],
+                 'Fulfilled',
+                 {
+                     'contentType': 'PlainText',
+                     'content': ' '.join(answers)
+                 })
+
+
+""" --- Intents --- """
+
+
+def dispatch(intent_request):
+    """
+    Called when the user specifies an intent for this bot.
+    """
+
+    logger.debug(
+        'dispatch userId={}, intentName={}'.format(intent_request['userId'], intent_request['currentIntent']['name']))
+
+    intent_name = intent_request['currentIntent']['name']
+
+    # Dispatch to your bot's intent handlers
+    if intent_name == 'GetExercisesForMuscleGroup':
+        return get_exercises_for_muscle_group(intent_request)
+
+    raise Exception('Intent with name ' + intent_name + ' not supported')
+
+
+""" --- Main handler --- """
+
+
+def lambda_handler(event, context):
+    """
+    Route the incoming request based on intent.
+    The JSON body of the request is provided in the event slot.
+    """
+    # By default, treat the user request as coming from the America/New_York time zone.
+    os.environ['TZ'] = 'America/New_York'
+    time.tzset()
+    logger.debug('event.bot.name={}'.format(event['bot']['name']))
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
@@ -1,10 +1,10 @@
-import boto3
 import time
 import os
 import logging
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-users = dynamodb.Table('Users')
+from fitfriend.archive import monitor_item_size
+from fitfriend.tables import emit_invocation_metrics, start_invocation_metrics, users
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -164,6 +164,7 @@ def give_excuse(intent_request):
                     '#day': day
                 },
             )
+            monitor_item_size(user, intent_request)
             return close(intent_request['sessionAttributes'],
                          'Fulfilled',
                          {'contentType': 'PlainText',
@@ -208,6 +209,7 @@ def give_excuse(intent_request):
             '#day': day
         },
     )
+    monitor_item_size(user, intent_request)
     return close(intent_request['sessionAttributes'],
                  'Fulfilled',
                  {'contentType': 'PlainText',
@@ -246,5 +248,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
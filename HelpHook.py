@@ -34,9 +34,16 @@ def get_help(intent_request):
                  {
                      'contentType': 'PlainText',
                      'content': 'If you want to record an exercise, say \'I did #EXERCISE for #WEIGHT weight #REPS '
-                                'reps and #SETS sets.\' If you want to record a run, say \'I ran #DISTANCE in '
+                                'reps and #SETS sets.\' To record a whole session set by set, say \'Log my session: '
+                                '#EXERCISE #WEIGHT for #REPS, #WEIGHT for #REPS; #EXERCISE ...\' To find exercises '
+                                'that train a muscle group, say \'Exercises for #MUSCLEGROUP\', like chest or legs. '
+                                'If you want to record a run, say \'I ran #DISTANCE in '
                                 '#DURATION.\'(incline is optional). If you want to record a meal, say \'I ate #NUM '
-                                '#GRAMS OR SERVINGS of #FOOD.\' If you want to remember what you did on a certain day, '
+                                '#GRAMS OR SERVINGS of #FOOD.\' Ounces, cups, spoons and slices work too. To record '
+                                'a whole meal at once, say \'I had #FOOD, '
+                                '#FOOD and #FOOD.\' To eat a past meal again, say \'Same as yesterday\'s '
+                                'breakfast.\' To save a recipe, say \'Create a recipe called #NAME with '
+                                '#FOOD and #FOOD.\' If you want to remember what you did on a certain day, '
                                 'say \'tell me about #DAY.\' If you want to see your progression on an exercise, '
                                 'say \'Show me my record with #EXERCISE.\' If you want to see all the excuses you\'ve '
                                 'given, say \'Make me disappointed in myself\' If you want to set your own '
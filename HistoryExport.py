@@ -0,0 +1,282 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from queue import Queue
+
+import boto3
+
+from fitfriend.archive import encode_archive_value, load_archived_month
+from fitfriend.model import NUTRIENTS
+
+""" --- Streaming export of dailyNutrientsAndWorkouts to JSONL, CSV or Parquet --- """
+
+FORMATS = ['jsonl', 'csv', 'parquet']
+
+# Nutrients a day never stored export as empty.
+REMAINING_COLUMNS = [nutrient + 'Remaining' for nutrient in NUTRIENTS]
+COLUMNS = ['user', 'day', 'archived'] + REMAINING_COLUMNS + ['exercisesRemaining', 'violations', 'foodLog',
+                                                             'exerciseLog', 'excuses']
+NESTED_COLUMNS = ['exercisesRemaining', 'violations', 'foodLog', 'exerciseLog', 'excuses']
+
+# Marks the end of one scan segment on the shared queue.
+SEGMENT_DONE = object()
+
+
+""" --- Pipeline stages --- """
+
+
+def scan_users(table, segment, segments):
+    kwargs = {'Segment': segment, 'TotalSegments': segments}
+    while True:
+        response = table.scan(**kwargs)
+        for item in response['Items']:
+            yield item
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_users(table, user_ids):
+    for user_id in user_ids:
+        response = table.get_item(Key={'user': user_id})
+        if 'Item' in response:
+            yield response['Item']
+
+
+def day_records(user, archive, archive_directory=None):
+    """
+    Yield one record per day, oldest first. Archived months are fetched one at a time, so at most one month of
+    cold history is held in memory per user.
+    """
+
+    history = user.get('dailyNutrientsAndWorkouts', {})
+    archived_months = sorted(user.get('archivedMonths', ()))
+    for month in archived_months:
+        days = load_archived_month(user['user'], month, archive, archive_directory)[0]
+        for day in sorted(days):
+            if day not in history:
+                yield build_record(user['user'], day, days[day], True)
+    for day in sorted(history):
+        yield build_record(user['user'], day, history[day], False)
+
+
+def build_record(user_id, day, components, archived):
+    nutrition_remaining = components.get('nutritionRemaining', {})
+    record = {
+        'user': user_id,
+        'day': day,
+        'archived': archived,
+        'exercisesRemaining': components.get('exercisesRemaining', []),
+        'violations': components.get('violations', []),
+        'foodLog': components.get('foodLog', {}),
+        'exerciseLog': components.get('exerciseLog', {}),
+        'excuses': components.get('excuses', {}),
+    }
+    for nutrient, column in zip(NUTRIENTS, REMAINING_COLUMNS):
+        record[column] = nutrition_remaining.get(nutrient)
+    return record
+
+
+def flatten_record(record):
+    row = dict(record)
+    for column in NESTED_COLUMNS:
+        row[column] = json.dumps(record[column], default=encode_archive_value, sort_keys=True)
+    for column in REMAINING_COLUMNS:
+        if row[column] is not None:
+            row[column] = float(row[column])
+    return row
+
+
+def parallel_records(table, archive, segments, queue_size=1000, archive_directory=None):
+    """
+    Scan every segment on its own thread and yield day records as they arrive. The queue is bounded, so scanners
+    block instead of buffering when the writer falls behind.
+    """
+
+    records = Queue(maxsize=queue_size)
+    errors = []
+
+    def produce(segment):
+        try:
+            for user in scan_users(table, segment, segments):
+                for record in day_records(user, archive, archive_directory):
+                    records.put(record)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            records.put(SEGMENT_DONE)
+
+    threads = [threading.Thread(target=produce, args=(segment,), daemon=True) for segment in range(segments)]
+    for thread in threads:
+        thread.start()
+    remaining = segments
+    while remaining:
+        record = records.get()
+        if record is SEGMENT_DONE:
+            remaining -= 1
+            continue
+        yield record
+    if errors:
+        raise errors[0]
+
+
+def user_records(table, archive, user_ids, archive_directory=None):
+    for user in get_users(table, user_ids):
+        for record in day_records(user, archive, archive_directory):
+            yield record
+
+
+""" --- Nutrition summary --- """
+
+
+class NutritionSummary(object):
+    """
+    Collects every exported day's remaining nutrition as it streams past, then reports the mean remaining and the
+    number of days under zero for each nutrient. Uses NumPy when it is installed.
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def observe(self, records):
+        for record in records:
+            self.rows.append([float('nan') if record[column] is None else float(record[column])
+                              for column in REMAINING_COLUMNS])
+            yield record
+
+    def report(self):
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        if numpy is not None and self.rows:
+            remaining = numpy.array(self.rows)
+            stored = ~numpy.isnan(remaining)
+            counts = stored.sum(axis=0)
+            totals = numpy.where(stored, remaining, 0.0).sum(axis=0)
+            under = (numpy.where(stored, remaining, 0.0) < 0).sum(axis=0)
+        else:
+            counts, totals, under = [0] * len(NUTRIENTS), [0.0] * len(NUTRIENTS), [0] * len(NUTRIENTS)
+            for row in self.rows:
+                for position, amount in enumerate(row):
+                    if amount == amount:
+                        counts[position] += 1
+                        totals[position] += amount
+                        under[position] += amount < 0
+        lines = []
+        for position, nutrient in enumerate(NUTRIENTS):
+            if counts[position]:
+                lines.append('{}: {:.1f} remaining on average, under zero on {} of {} days'.format(
+                    nutrient, totals[position] / counts[position], int(under[position]), int(counts[position])))
+        return lines
+
+
+""" --- Writers --- """
+
+
+def write_jsonl(records, output):
+    count = 0
+    for record in records:
+        output.write(json.dumps(record, default=encode_archive_value, sort_keys=True) + '\n')
+        count += 1
+    return count
+
+
+def write_csv(records, output):
+    writer = csv.DictWriter(output, fieldnames=COLUMNS)
+    writer.writeheader()
+    count = 0
+    for record in records:
+        writer.writerow(flatten_record(record))
+        count += 1
+    return count
+
+
+def write_parquet(records, path, batch_rows=10000):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit('Parquet export needs pyarrow: pip install pyarrow')
+
+    schema = pyarrow.schema([
+        ('user', pyarrow.string()),
+        ('day', pyarrow.string()),
+        ('archived', pyarrow.bool_()),
+    ] + [(column, pyarrow.float64()) for column in REMAINING_COLUMNS]
+      + [(column, pyarrow.string()) for column in NESTED_COLUMNS])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        batch = []
+        for record in records:
+            batch.append(flatten_record(record))
+            if len(batch) >= batch_rows:
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def export(records, output_format, output_path, batch_rows=10000):
+    if output_format == 'parquet':
+        if output_path in (None, '-'):
+            raise SystemExit('Parquet export needs an --output file')
+        return write_parquet(records, output_path, batch_rows)
+    writer = write_jsonl if output_format == 'jsonl' else write_csv
+    if output_path in (None, '-'):
+        return writer(records, sys.stdout)
+    with open(output_path, 'w', newline='') as output:
+        return writer(records, output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream users\' daily history to JSONL, CSV or Parquet.')
+    parser.add_argument('--user', action='append', help='export only these users (default: every user)')
+    parser.add_argument('--format', choices=FORMATS, help='defaults to the --output file extension, else jsonl')
+    parser.add_argument('--output', help='file to write, or - for stdout')
+    parser.add_argument('--segments', type=int, default=4, help='parallel scan segments when exporting every user')
+    parser.add_argument('--queue-size', type=int, default=1000, help='day records buffered between scan and writer')
+    parser.add_argument('--batch-rows', type=int, default=10000, help='rows per Parquet row group')
+    parser.add_argument('--archive-directory', default=os.environ.get('ARCHIVE_DIRECTORY'),
+                        help='local cold-tier object store used instead of the UsersArchive table')
+    parser.add_argument('--summary', action='store_true',
+                        help='also report average remaining nutrition per nutrient on stderr')
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args()
+
+    output_format = args.format
+    if output_format is None:
+        extension = os.path.splitext(args.output or '')[1].lstrip('.')
+        output_format = extension if extension in FORMATS else 'jsonl'
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    users = dynamodb.Table('Users')
+    archive = dynamodb.Table('UsersArchive')
+    if args.user:
+        records = user_records(users, archive, args.user, args.archive_directory)
+    else:
+        records = parallel_records(users, archive, args.segments, args.queue_size, args.archive_directory)
+
+    summary = NutritionSummary() if args.summary else None
+    if summary is not None:
+        records = summary.observe(records)
+
+    started = time.time()
+    count = export(records, output_format, args.output, args.batch_rows)
+    elapsed = time.time() - started
+    sys.stderr.write('exported {} day records in {:.1f}s ({:.0f} records/s)\n'.format(
+        count, elapsed, count / elapsed if elapsed else 0.0))
+    if summary is not None:
+        for line in summary.report():
+            sys.stderr.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
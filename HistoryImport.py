@@ -0,0 +1,533 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import InvalidOperation
+from itertools import groupby
+
+import boto3
+
+from fitfriend.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_CHUNK_BYTES, compress_days, load_archived_month
+from fitfriend.foods import get_indexed_food
+from fitfriend.meals import calculate_nutrition, unit_table
+from fitfriend.model import (CORE_NUTRIENTS, NUTRIENTS, ExerciseEntry, Food, NutritionVector, next_log_time,
+                             to_number)
+from fitfriend.rules import ViolationRules
+
+""" --- Bulk import of food and lifting history exported from other trackers --- """
+
+# Source column for every field the importer understands, plus the kind of row when the export only holds one kind.
+PRESETS = {
+    'fitfriend': {
+        'kind': None,
+        'columns': {'date': 'date', 'time': 'time', 'kind': 'type', 'name': 'name', 'measurement': 'measurement',
+                    'measurementType': 'measurementType', 'calorie': 'calorie', 'protein': 'protein',
+                    'carbohydrate': 'carbohydrate', 'fat': 'fat', 'fiber': 'fiber', 'sugar': 'sugar',
+                    'sodium': 'sodium', 'weight': 'weight', 'reps': 'reps', 'sets': 'sets', 'rpe': 'rpe',
+                    'distance': 'distance', 'duration': 'duration', 'incline': 'incline',
+                    'muscleGroup': 'muscleGroup'},
+    },
+    'myfitnesspal': {
+        'kind': 'food',
+        'columns': {'date': 'Date', 'time': 'Time', 'name': 'Meal', 'calorie': 'Calories', 'protein': 'Protein (g)',
+                    'carbohydrate': 'Carbohydrates (g)', 'fat': 'Fat (g)', 'fiber': 'Fiber', 'sugar': 'Sugar',
+                    'sodium': 'Sodium (mg)'},
+    },
+    'strong': {
+        'kind': 'exercise',
+        'columns': {'date': 'Date', 'name': 'Exercise Name', 'weight': 'Weight', 'reps': 'Reps', 'rpe': 'RPE',
+                    'distance': 'Distance', 'duration': 'Seconds'},
+    },
+}
+
+# Rows need the core NUTRIENTS; the rest default to zero and are only stored when nonzero.
+DEFAULT_TIME = '12:00:00'
+
+
+class ImportStats(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.rows = 0
+        self.imported = 0
+        self.skipped = 0
+        self.resumed = 0
+        self.days = 0
+        self.archived_months = 0
+        self.foods_created = 0
+        self.exercises_created = 0
+
+    def add(self, name, amount=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def rate(self):
+        elapsed = time.time() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+
+""" --- Reading and mapping rows --- """
+
+
+def read_rows(path, input_format):
+    """
+    Yield source rows one at a time. CSV and JSON Lines stream; a JSON array is loaded whole.
+    """
+
+    with open(path, newline='') as source:
+        if input_format == 'csv':
+            for row in csv.DictReader(source):
+                yield row
+            return
+        first = source.read(1)
+        while first and first.isspace():
+            first = source.read(1)
+        if first == '[':
+            source.seek(0)
+            for row in json.load(source):
+                yield row
+            return
+        source.seek(0)
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def parse_timestamp(value, time_value, date_format):
+    if date_format:
+        parsed = datetime.strptime(value.strip(), date_format)
+        day, logged_at = parsed.strftime('%Y-%m-%d'), parsed.strftime('%H:%M:%S')
+    else:
+        value = value.strip()
+        day = datetime.strptime(value[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+        logged_at = value[11:19] if len(value) >= 19 else DEFAULT_TIME
+    if time_value:
+        logged_at = time_value.strip()
+        if len(logged_at) == 5:
+            logged_at += ':00'
+    return day, logged_at
+
+
+def map_row(row, preset, date_format):
+    """
+    Turn one source row into (day, time, kind, name, entry, catalog item), or None when it can't be imported.
+    """
+
+    columns = preset['columns']
+
+    def field(name):
+        value = row.get(columns.get(name)) if columns.get(name) else None
+        return value.strip() if isinstance(value, str) else value
+
+    def number(name):
+        # Empty cells are missing; thousands separators are dropped.
+        value = field(name)
+        if value is None or str(value) == '':
+            return None
+        return to_number(str(value).replace(',', ''))
+
+    if not field('date') or not field('name'):
+        return None
+    day, logged_at = parse_timestamp(field('date'), field('time'), date_format)
+    kind = (field('kind') or preset['kind'] or '').lower()
+    name = field('name').lower()
+    if kind == 'food':
+        measurement = number('measurement') or 1
+        measurement_type = (field('measurementType') or 'servings').lower()
+        measurement_type = unit_table.unit(measurement_type) or measurement_type
+        nutrition = {nutrient: number(nutrient) for nutrient in NUTRIENTS}
+        if any(nutrition[nutrient] is None for nutrient in CORE_NUTRIENTS):
+            return day, logged_at, kind, name, {'FoodName': name, 'Measurement': measurement,
+                                                'MeasurementType': measurement_type}, None
+        nutrition = {nutrient: amount for nutrient, amount in nutrition.items()
+                     if nutrient in CORE_NUTRIENTS or amount}
+        food_nutrition = {nutrient: int(round(amount)) for nutrient, amount in nutrition.items()}
+        servings = measurement
+        if measurement_type == 'grams':
+            food = {'Serving': int(servings)}
+            food.update({nutrient.capitalize(): int(round(amount)) for nutrient, amount in nutrition.items()})
+        else:
+            food = {'Serving': 1}
+            food.update({nutrient.capitalize(): int(round(amount / servings))
+                         for nutrient, amount in nutrition.items()})
+        entry = {'FoodName': name, 'Measurement': measurement, 'MeasurementType': measurement_type,
+                 'FoodNutrition': food_nutrition}
+        return day, logged_at, kind, name, entry, food
+    if kind == 'exercise':
+        if name == 'run' or (field('distance') and not field('weight')):
+            duration = field('duration') or ''
+            if duration and not duration.startswith('PT'):
+                duration = 'PT{}M'.format(int(round((to_number(duration) or 0) / 60)))
+            entry = ExerciseEntry('run', distance=number('distance') or 0, duration=duration,
+                                  incline=number('incline')).to_item()
+            return day, logged_at, kind, 'run', entry, None
+        # Lifts are stored as per-set arrays, the shape RecordWeightlift writes.
+        sets = int(number('sets') or 1)
+        entry = {'ExerciseName': name, 'Weight': [number('weight') or 0] * sets,
+                 'Reps': [int(number('reps') or 0)] * sets}
+        if number('rpe'):
+            entry['RPE'] = [number('rpe')] * sets
+        return day, logged_at, kind, name, entry, {'MuscleGroup': (field('muscleGroup') or 'other').lower()}
+    return None
+
+
+def mapped_rows(rows, preset, date_format, stats):
+    for row in rows:
+        stats.add('rows')
+        try:
+            mapped = map_row(row, preset, date_format)
+        except (ValueError, InvalidOperation):
+            mapped = None
+        if mapped is None:
+            stats.add('skipped')
+            continue
+        yield mapped
+
+
+""" --- Catalog --- """
+
+
+class Catalog(object):
+    """
+    Remembers which foods and exercises exist for the user, creating missing user items through batch_writer.
+    """
+
+    def __init__(self, dynamodb, user_id, stats):
+        self.dynamodb = dynamodb
+        self.user_id = user_id
+        self.stats = stats
+        self.foods = {}
+        self.exercises = set()
+
+    def fetch(self, table_name, name_key, names):
+        found = {}
+        names = list(names)
+        for start in range(0, len(names), 50):
+            keys = [{'UserID': owner, name_key: name} for name in names[start:start + 50]
+                    for owner in ('universal', self.user_id)]
+            request = {table_name: {'Keys': keys}}
+            while request:
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response['Responses'].get(table_name, []):
+                    if item['UserID'] == self.user_id or item[name_key] not in found:
+                        found[item[name_key]] = item
+                request = response.get('UnprocessedKeys')
+        return found
+
+    def resolve_foods(self, entries):
+        """
+        Fill in nutrition for food entries that only named a known food and create the foods that are new. Returns
+        the entries that could not be resolved.
+        """
+
+        missing = set(name for name, _, _ in entries if name not in self.foods)
+        # Foods in the universal index are never stored in DynamoDB, and must not be created as user foods either.
+        for name in list(missing):
+            food = get_indexed_food(name)
+            if food is not None:
+                self.foods[name] = food.to_item('universal')
+                missing.discard(name)
+        if missing:
+            self.foods.update(self.fetch('Foods', 'FoodName', missing))
+        unresolved = []
+        with self.dynamodb.Table('Foods').batch_writer() as batch:
+            for name, entry, food in entries:
+                if name not in self.foods:
+                    if food is None:
+                        unresolved.append(entry)
+                        continue
+                    item = dict(food, UserID=self.user_id, FoodName=name)
+                    batch.put_item(Item=item)
+                    self.foods[name] = item
+                    self.stats.add('foods_created')
+                if 'FoodNutrition' not in entry:
+                    entry['FoodNutrition'] = calculate_nutrition(Food.from_item(self.foods[name]), entry['Measurement'],
+                                                                 entry['MeasurementType']).to_item()
+        return unresolved
+
+    def create_exercises(self, entries):
+        names = set(name for name, _, _ in entries if name != 'run')
+        missing = names - self.exercises
+        if missing:
+            self.exercises.update(self.fetch('Exercises', 'ExerciseName', missing))
+        with self.dynamodb.Table('Exercises').batch_writer() as batch:
+            for name, _, exercise in entries:
+                if name == 'run' or name in self.exercises:
+                    continue
+                batch.put_item(Item={'UserID': self.user_id, 'ExerciseName': name,
+                                     'MuscleGroup': exercise['MuscleGroup']})
+                self.exercises.add(name)
+                self.stats.add('exercises_created')
+
+
+""" --- Building days --- """
+
+
+def add_entry(log, logged_at, entry):
+    # Collisions move to the next free second; an identical entry already in the log means a resumed import is
+    # replaying rows it has written before.
+    while logged_at in log:
+        if log[logged_at] == entry:
+            return False
+        logged_at = next_log_time({logged_at: entry}, logged_at)
+    log[logged_at] = entry
+    return True
+
+
+def find_violations(remaining_nutrition, nutrient_goal, rules):
+    eaten = NutritionVector.from_item(nutrient_goal) - NutritionVector.from_item(remaining_nutrition)
+    return [rule['nutrient'] for rule in rules.broken(eaten)]
+
+
+def merge_day(existing, entries, nutrient_goal, rules):
+    """
+    Add the imported entries to a day (a new one when existing is None) and update its remaining nutrition.
+    """
+
+    if existing is None:
+        existing = {
+            'nutritionRemaining': dict(nutrient_goal),
+            'exercisesRemaining': [],
+            'violations': [],
+            'foodLog': {},
+            'exerciseLog': {},
+            'excuses': {}
+        }
+    remaining = existing['nutritionRemaining']
+    for logged_at, kind, entry in entries:
+        if kind == 'food':
+            if add_entry(existing['foodLog'], logged_at, entry):
+                for nutrient, amount in entry['FoodNutrition'].items():
+                    remaining[nutrient] = remaining.get(nutrient, 0) - amount
+        else:
+            add_entry(existing['exerciseLog'], logged_at, entry)
+    for violation in find_violations(remaining, nutrient_goal, rules):
+        if violation not in existing['violations']:
+            existing['violations'].append(violation)
+    return existing
+
+
+""" --- Cold-tier archive --- """
+
+
+def write_archived_months(archive, user_id, months, nutrient_goal, rules):
+    """
+    Merge a batch of months into the user's archive. Trailing chunks, then head items, then stale chunks go through
+    three batch_writer passes, so a crash can orphan chunks but never leaves a head pointing at missing ones.
+    """
+
+    trailing, heads, stale = [], [], []
+    for month, days in months:
+        archived, head = load_archived_month(user_id, month, archive)
+        for day, entries in days.items():
+            archived[day] = merge_day(archived.get(day), entries, nutrient_goal, rules)
+        blob = compress_days(archived)
+        chunks = [blob[start:start + ARCHIVE_CHUNK_BYTES] for start in range(0, len(blob), ARCHIVE_CHUNK_BYTES)]
+        previous_generation = int(head.get('generation', 0)) if head else 0
+        generation = previous_generation + 1
+        for index, chunk in enumerate(chunks[1:], 1):
+            trailing.append({'user': user_id, 'month': '{}#{}#{}'.format(month, generation, index), 'data': chunk})
+        heads.append({'user': user_id, 'month': month, 'generation': generation, 'chunks': len(chunks),
+                      'days': len(archived), 'data': chunks[0]})
+        for index in range(1, int(head.get('chunks', 1)) if head else 1):
+            stale.append({'user': user_id, 'month': '{}#{}#{}'.format(month, previous_generation, index)})
+    for items in (trailing, heads):
+        with archive.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+    with archive.batch_writer() as batch:
+        for key in stale:
+            batch.delete_item(Key=key)
+    return sum(len(days) for _, days in months)
+
+
+def write_hot_days(users, user, days, nutrient_goal, rules, days_per_update=25):
+    history = user['dailyNutrientsAndWorkouts']
+    merged = [(day, merge_day(history.get(day), entries, nutrient_goal, rules))
+              for day, entries in sorted(days.items())]
+    for start in range(0, len(merged), days_per_update):
+        batch = merged[start:start + days_per_update]
+        users.update_item(
+            Key={
+                'user': user['user']
+            },
+            UpdateExpression='set ' + ', '.join(
+                'dailyNutrientsAndWorkouts.#d{0} = :d{0}'.format(index) for index in range(len(batch))),
+            ExpressionAttributeValues={':d{}'.format(index): value for index, (_, value) in enumerate(batch)},
+            ExpressionAttributeNames={'#d{}'.format(index): day for index, (day, _) in enumerate(batch)},
+        )
+        history.update(batch)
+    return len(merged)
+
+
+""" --- Checkpoints --- """
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as checkpoint:
+            return set(json.load(checkpoint)['months'])
+    return set()
+
+
+def save_checkpoint(path, user_id, source, months):
+    if not path:
+        return
+    with open(path + '.tmp', 'w') as checkpoint:
+        json.dump({'user': user_id, 'source': source, 'months': sorted(months)}, checkpoint)
+    os.replace(path + '.tmp', path)
+
+
+""" --- Import --- """
+
+
+def month_groups(mapped):
+    """
+    Group consecutive rows by month into {day: [(time, kind, entry)]}, keeping the names and catalog items needed
+    to resolve them. Exports sorted by date in either direction stream one month at a time.
+    """
+
+    for month, rows in groupby(mapped, key=lambda row: row[0][:7]):
+        days, foods, exercises = {}, [], []
+        for day, logged_at, kind, name, entry, catalog_item in rows:
+            days.setdefault(day, []).append((logged_at, kind, entry))
+            if kind == 'food':
+                foods.append((name, entry, catalog_item))
+            else:
+                exercises.append((name, entry, catalog_item))
+        yield month, days, foods, exercises
+
+
+def import_history(dynamodb, user_id, rows, preset, date_format=None, workers=8, months_per_batch=12,
+                   checkpoint_path=None, source=None, stats=None, progress=None):
+    stats = stats or ImportStats()
+    users = dynamodb.Table('Users')
+    archive = dynamodb.Table('UsersArchive')
+    user = users.get_item(Key={'user': user_id}).get('Item')
+    if user is None:
+        raise SystemExit('User {} has not been set up yet; say "hey fitfriend" first'.format(user_id))
+    user.setdefault('dailyNutrientsAndWorkouts', {})
+    nutrient_goal = user['nutrientGoal']
+    rules = ViolationRules.for_user({'Item': user})
+    cutoff_month = time.strftime('%Y-%m', time.localtime(time.time() - ARCHIVE_AFTER_DAYS * 24 * 60 * 60))
+    completed = load_checkpoint(checkpoint_path)
+    checkpoint_lock = threading.Lock()
+    catalog = Catalog(dynamodb, user_id, stats)
+    pending, batch = [], []
+
+    def finish(months):
+        def done(future):
+            if future.exception() is not None:
+                # Left out of the checkpoint; the error is raised from the main loop.
+                return
+            stats.add('archived_months', len(months))
+            with checkpoint_lock:
+                completed.update(months)
+                save_checkpoint(checkpoint_path, user_id, source, completed)
+        return done
+
+    def submit(executor):
+        months = [month for month, _ in batch]
+        future = executor.submit(write_archived_months, archive, user_id, list(batch), nutrient_goal,
+                                 rules)
+        future.add_done_callback(finish(months))
+        pending.append(future)
+        # Keep at most two batches per worker in flight so memory stays bounded.
+        while len([future for future in pending if not future.done()]) >= workers * 2:
+            pending[0].result()
+            pending.pop(0)
+        del batch[:]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for month, days, foods, exercises in month_groups(mapped_rows(rows, preset, date_format, stats)):
+            row_count = sum(len(entries) for entries in days.values())
+            if month in completed:
+                stats.add('resumed', row_count)
+                continue
+            unresolved = catalog.resolve_foods(foods)
+            catalog.create_exercises(exercises)
+            if unresolved:
+                for day in list(days):
+                    days[day] = [row for row in days[day] if not any(row[2] is entry for entry in unresolved)]
+                    if not days[day]:
+                        del days[day]
+                stats.add('skipped', len(unresolved))
+                row_count -= len(unresolved)
+            stats.add('imported', row_count)
+            stats.add('days', len(days))
+            if month >= cutoff_month:
+                write_hot_days(users, user, days, nutrient_goal, rules)
+                with checkpoint_lock:
+                    completed.add(month)
+                    save_checkpoint(checkpoint_path, user_id, source, completed)
+            else:
+                batch.append((month, days))
+                if len(batch) >= months_per_batch:
+                    submit(executor)
+            if progress:
+                progress(stats)
+        if batch:
+            submit(executor)
+        for future in pending:
+            future.result()
+
+    archived_months = set(month for month in completed if month < cutoff_month)
+    if archived_months:
+        users.update_item(
+            Key={
+                'user': user_id
+            },
+            UpdateExpression='add archivedMonths :m',
+            ExpressionAttributeValues={
+                ':m': archived_months
+            },
+        )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import food and lifting history exported from another tracker.')
+    parser.add_argument('path', help='CSV, JSON array or JSON Lines export')
+    parser.add_argument('--user', required=True, help='Lex userId to import into')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='fitfriend', help='source column layout')
+    parser.add_argument('--mapping', help='JSON file overriding preset columns, e.g. {"calorie": "kcal"}')
+    parser.add_argument('--kind', choices=['food', 'exercise'], help='treat every row as this kind')
+    parser.add_argument('--format', choices=['csv', 'json'], help='defaults to the file extension')
+    parser.add_argument('--date-format', help='strptime format of the date column (default ISO 8601)')
+    parser.add_argument('--workers', type=int, default=8, help='parallel archive writers')
+    parser.add_argument('--months-per-batch', type=int, default=12, help='archived months per batch_writer batch')
+    parser.add_argument('--checkpoint', help='resume file (default: <path>.<user>.checkpoint.json)')
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args()
+
+    preset = {'kind': args.kind or PRESETS[args.preset]['kind'], 'columns': dict(PRESETS[args.preset]['columns'])}
+    if args.mapping:
+        with open(args.mapping) as mapping:
+            preset['columns'].update(json.load(mapping))
+    input_format = args.format or ('csv' if args.path.lower().endswith('.csv') else 'json')
+    checkpoint_path = args.checkpoint or '{}.{}.checkpoint.json'.format(args.path, args.user)
+    last_report = [time.time()]
+
+    def progress(stats):
+        if time.time() - last_report[0] >= 5:
+            last_report[0] = time.time()
+            sys.stderr.write('{} rows read, {} imported ({:.0f} rows/s)\n'.format(stats.rows, stats.imported,
+                                                                                 stats.rate()))
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    stats = import_history(dynamodb, args.user, read_rows(args.path, input_format), preset, args.date_format,
+                           args.workers, args.months_per_batch, checkpoint_path, os.path.abspath(args.path),
+                           progress=progress)
+    print('{} rows read in {:.1f}s ({:.0f} rows/s): {} imported, {} skipped, {} already imported'.format(
+        stats.rows, time.time() - stats.started, stats.rate(), stats.imported, stats.skipped, stats.resumed))
+    print('{} days, {} archived months, {} foods and {} exercises created'.format(
+        stats.days, stats.archived_months, stats.foods_created, stats.exercises_created))
+
+
+if __name__ == '__main__':
+    main()
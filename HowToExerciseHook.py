@@ -1,12 +1,13 @@
-import boto3
 import time
 import os
 import logging
-from boto3.dynamodb.conditions import Key, Attr
+import bisect
+import json
+from boto3.dynamodb.conditions import Key
+
+from fitfriend.catalog import get_catalog_item, get_universal_catalog
+from fitfriend.tables import emit_invocation_metrics, exercises, start_invocation_metrics, users
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-exercises = dynamodb.Table('Exercises')
-users = dynamodb.Table('Users')
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -111,12 +112,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -161,38 +157,91 @@ def build_validation_result(is_valid, violated_slot, message_content):
 
 
 def is_valid_exercise(exercise, intent_request):
-    response = exercises.get_item(
-        Key={
-            'UserID': 'universal',
-            'ExerciseName': exercise.lower()
-        }
-    )
-    if 'Item' in response:
-        return True
-    return False
-
-
-def get_known_exercises(intent_request):
-    response = exercises.query(
-        KeyConditionExpression=Key('UserID').eq('universal')
-    )
-    known_exercises = ""
-    for i in response['Items'][0:-1]:
-        known_exercises += i['ExerciseName'] + ', '
-    known_exercises += 'and ' + response['Items'][-1]['ExerciseName'] + '.'
-    return known_exercises
+    return get_universal_exercise(exercise, intent_request) is not None
 
 
-def validate_how_to_exercise(exercise, intent_request):
+def validate_how_to_exercise(exercise, intent_request, session_attributes):
     if exercise is not None:
+        if exercise.lower() in MORE_REPLIES and 'exerciseListCursor' in session_attributes:
+            return build_validation_result(False, 'Exercise', get_known_exercises(session_attributes))
         if not is_valid_exercise(exercise, intent_request):
+            try_ex(lambda: session_attributes.pop('exerciseListCursor'))
             return build_validation_result(False, 'Exercise',
                                            'Hm, I\'m not sure how to do that one. Here\'s what I do know: {}'.format(
-                                               get_known_exercises(intent_request)))
+                                               get_known_exercises(session_attributes)))
 
     return build_validation_result(True, None, None)
 
 
+""" --- Catalog lookup caches --- """
+
+
+def get_universal_exercise(exercise, intent_request):
+    # Only universal exercises come with instructions; a user's own exercise of the same name has none to give.
+    item = get_catalog_item(exercise.lower(), exercises, 'ExerciseName', intent_request)
+    if item is None or 'HowTo' not in item:
+        return None
+    return item
+
+
+""" --- Known exercise listing --- """
+
+# Lex caps a message at 1,000 characters; this leaves room for the prompt around the list.
+EXERCISE_LIST_MAX_CHARS = int(os.environ.get('EXERCISE_LIST_MAX_CHARS', 700))
+# Exercises read per Query page when the catalog is too large to prefetch.
+EXERCISE_LIST_QUERY_LIMIT = 50
+MORE_REPLIES = ['more', 'next', 'show more', 'more exercises', 'keep going']
+
+
+def remaining_exercises(after):
+    """
+    Return ([(muscle group, exercise name)], more) for the exercises after the cursor. A prefetched catalog is listed
+    by muscle group; a larger one pages through the universal partition by name, one Query per page.
+    """
+
+    items, _ = get_universal_catalog(exercises, 'ExerciseName')
+    if items is not None:
+        entries = sorted((item.get('MuscleGroup', 'other'), name) for name, item in items.items())
+        return entries[bisect.bisect_right(entries, tuple(after)) if after else 0:], False
+    kwargs = {
+        'KeyConditionExpression': Key('UserID').eq('universal'),
+        'Limit': EXERCISE_LIST_QUERY_LIMIT
+    }
+    if after:
+        kwargs['ExclusiveStartKey'] = {'UserID': 'universal', 'ExerciseName': after[1]}
+    response = exercises.query(**kwargs)
+    entries = [(item.get('MuscleGroup', 'other'), item['ExerciseName']) for item in response['Items']]
+    return entries, 'LastEvaluatedKey' in response
+
+
+def format_exercise_groups(entries):
+    groups = {}
+    for muscle_group, exercise in entries:
+        groups.setdefault(muscle_group, []).append(exercise)
+    return ' '.join('{}: {}.'.format(muscle_group.capitalize(), ', '.join(groups[muscle_group]))
+                    for muscle_group in sorted(groups))
+
+
+def get_known_exercises(session_attributes):
+    """
+    Return the next page of known exercises, grouped by muscle group, and move the exerciseListCursor session
+    attribute past it. The cursor is dropped once the list is finished.
+    """
+
+    cursor = try_ex(lambda: session_attributes['exerciseListCursor'])
+    entries, more = remaining_exercises(json.loads(cursor) if cursor else None)
+    shown = 1 if entries else 0
+    while shown < len(entries) and len(format_exercise_groups(entries[:shown + 1])) <= EXERCISE_LIST_MAX_CHARS:
+        shown += 1
+    if shown and (shown < len(entries) or more):
+        session_attributes['exerciseListCursor'] = json.dumps(list(entries[shown - 1]))
+        return format_exercise_groups(entries[:shown]) + ' Say "more" to hear the rest.'
+    try_ex(lambda: session_attributes.pop('exerciseListCursor'))
+    if shown == 0:
+        return 'I don\'t have any exercises to show you yet.'
+    return format_exercise_groups(entries[:shown])
+
+
 """ --- Functions that control the bot's behavior --- """
 
 
@@ -232,27 +281,23 @@ def how_to_exercise(intent_request):
                 # Use the elicitSlot dialog action to re-prompt for the first violation detected.
         slots = get_slots(intent_request)
 
-        validation_result = validate_how_to_exercise(exercise_name, intent_request)
+        validation_result = validate_how_to_exercise(exercise_name, intent_request, session_attributes)
         if not validation_result['isValid']:
             slots[validation_result['violatedSlot']] = None
-            return elicit_slot(intent_request['sessionAttributes'],
+            return elicit_slot(session_attributes,
                                intent_request['currentIntent']['name'],
                                slots,
                                validation_result['violatedSlot'],
                                validation_result['message'])
 
+        try_ex(lambda: session_attributes.pop('exerciseListCursor'))
         return delegate(session_attributes, get_slots(intent_request))
-    exercise = exercises.get_item(
-        Key={
-            'UserID': 'universal',
-            'ExerciseName': exercise_name.lower()
-        }
-    )
+    exercise = get_universal_exercise(exercise_name, intent_request)
     return close(intent_request['sessionAttributes'],
                  'Fulfilled',
                  {
                      'contentType': 'PlainText',
-                     'content': 'Here\'s how to do {}: {}'.format(exercise_name, exercise['Item']['HowTo'])
+                     'content': 'Here\'s how to do {}: {}'.format(exercise_name, exercise['HowTo'])
                  })
 
 
@@ -288,5 +333,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
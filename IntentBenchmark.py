@@ -0,0 +1,250 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import FakeDynamoDB
+import LexEventHarness
+
+""" --- Per-intent latency, memory and read-volume scaling with history length --- """
+
+HISTORY_SIZES = [1, 30, 365, 1825]
+
+BENCHMARK_USER = 'benchmark-user'
+BENCHMARK_FOOD = {'UserID': BENCHMARK_USER, 'FoodName': 'protein shake', 'Serving': '1', 'Calorie': '160',
+                  'Protein': '30', 'Carbohydrate': '5', 'Fat': '2'}
+
+# (scenario, intent, invocation source, slots, session attributes, seed today's day?)
+SCENARIOS = [
+    ('GetDayInformation', 'GetDayInformation', 'DialogCodeHook', {'Day': 'oldest'}, {}, True),
+    ('GetDayInformation', 'GetDayInformation', 'FulfillmentCodeHook', {'Day': 'oldest'}, {}, True),
+    ('GetExerciseHistory', 'GetExerciseHistory', 'DialogCodeHook', {'Exercise': 'bench press'}, {}, True),
+    ('GetExerciseHistory', 'GetExerciseHistory', 'FulfillmentCodeHook', {'Exercise': 'bench press'}, {}, True),
+    ('GetExcuses', 'GetExcuses', 'DialogCodeHook', {}, {}, True),
+    ('GetExcuses', 'GetExcuses', 'FulfillmentCodeHook', {}, {}, True),
+    ('RecordMeal', 'RecordMeal', 'DialogCodeHook',
+     {'FoodName': 'protein shake', 'Measurement': '2', 'MeasurementType': 'servings'}, {}, True),
+    ('RecordMeal', 'RecordMeal', 'FulfillmentCodeHook',
+     {'FoodName': 'protein shake', 'Measurement': '2', 'MeasurementType': 'servings'}, {}, True),
+    ('RecordFullMeal', 'RecordFullMeal', 'DialogCodeHook',
+     {'Meal': '2 servings of protein shake, 150 grams of chicken breast and a banana'}, {}, True),
+    ('RecordFullMeal', 'RecordFullMeal', 'FulfillmentCodeHook',
+     {'Meal': '2 servings of protein shake, 150 grams of chicken breast and a banana'}, {}, True),
+    ('RepeatMeal', 'RepeatMeal', 'DialogCodeHook', {'MealTime': 'breakfast', 'Day': 'yesterday'}, {}, True),
+    ('RepeatMeal', 'RepeatMeal', 'FulfillmentCodeHook', {'MealTime': 'breakfast', 'Day': 'yesterday'}, {}, True),
+    ('CreateRecipe', 'CreateRecipe', 'DialogCodeHook',
+     {'RecipeName': 'chicken rice bowl', 'Ingredients': '150 grams of chicken breast, a protein shake and a banana',
+      'Servings': '2'}, {}, True),
+    ('CreateRecipe', 'CreateRecipe', 'FulfillmentCodeHook',
+     {'RecipeName': 'chicken rice bowl', 'Ingredients': '150 grams of chicken breast, a protein shake and a banana',
+      'Servings': '2'}, {}, True),
+    ('RecordWeightlift', 'RecordWeightlift', 'DialogCodeHook',
+     {'Exercise': 'bench press', 'Weight': '185', 'Reps': '8', 'Sets': '3'}, {}, True),
+    ('RecordWeightlift', 'RecordWeightlift', 'FulfillmentCodeHook',
+     {'Exercise': 'bench press', 'Weight': '185', 'Reps': '8', 'Sets': '3'}, {}, True),
+    ('RecordWeightliftSession', 'RecordWeightliftSession', 'DialogCodeHook',
+     {'Session': 'bench press 185x8, 185x8, 175x6 @ 9; squat 3 sets of 5 at 225; deadlift 315 for 5'}, {}, True),
+    ('RecordWeightliftSession', 'RecordWeightliftSession', 'FulfillmentCodeHook',
+     {'Session': 'bench press 185x8, 185x8, 175x6 @ 9; squat 3 sets of 5 at 225; deadlift 315 for 5'}, {}, True),
+    ('RecordRun', 'RecordRun', 'DialogCodeHook', {'Distance': '5', 'Duration': 'PT30M', 'Incline': '1'}, {}, True),
+    ('RecordRun', 'RecordRun', 'FulfillmentCodeHook',
+     {'Distance': '5', 'Duration': 'PT30M', 'Incline': '1'}, {}, True),
+    ('GiveExcuse', 'GiveExcuse', 'FulfillmentCodeHook', {'Violation': 'calorie', 'Excuse': 'I was sick'}, {}, True),
+    ('CreateWorkout', 'CreateWorkout', 'DialogCodeHook',
+     {'Monday': 'bench press, fly', 'Tuesday': 'run', 'Wednesday': 'deadlift, pull up', 'Thursday': 'rest',
+      'Friday': 'overhead press', 'Saturday': 'rest', 'Sunday': 'squat, leg press'}, {}, True),
+    ('CreateWorkout', 'CreateWorkout', 'FulfillmentCodeHook',
+     {'Monday': 'bench press, fly', 'Tuesday': 'run', 'Wednesday': 'deadlift, pull up', 'Thursday': 'rest',
+      'Friday': 'overhead press', 'Saturday': 'rest', 'Sunday': 'squat, leg press'}, {}, True),
+    ('SetOwnGoal', 'SetOwnGoal', 'FulfillmentCodeHook',
+     {'CalorieGoal': '2500', 'ProteinGoal': '190', 'CarbohydrateGoal': '250', 'FatGoal': '80'}, {}, True),
+    ('GetHowToExercise', 'GetHowToExercise', 'DialogCodeHook', {'Exercise': 'squat'}, {}, True),
+    ('GetExercisesForMuscleGroup', 'GetExercisesForMuscleGroup', 'DialogCodeHook', {'MuscleGroup': 'legs'}, {},
+     True),
+    ('GetExercisesForMuscleGroup', 'GetExercisesForMuscleGroup', 'FulfillmentCodeHook', {'MuscleGroup': 'legs'}, {},
+     True),
+    ('CreateFoods', 'CreateFoods', 'FulfillmentCodeHook',
+     {'FoodName': 'tempeh', 'Serving': '100', 'Calorie': '190', 'Protein': '20', 'Carbohydrate': '8', 'Fat': '11'},
+     {}, True),
+    ('CreateExercise', 'CreateExercise', 'FulfillmentCodeHook', {'Exercise': 'hip thrust', 'MuscleGroup': 'legs'}, {},
+     True),
+    ('NewDayCheck', 'RecordMeal', 'DialogCodeHook',
+     {'FoodName': 'protein shake', 'Measurement': '2', 'MeasurementType': 'servings'}, {}, False),
+]
+
+""" --- Helper Functions --- """
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2.0
+
+
+def build_users(days, seed):
+    users = {}
+    for today_logged in (True, False):
+        user = LexEventHarness.generate_user(BENCHMARK_USER, days, random.Random(seed), today_logged)
+        users[today_logged] = FakeDynamoDB.normalize(user)
+    return users
+
+
+def reset(fake, user):
+    # Bypass put_item so resetting the user is not timed and is not subject to the item size limit.
+    table = fake.Table('Users')
+    with table.lock:
+        table.items[(BENCHMARK_USER,)] = FakeDynamoDB.normalize(user)
+
+
+def build_scenario_event(intent_name, source, slots, session_attributes, user):
+    slots = dict(slots)
+    if slots.get('Day') == 'oldest':
+        slots['Day'] = sorted(user['dailyNutrientsAndWorkouts'].keys())[0]
+    elif slots.get('Day') == 'yesterday':
+        # A one-day history only has today to repeat.
+        slots['Day'] = sorted(user['dailyNutrientsAndWorkouts'].keys())[-2:][0]
+    return LexEventHarness.build_event(BENCHMARK_USER, intent_name, slots, source, 'None', session_attributes)
+
+
+def measure(fake, scenario, user, repeats):
+    name, intent_name, source, slots, session_attributes, today_logged = scenario
+    handler = LexEventHarness.route_to_hook
+    timings, stats, error = [], None, None
+    for repeat in range(repeats):
+        reset(fake, user)
+        event = build_scenario_event(intent_name, source, slots, session_attributes, user)
+        FakeDynamoDB.start_recording()
+        started = time.perf_counter()
+        try:
+            handler(event, None)
+        except Exception as e:
+            error = '{}: {}'.format(type(e).__name__, e)
+        timings.append(time.perf_counter() - started)
+        stats = FakeDynamoDB.stop_recording()
+
+    reset(fake, user)
+    event = build_scenario_event(intent_name, source, slots, session_attributes, user)
+    tracemalloc.start()
+    try:
+        handler(event, None)
+    except Exception:
+        pass
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'scenario': name,
+        'intent': intent_name,
+        'source': source,
+        'wallMs': {
+            'min': round(min(timings) * 1000, 4),
+            'median': round(median(timings) * 1000, 4),
+            'mean': round(sum(timings) / len(timings) * 1000, 4),
+        },
+        'peakMemoryBytes': peak_memory,
+        'bytesRead': stats['bytesRead'],
+        'bytesWritten': stats['bytesWritten'],
+        'dynamoCalls': stats['calls'],
+        'error': error,
+    }
+
+
+def run(sizes=None, repeats=5, seed=0, scenarios=None):
+    sizes = sizes or HISTORY_SIZES
+    scenarios = [scenario for scenario in SCENARIOS if scenarios is None or scenario[0] in scenarios]
+    fake = FakeDynamoDB.FakeDynamoDB(max_item_size=None)
+    LexEventHarness.seed_catalog(fake)
+    fake.Table('Foods').put_item(Item=BENCHMARK_FOOD)
+    LexEventHarness.prepare(fake)
+    results = []
+    for days in sizes:
+        users = build_users(days, seed)
+        for scenario in scenarios:
+            user = users[scenario[5]]
+            result = measure(fake, scenario, user, repeats)
+            result['days'] = days
+            result['itemBytes'] = FakeDynamoDB.item_size(user)
+            results.append(result)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeats': repeats,
+            'seed': seed,
+            'sizes': sizes,
+        },
+        'results': results,
+    }
+
+
+def result_key(result):
+    return result['scenario'], result['source'], result['days']
+
+
+def compare(report, baseline):
+    """
+    Pair every result with the baseline result for the same scenario, source and history size and return
+    (key, wall time ratio, bytes read ratio) rows.
+    """
+
+    previous = {result_key(result): result for result in baseline['results']}
+    rows = []
+    for result in report['results']:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        wall_ratio = result['wallMs']['median'] / old['wallMs']['median'] if old['wallMs']['median'] else 0.0
+        read_ratio = float(result['bytesRead']) / old['bytesRead'] if old['bytesRead'] else 0.0
+        rows.append((result_key(result), wall_ratio, read_ratio))
+    return rows
+
+
+def print_report(report):
+    print('{:<20}{:<22}{:>6}{:>12}{:>12}{:>14}{:>12}'.format('scenario', 'source', 'days', 'item bytes', 'median ms',
+                                                          'peak mem', 'bytes read'))
+    for result in report['results']:
+        print('{:<20}{:<22}{:>6}{:>12}{:>12.3f}{:>14}{:>12}{}'.format(
+            result['scenario'], result['source'], result['days'], result['itemBytes'], result['wallMs']['median'],
+            result['peakMemoryBytes'], result['bytesRead'], '  ' + result['error'] if result['error'] else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every intent handler against growing user histories.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=HISTORY_SIZES, help='days of history to seed')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', help='only run these scenarios')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against a previous JSON result file')
+    parser.add_argument('--max-slowdown', type=float, default=None,
+                        help='exit non-zero when a median wall time exceeds the baseline by this factor')
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.repeats, args.seed, args.scenario)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            rows = compare(report, json.load(baseline_file))
+        regressions = 0
+        print('')
+        print('{:<20}{:<22}{:>6}{:>12}{:>12}'.format('scenario', 'source', 'days', 'wall x', 'read x'))
+        for (scenario, source, days), wall_ratio, read_ratio in rows:
+            print('{:<20}{:<22}{:>6}{:>12.2f}{:>12.2f}'.format(scenario, source, days, wall_ratio, read_ratio))
+            if args.max_slowdown is not None and wall_ratio > args.max_slowdown:
+                regressions += 1
+        if regressions:
+            print('{} scenarios slowed down by more than {}x'.format(regressions, args.max_slowdown))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,589 @@
+import argparse
+import importlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import CatalogSync
+import FakeDynamoDB
+from fitfriend import catalog
+
+""" --- Synthetic Lex V1 traffic for the FitFriend hooks --- """
+
+BOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.json')
+
+INTENT_HOOKS = {
+    'GetDayInformation': 'GetDayInfoHook',
+    'RecordRun': 'RecordRunHook',
+    'CreateExercise': 'CreateExerciseHook',
+    'GiveExcuse': 'GiveExcuseHook',
+    'RecordMeal': 'RecordMealHook',
+    'RecordFullMeal': 'RecordMealHook',
+    'RepeatMeal': 'RecordMealHook',
+    'CreateFoods': 'CreateFoodsHook',
+    'CreateRecipe': 'CreateFoodsHook',
+    'RecordWeightlift': 'RecordWeightLiftHook',
+    'RecordWeightliftSession': 'RecordWeightLiftHook',
+    'Personalize': 'PersonalizeHook',
+    'GetExerciseHistory': 'GetExerciseHistoryHook',
+    'Help': 'HelpHook',
+    'CreateWorkout': 'CreateWorkoutHook',
+    'GetHowToExercise': 'HowToExerciseHook',
+    'GetExercisesForMuscleGroup': 'GetExercisesForMuscleGroupHook',
+    'SetOwnGoal': 'SetOwnGoalHook',
+    'GetExcuses': 'GetExcusesHook',
+}
+
+# Slots in the order Lex elicits them.
+SLOT_ORDER = {
+    'GetDayInformation': ['Day'],
+    'RecordRun': ['Distance', 'Duration', 'Incline'],
+    'CreateExercise': ['Exercise', 'MuscleGroup'],
+    'GiveExcuse': ['Violation', 'Excuse'],
+    'RecordMeal': ['FoodName', 'Measurement', 'MeasurementType'],
+    'RecordFullMeal': ['Meal'],
+    'RepeatMeal': ['MealTime', 'Day'],
+    'CreateFoods': ['FoodName', 'Serving', 'Calorie', 'Protein', 'Carbohydrate', 'Fat'],
+    'CreateRecipe': ['RecipeName', 'Ingredients', 'Servings'],
+    'RecordWeightlift': ['Exercise', 'Weight', 'Reps', 'Sets'],
+    'RecordWeightliftSession': ['Session'],
+    'Personalize': ['Name', 'Gender', 'Age', 'MeasurementSystem', 'Height', 'Weight', 'Goal', 'Activity'],
+    'GetExerciseHistory': ['Exercise'],
+    'Help': [],
+    'CreateWorkout': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+    'GetHowToExercise': ['Exercise'],
+    'GetExercisesForMuscleGroup': ['MuscleGroup'],
+    'SetOwnGoal': ['CalorieGoal', 'ProteinGoal', 'CarbohydrateGoal', 'FatGoal', 'NutrientRules',
+                   'CreditExerciseCalories'],
+    'GetExcuses': [],
+}
+
+OPTIONAL_SLOTS = {
+    'RecordRun': ['Incline'],
+    'SetOwnGoal': ['NutrientRules', 'CreditExerciseCalories'],
+}
+
+# How often each intent starts a conversation.
+INTENT_WEIGHTS = {
+    'RecordMeal': 30,
+    'RecordFullMeal': 8,
+    'RepeatMeal': 4,
+    'RecordWeightlift': 18,
+    'RecordWeightliftSession': 6,
+    'RecordRun': 8,
+    'GetDayInformation': 8,
+    'GetExerciseHistory': 6,
+    'GetHowToExercise': 5,
+    'GetExercisesForMuscleGroup': 3,
+    'GetExcuses': 3,
+    'GiveExcuse': 2,
+    'CreateFoods': 4,
+    'CreateRecipe': 3,
+    'CreateExercise': 3,
+    'CreateWorkout': 4,
+    'SetOwnGoal': 2,
+    'Personalize': 4,
+    'Help': 3,
+}
+
+# (name, muscle group, how-to link) and (name, serving grams, calorie, protein, carbohydrate, fat) from the catalog
+# data files CatalogSync seeds the 'universal' partition from.
+UNIVERSAL_EXERCISES = [(name, item['MuscleGroup'], item['HowTo'])
+                       for name, item in CatalogSync.load_catalog('exercises')[1].items()]
+UNIVERSAL_FOODS = [(name, int(item['Serving']), int(item['Calorie']), int(item['Protein']), int(item['Carbohydrate']),
+                    int(item['Fat'])) for name, item in CatalogSync.load_catalog('foods')[1].items()]
+
+UNKNOWN_FOODS = ['dragon fruit', 'tempeh', 'kimchi fried rice', 'protein bar', 'acai bowl', 'pho']
+RECIPE_NAMES = ['chicken rice bowl', 'overnight oats', 'protein pancakes', 'breakfast burrito', 'pasta bake']
+UNKNOWN_EXERCISES = ['hip thrust', 'face pull', 'lat pulldown', 'cable crossover', 'romanian deadlift']
+EXCUSES = ['I was at a wedding', 'I was sick', 'It was my birthday', 'I had a long day at work', 'I was traveling']
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+""" --- Seeding the stand-in tables --- """
+
+
+def local_today():
+    os.environ['TZ'] = 'America/New_York'
+    time.tzset()
+    return time.time()
+
+
+def day_string(timestamp):
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+
+def seed_catalog(fake):
+    for kind in CatalogSync.CATALOGS:
+        CatalogSync.sync_catalog(fake, kind)
+
+
+def workout_schedule():
+    return {'Monday': ['bench press', 'fly', 'biceps curl', 'triceps extension'],
+            'Tuesday': ['run'],
+            'Wednesday': ['deadlift', 'bent over row', 'pull up'],
+            'Thursday': ['rest'],
+            'Friday': ['overhead press', 'shoulder press'],
+            'Saturday': ['rest'],
+            'Sunday': ['squat', 'leg press']}
+
+
+def generate_day(rng, timestamp, nutrient_goal, schedule):
+    weekday = time.strftime('%A', time.localtime(timestamp))
+    planned = list(schedule[weekday])
+    remaining = dict(nutrient_goal)
+    food_log = {}
+    for meal in range(rng.randint(2, 5)):
+        name, serving, calorie, protein, carbohydrate, fat = rng.choice(UNIVERSAL_FOODS)
+        servings = rng.randint(1, 3)
+        nutrition = {'calorie': servings * calorie, 'protein': servings * protein,
+                     'carbohydrate': servings * carbohydrate, 'fat': servings * fat}
+        for nutrient, amount in nutrition.items():
+            remaining[nutrient] -= amount
+        food_log['{:02d}:{:02d}:{:02d}'.format(7 + meal * 3, rng.randint(0, 59), rng.randint(0, 59))] = {
+            'FoodName': name, 'Measurement': str(servings), 'MeasurementType': 'servings',
+            'FoodNutrition': nutrition}
+    exercise_log = {}
+    exercises_remaining = list(planned)
+    if planned[0] != 'rest':
+        for index, exercise in enumerate(planned):
+            if rng.random() < 0.2:
+                continue
+            logged_at = '{:02d}:{:02d}:{:02d}'.format(17 + index // 3, rng.randint(0, 59), rng.randint(0, 59))
+            if exercise == 'run':
+                exercise_log[logged_at] = {'ExerciseName': 'run', 'Distance': str(rng.randint(2, 10)),
+                                           'Duration': 'PT{}M'.format(rng.randint(15, 70)),
+                                           'Incline': str(rng.randint(0, 3))}
+            elif rng.random() < 0.5:
+                # Lifts logged before per-set arrays kept one Weight/Reps/Sets triple as strings.
+                exercise_log[logged_at] = {'ExerciseName': exercise, 'Weight': str(rng.randint(4, 60) * 5),
+                                           'Reps': str(rng.randint(5, 12)), 'Sets': str(rng.randint(3, 5))}
+            else:
+                sets = rng.randint(3, 5)
+                weight = rng.randint(4, 60) * 5
+                exercise_log[logged_at] = {'ExerciseName': exercise,
+                                           'Weight': [weight - 5 * rng.randint(0, 2) for _ in range(sets)],
+                                           'Reps': [rng.randint(5, 12) for _ in range(sets)],
+                                           'RPE': [rng.randint(6, 10) for _ in range(sets)]}
+            exercises_remaining.remove(exercise)
+    violations = [nutrient for nutrient, amount in remaining.items()
+                  if amount < (0 if nutrient == 'calorie' else -int(0.1 * nutrient_goal[nutrient]))]
+    excuses = {}
+    if violations and rng.random() < 0.5:
+        excuses['21:{:02d}:00'.format(rng.randint(0, 59))] = {'Excuse': rng.choice(EXCUSES),
+                                                              'Violation': list(violations)}
+    return {'nutritionRemaining': remaining, 'exercisesRemaining': exercises_remaining, 'violations': violations,
+            'foodLog': food_log, 'exerciseLog': exercise_log, 'excuses': excuses}
+
+
+def generate_user(user_id, days, rng, today_logged=True):
+    """
+    Build a Users item shaped like the one PersonalizeHook writes, with `days` days of history ending today
+    (or yesterday, when today_logged is False, so the hooks take their new-day path).
+    """
+
+    now = local_today()
+    nutrient_goal = {'calorie': 2400, 'protein': 180, 'carbohydrate': 240, 'fat': 80}
+    schedule = workout_schedule()
+    history = {}
+    last = 0 if today_logged else 1
+    for offset in range(last + days - 1, last - 1, -1):
+        timestamp = now - offset * 86400
+        history[day_string(timestamp)] = generate_day(rng, timestamp, nutrient_goal, schedule)
+    return {
+        'user': user_id,
+        'name': 'user {}'.format(user_id),
+        'gender': 'male',
+        'age': '29',
+        'measurementSystem': rng.choice(['imperial system', 'metric system']),
+        'height': '70',
+        'weight': '180',
+        'goal': 'maintain weight',
+        'activity': 'moderate',
+        'nutrientGoal': nutrient_goal,
+        'workoutSchedule': schedule,
+        'dailyNutrientsAndWorkouts': history,
+    }
+
+
+def seed_user(fake, user_id, days, rng, today_logged=True):
+    user = generate_user(user_id, days, rng, today_logged)
+    fake.Table('Users').put_item(Item=user)
+    return user
+
+
+""" --- Event generation --- """
+
+
+def load_intents(bot_file=BOT_FILE):
+    with open(bot_file) as bot:
+        return [intent['intentName'] for intent in json.load(bot)['intents']]
+
+
+def build_event(user_id, intent_name, slots, source, confirmation_status, session_attributes, transcript=''):
+    return {
+        'messageVersion': '1.0',
+        'invocationSource': source,
+        'userId': user_id,
+        'sessionAttributes': dict(session_attributes) if session_attributes is not None else None,
+        'requestAttributes': None,
+        'bot': {'name': 'FitFriend', 'alias': '$LATEST', 'version': '$LATEST'},
+        'outputDialogMode': 'Text',
+        'currentIntent': {
+            'name': intent_name,
+            'slots': dict(slots),
+            'slotDetails': {name: {'resolutions': [], 'originalValue': value} for name, value in slots.items()},
+            'confirmationStatus': confirmation_status,
+        },
+        'inputTranscript': transcript,
+    }
+
+
+def sample_slot(rng, intent_name, slot, user, unknown_rate):
+    history = sorted(user['dailyNutrientsAndWorkouts'].keys()) if user is not None else []
+    if slot == 'FoodName':
+        if intent_name == 'RecordMeal' and rng.random() < unknown_rate:
+            return rng.choice(UNKNOWN_FOODS)
+        return rng.choice(UNIVERSAL_FOODS)[0]
+    if slot in ('Meal', 'Ingredients'):
+        names = [rng.choice(UNIVERSAL_FOODS)[0] for _ in range(rng.randint(2, 5))]
+        if rng.random() < unknown_rate:
+            names[-1] = rng.choice(UNKNOWN_FOODS)
+        amounts = [rng.choice(['a', '2', '{} grams of'.format(rng.randint(50, 300)), '1 serving of', '',
+                               '{} oz'.format(rng.randint(2, 12)), '1 cup of', '2 tbsp', '1.5 cups of'])
+                   for _ in names]
+        foods = [' '.join([amount, name]).strip() for amount, name in zip(amounts, names)]
+        return ', '.join(foods[:-1]) + ' and ' + foods[-1]
+    if slot == 'Session':
+        lifts = []
+        for _ in range(rng.randint(1, 4)):
+            name = rng.choice(UNIVERSAL_EXERCISES)[0]
+            if rng.random() < unknown_rate / 2:
+                name = rng.choice(UNKNOWN_EXERCISES)
+            if rng.random() < 0.3:
+                lifts.append('{} {} sets of {} at {}'.format(name, rng.randint(2, 5), rng.randint(3, 12),
+                                                             rng.randint(4, 60) * 5))
+            else:
+                lifts.append('{} {}'.format(name, ', '.join(
+                    '{}x{}{}'.format(rng.randint(4, 60) * 5, rng.randint(3, 12),
+                                     ' @ {}'.format(rng.randint(6, 10)) if rng.random() < 0.3 else '')
+                    for _ in range(rng.randint(1, 5)))))
+        return '; '.join(lifts)
+    if slot == 'Exercise':
+        if intent_name in ('RecordWeightlift', 'CreateExercise') and rng.random() < unknown_rate:
+            return rng.choice(UNKNOWN_EXERCISES)
+        return rng.choice(UNIVERSAL_EXERCISES)[0]
+    if slot in WEEKDAYS:
+        if rng.random() < 0.3:
+            return 'rest'
+        exercises = [rng.choice(UNIVERSAL_EXERCISES)[0] for _ in range(rng.randint(1, 3))]
+        if rng.random() < unknown_rate / 3:
+            exercises.append(rng.choice(UNKNOWN_EXERCISES))
+        if rng.random() < 0.1:
+            exercises.append(rng.choice(['legs', 'back', 'chest', 'arms']))
+        return ', '.join(exercises)
+    values = {
+        'MealTime': lambda: rng.choice(['breakfast', 'lunch', 'dinner', 'Dinner']),
+        'Day': lambda: rng.choice(history) if history else day_string(time.time()),
+        'Distance': lambda: str(rng.randint(1, 15)),
+        'Duration': lambda: 'PT{}M'.format(rng.randint(10, 90)),
+        'Incline': lambda: str(rng.randint(0, 5)),
+        'MuscleGroup': lambda: rng.choice(['shoulder', 'arms', 'back', 'legs', 'chest', 'core']),
+        'Violation': lambda: rng.choice(['calorie', 'protein', 'fat carbohydrate']),
+        'Excuse': lambda: rng.choice(EXCUSES),
+        'Measurement': lambda: str(rng.randint(1, 4) if rng.random() < 0.7 else rng.randint(50, 400)),
+        'MeasurementType': lambda: rng.choice(['servings', 'serving', 'grams', 'g', 'oz', 'cups', 'tbsp', 'slices']),
+        'Serving': lambda: str(rng.randint(20, 250)),
+        'Calorie': lambda: str(rng.randint(50, 700)),
+        'Protein': lambda: str(rng.randint(0, 50)),
+        'Carbohydrate': lambda: str(rng.randint(0, 90)),
+        'Fat': lambda: str(rng.randint(0, 40)),
+        'RecipeName': lambda: rng.choice(RECIPE_NAMES),
+        'Servings': lambda: str(rng.randint(1, 6)),
+        'Weight': lambda: str(rng.randint(20, 300)),
+        'Reps': lambda: str(rng.randint(3, 15)),
+        'Sets': lambda: str(rng.randint(1, 6)),
+        'Name': lambda: rng.choice(['Sam', 'Alex', 'Jordan', 'Riley']),
+        'Gender': lambda: rng.choice(['male', 'female']),
+        'Age': lambda: str(rng.randint(18, 70)),
+        'MeasurementSystem': lambda: rng.choice(['imperial system', 'metric system']),
+        'Height': lambda: str(rng.randint(60, 80)),
+        'Goal': lambda: rng.choice(['gain mass', 'lose weight', 'maintain weight']),
+        'Activity': lambda: rng.choice(['sedentary', 'moderate', 'active']),
+        'CalorieGoal': lambda: str(rng.randint(1500, 3500)),
+        'ProteinGoal': lambda: str(rng.randint(80, 250)),
+        'CarbohydrateGoal': lambda: str(rng.randint(100, 400)),
+        'FatGoal': lambda: str(rng.randint(40, 120)),
+        'NutrientRules': lambda: rng.choice(['sodium under 2300', 'at least 150 grams of protein',
+                                             'fat under 120% and sugar under 50', 'no more than 105% of my calories',
+                                             'reset']),
+        'CreditExerciseCalories': lambda: rng.choice(['yes', 'no']),
+    }
+    return values[slot]()
+
+
+def next_missing_slot(intent_name, slots):
+    for slot in SLOT_ORDER.get(intent_name, []):
+        if slot in OPTIONAL_SLOTS.get(intent_name, []):
+            continue
+        if slots.get(slot) is None:
+            return slot
+    return None
+
+
+def initial_slots(rng, intent_name, user, unknown_rate):
+    order = SLOT_ORDER[intent_name]
+    filled = rng.randint(0, len(order)) if order else 0
+    slots = {slot: None for slot in order}
+    for slot in order[:filled]:
+        slots[slot] = sample_slot(rng, intent_name, slot, user, unknown_rate)
+    return slots
+
+
+""" --- Running conversations --- """
+
+
+def route_to_hook(event, context):
+    """
+    Default lambda_handler: send each event to the hook module that owns its intent.
+    """
+
+    module = importlib.import_module(INTENT_HOOKS[event['currentIntent']['name']])
+    return module.lambda_handler(event, context)
+
+
+class Invocation(object):
+    __slots__ = ('intent', 'source', 'latency', 'calls', 'error', 'traceback')
+
+    def __init__(self, intent, source, latency, calls, error, traceback=None):
+        self.intent = intent
+        self.source = source
+        self.latency = latency
+        self.calls = calls
+        self.error = error
+        self.traceback = traceback
+
+
+def invoke(handler, event, invocations):
+    FakeDynamoDB.start_recording()
+    error = None
+    trace = None
+    response = None
+    started = time.perf_counter()
+    try:
+        response = handler(event, None)
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+        trace = traceback.format_exc()
+    latency = time.perf_counter() - started
+    stats = FakeDynamoDB.stop_recording()
+    invocations.append(Invocation(event['currentIntent']['name'], event['invocationSource'], latency, stats, error,
+                                  trace))
+    return response
+
+
+def run_conversation(handler, user_id, intent_name, user, rng, unknown_rate=0.15, deny_rate=0.1, max_turns=25):
+    """
+    Play one conversation the way the Lex runtime would: call the DialogCodeHook on every turn, answer
+    ElicitSlot and ConfirmIntent prompts (following chains into other intents), and call the
+    FulfillmentCodeHook once every required slot is filled.
+    """
+
+    invocations = []
+    session_attributes = {}
+    slots = initial_slots(rng, intent_name, user, unknown_rate)
+    confirmation_status = 'None'
+    source = 'DialogCodeHook'
+    for turn in range(max_turns):
+        event = build_event(user_id, intent_name, slots, source, confirmation_status, session_attributes)
+        response = invoke(handler, event, invocations)
+        if response is None:
+            break
+        session_attributes = response.get('sessionAttributes') or {}
+        action = response['dialogAction']
+        if action['type'] == 'Close':
+            break
+        if action['type'] == 'ElicitSlot':
+            intent_name = action['intentName']
+            slots = dict(action['slots'])
+            slots[action['slotToElicit']] = sample_slot(rng, intent_name, action['slotToElicit'], user, 0)
+            source = 'DialogCodeHook'
+        elif action['type'] == 'ConfirmIntent':
+            intent_name = action['intentName']
+            slots = dict(action['slots'])
+            confirmation_status = 'Denied' if rng.random() < deny_rate else 'Confirmed'
+            source = 'DialogCodeHook'
+        elif action['type'] == 'Delegate':
+            slots = dict(action['slots'])
+            if source == 'FulfillmentCodeHook':
+                break
+            missing = next_missing_slot(intent_name, slots)
+            if missing is None:
+                source = 'FulfillmentCodeHook'
+            else:
+                slots[missing] = sample_slot(rng, intent_name, missing, user, unknown_rate)
+    return invocations
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def collect_failures(group):
+    """
+    Group the failed invocations of one intent by error message, keeping the first traceback seen for each.
+    """
+    failures = {}
+    for invocation in group:
+        if not invocation.error:
+            continue
+        failure = failures.get(invocation.error)
+        if failure is None:
+            failure = failures[invocation.error] = {'error': invocation.error, 'source': invocation.source,
+                                                    'count': 0, 'traceback': invocation.traceback}
+        failure['count'] += 1
+    return sorted(failures.values(), key=lambda failure: -failure['count'])
+
+
+def summarize(invocations, wall_time, conversations):
+    intents = {}
+    for invocation in invocations:
+        intents.setdefault(invocation.intent, []).append(invocation)
+    report = {
+        'conversations': conversations,
+        'invocations': len(invocations),
+        'wallSeconds': round(wall_time, 4),
+        'throughput': round(len(invocations) / wall_time, 2) if wall_time else 0.0,
+        'errors': sum(1 for invocation in invocations if invocation.error),
+        'intents': {},
+    }
+    for intent_name, group in sorted(intents.items()):
+        latencies = [invocation.latency * 1000 for invocation in group]
+        calls = {}
+        for invocation in group:
+            for operation, count in (invocation.calls or {}).get('calls', {}).items():
+                calls[operation] = calls.get(operation, 0) + count
+        report['intents'][intent_name] = {
+            'invocations': len(group),
+            'errors': sum(1 for invocation in group if invocation.error),
+            'failures': collect_failures(group),
+            'p50Ms': round(percentile(latencies, 0.50), 3),
+            'p95Ms': round(percentile(latencies, 0.95), 3),
+            'p99Ms': round(percentile(latencies, 0.99), 3),
+            'dynamoCallsPerInvocation': round(sum(calls.values()) / float(len(group)), 3),
+            'dynamoCalls': {operation: round(count / float(len(group)), 3) for operation, count in sorted(calls.items())},
+        }
+    return report
+
+
+def load_handler(spec):
+    if spec is None:
+        return route_to_hook, None
+    module_name, function_name = spec.split(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name), module
+
+
+def prepare(fake, handler_module=None):
+    # The hooks share their tables through fitfriend.tables, which also holds the resource BatchGetItem goes through.
+    FakeDynamoDB.install(importlib.import_module('fitfriend.tables'), fake)
+    # A new stand-in starts a cold container: nothing cached from an earlier one may answer for it.
+    for cache in (catalog.universal_catalogs, catalog.user_catalogs, catalog.negative_cache,
+                  catalog.universal_matchers):
+        cache.clear()
+    for module_name in INTENT_HOOKS.values():
+        FakeDynamoDB.install(importlib.import_module(module_name), fake)
+    if handler_module is not None:
+        FakeDynamoDB.install(handler_module, fake)
+    # Keep the hooks' per-invocation metric records off stdout while replaying traffic.
+    logging.getLogger('metrics').setLevel(logging.WARNING)
+
+
+def run(handler=None, handler_module=None, conversations=200, concurrency=8, history_days=14, seed=0,
+        unknown_rate=0.15, new_day_rate=0.3, latency=0.0, intents=None):
+    rng = random.Random(seed)
+    fake = FakeDynamoDB.FakeDynamoDB(latency=0.0)
+    seed_catalog(fake)
+    prepare(fake, handler_module)
+    handler = handler or route_to_hook
+    intents = intents or load_intents()
+    weights = [INTENT_WEIGHTS.get(intent_name, 1) for intent_name in intents]
+    plans = []
+    for index in range(conversations):
+        intent_name = rng.choices(intents, weights)[0]
+        user_id = 'harness-user-{}'.format(index)
+        user = None
+        if intent_name != 'Personalize':
+            user = seed_user(fake, user_id, history_days, rng, today_logged=rng.random() >= new_day_rate)
+        plans.append((user_id, intent_name, user, random.Random(rng.random())))
+    for table in fake.tables.values():
+        table.latency = latency
+    fake.latency = latency
+
+    lock = threading.Lock()
+    invocations = []
+
+    def play(plan):
+        user_id, intent_name, user, conversation_rng = plan
+        result = run_conversation(handler, user_id, intent_name, user, conversation_rng, unknown_rate)
+        with lock:
+            invocations.extend(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(play, plans))
+    return summarize(invocations, time.perf_counter() - started, conversations)
+
+
+def print_report(report):
+    print('{} conversations, {} invocations in {:.3f}s ({:.1f} invocations/s), {} errors'.format(
+        report['conversations'], report['invocations'], report['wallSeconds'], report['throughput'],
+        report['errors']))
+    print('{:<28}{:>8}{:>8}{:>10}{:>10}{:>10}{:>12}'.format('intent', 'calls', 'errors', 'p50 ms', 'p95 ms', 'p99 ms',
+                                                        'ddb/call'))
+    for intent_name, stats in report['intents'].items():
+        print('{:<28}{:>8}{:>8}{:>10.2f}{:>10.2f}{:>10.2f}{:>12.2f}'.format(
+            intent_name, stats['invocations'], stats['errors'], stats['p50Ms'], stats['p95Ms'], stats['p99Ms'],
+            stats['dynamoCallsPerInvocation']))
+    for intent_name, stats in report['intents'].items():
+        for failure in stats['failures']:
+            print('\n{} ({}, {}x): {}'.format(intent_name, failure['source'], failure['count'], failure['error']))
+            print(failure['traceback'].rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay synthetic Lex traffic against the FitFriend hooks.')
+    parser.add_argument('--handler', help='module:function to invoke instead of routing to each hook')
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--history-days', type=int, default=14)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--unknown-rate', type=float, default=0.15,
+                        help='chance a food or exercise slot names something missing from the catalog')
+    parser.add_argument('--new-day-rate', type=float, default=0.3,
+                        help='chance a user has not been seen yet today')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated DynamoDB round trip')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    handler, handler_module = load_handler(args.handler)
+    report = run(handler, handler_module, args.conversations, args.concurrency, args.history_days, args.seed,
+                 args.unknown_rate, args.new_day_rate, args.latency_ms / 1000.0)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, default=lambda value: float(value) if isinstance(
+                value, Decimal) else str(value))
+
+
+if __name__ == '__main__':
+    main()
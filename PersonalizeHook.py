@@ -1,10 +1,10 @@
-import boto3
 import time
 import os
 import logging
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-table = dynamodb.Table('Users')
+from fitfriend.tables import emit_invocation_metrics, start_invocation_metrics
+from fitfriend.tables import users as table
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -310,5 +310,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
@@ -1,11 +1,16 @@
-import boto3
 import time
 import os
 import logging
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-foods = dynamodb.Table('Foods')
-users = dynamodb.Table('Users')
+from fitfriend.archive import monitor_item_size
+from fitfriend.foods import resolve_food, resolve_foods, suggest_food_name
+from fitfriend.meals import (assemble_meal, calculate_nutrition, generate_meal_string, generate_nutrition_string,
+                             meal_food_names, parse_meal, unit_table)
+from fitfriend.model import Food, NutritionVector, get_day_record, next_log_time, to_number
+from fitfriend.rules import ViolationRules, generate_rules_string
+from fitfriend.tables import emit_invocation_metrics, start_invocation_metrics, users
+from fitfriend.text import generate_list_string
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -111,43 +116,16 @@ def is_valid_user(user):
 
 
 def find_violations(remaining_nutrition, user):
-    violations = []
-    for nutrient, amount in remaining_nutrition.items():
-        if nutrient == 'calorie':
-            if amount < 0:
-                violations.append(nutrient)
-        else:
-            if amount < -int(0.1 * int(user['Item']['nutrientGoal'][nutrient])):
-                violations.append(nutrient)
-    return violations
+    eaten = NutritionVector.from_item(user['Item']['nutrientGoal']) - remaining_nutrition
+    return [rule['nutrient'] for rule in ViolationRules.for_user(user).broken(eaten)]
 
 
 def generate_violation_message(remaining_nutrition, user):
-    violations = find_violations(remaining_nutrition, user)
-    if len(violations) == 0:
+    eaten = NutritionVector.from_item(user['Item']['nutrientGoal']) - remaining_nutrition
+    broken = ViolationRules.for_user(user).broken(eaten)
+    if len(broken) == 0:
         return ""
-    elif len(violations) == 1:
-        if violations[0] == 'calorie':
-            return "You're going over your " + violations[0] + " limit!"
-        else:
-            return "You're going over 10% of your " + violations[0] + " limit!"
-    elif len(violations) == 2:
-        if violations[0] == 'calorie':
-            return "You're going over your " + violations[0] + " limit and over 10% of your " + violations[
-                1] + " limit!"
-        else:
-            return "You're going over 10% of your " + violations[0] + " and " + violations[1] + " limits!"
-    elif len(violations) == 3:
-        if violations[0] == 'calorie':
-            return "You're going over your " + violations[0] + " limit and over 10% of your " + violations[
-                1] + " and " + \
-                   violations[2] + " limits!"
-        else:
-            return "You're going over 10% of your " + violations[0] + ", " + violations[1] + " and " + violations[
-                2] + " limits!"
-    elif len(violations) == 4:
-        return "You're going over your " + violations[0] + " limit and over 10% of your " + violations[1] + ", " + \
-               violations[2] + " and " + violations[3] + " limits!"
+    return "You're going " + generate_rules_string(broken) + "!"
 
 
 def generate_violation_string(violation):
@@ -164,31 +142,27 @@ def is_new_day(user):
 
 
 def create_new_day(user, intent_request):
+    new_day = {
+        "nutritionRemaining": dict(user['Item']['nutrientGoal']),
+        "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
+        "violations": [],
+        "foodLog": {},
+        "exerciseLog": {},
+        "excuses": {}
+    }
     users.update_item(
         Key={
             'user': intent_request['userId']
         },
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
-            ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
-                "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
-                "violations": [],
-                "foodLog": {},
-                "exerciseLog": {},
-                "excuses": {}
-            },
-
+            ':d': new_day,
         },
         ExpressionAttributeNames={
             '#day': time.strftime("%Y-%m-%d"),
         },
     )
+    user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")] = new_day
 
 
 def get_previous_exercises_remaining(user):
@@ -207,92 +181,253 @@ def generate_previous_exercises_remaining_string(workout):
 
 
 def condense_measurement_type(measurement_type):
-    if measurement_type is not None:
-        if measurement_type.lower() in ['grams', 'gram', 'g']:
-            return 'grams'
-        elif measurement_type.lower() in ['servings', 'serving']:
-            return 'servings'
+    return unit_table.unit(measurement_type)
 
 
-def calculate_nutrition(food_name, measurement, measurement_type, intent_request):
-    food_information = foods.get_item(
-        Key={
-            'UserID': intent_request['userId'],
-            'FoodName': food_name.lower()
-        }
-    )
-    calorie, protein, carbohydrate, fat = None, None, None, None
-    if measurement_type == 'servings':
-        calorie = int(measurement) * int(food_information['Item']['Calorie'])
-        protein = int(measurement) * int(food_information['Item']['Protein'])
-        carbohydrate = int(measurement) * int(food_information['Item']['Carbohydrate'])
-        fat = int(measurement) * int(food_information['Item']['Fat'])
-    elif measurement_type == 'grams':
-        serving = int(measurement) / int(food_information['Item']['Serving'])
-        calorie = serving * int(food_information['Item']['Calorie'])
-        protein = serving * int(food_information['Item']['Protein'])
-        carbohydrate = serving * int(food_information['Item']['Carbohydrate'])
-        fat = serving * int(food_information['Item']['Fat'])
-    return {'calorie': int(calorie), 'protein': int(protein), 'carbohydrate': int(carbohydrate), 'fat': int(fat)}
-
-
-def get_remaining_nutrition(food_nutrition, intent_request):
-    user = users.get_item(
-        Key={
-            'user': intent_request['userId'],
-        }
-    )
-    today = time.strftime("%Y-%m-%d")
-    calorie = user['Item']['dailyNutrientsAndWorkouts'][today]['nutritionRemaining']['calorie'] - food_nutrition[
-        'calorie']
-    protein = user['Item']['dailyNutrientsAndWorkouts'][today]['nutritionRemaining']['protein'] - food_nutrition[
-        'protein']
-    carbohydrate = user['Item']['dailyNutrientsAndWorkouts'][today]['nutritionRemaining']['carbohydrate'] - \
-                   food_nutrition['carbohydrate']
-    fat = user['Item']['dailyNutrientsAndWorkouts'][today]['nutritionRemaining']['fat'] - food_nutrition['fat']
-    return {'calorie': int(calorie), 'protein': int(protein), 'carbohydrate': int(carbohydrate), 'fat': int(fat)}
-
-
-def is_valid_food(food_name, intent_request):
-    response = foods.get_item(
-        Key={
-            'UserID': 'universal',
-            'FoodName': food_name.lower()
-        }
-    )
-    if 'Item' in response:
-        return True
-    else:
-        response = foods.get_item(
-            Key={
-                'UserID': intent_request['userId'],
-                'FoodName': food_name.lower()
-            }
-        )
-        if 'Item' in response:
-            return True
-    return False
+def get_remaining_nutrition(food_nutrition, today):
+    return today.nutrition_remaining - food_nutrition
+
+
+def get_food(food_name, intent_request, recent_foods=None):
+    if food_name is None:
+        return None
+    if recent_foods is not None and food_name.lower() in recent_foods:
+        return recent_foods[food_name.lower()]
+    return resolve_food(food_name.lower(), intent_request)
+
+
+def is_valid_food(food):
+    return food is not None
 
 
 def is_valid_measurement_type(measurement_type):
-    valid_measurement_types = ['grams', 'gram', 'g', 'servings', 'serving']
-    return measurement_type.lower() in valid_measurement_types
+    return unit_table.unit(measurement_type) is not None
 
 
-def validate_record_meal(food_name, measurement, measurement_type, intent_request):
+def validate_record_meal(food_name, food, measurement, measurement_type):
     if food_name is not None:
-        if not is_valid_food(food_name, intent_request):
+        if not is_valid_food(food):
             return build_validation_result(False, 'FoodName', '{} is not recognized as one of your foods. Would '
                                                               'you like to add it?'.format(food_name))
     if measurement_type is not None:
         if not is_valid_measurement_type(measurement_type):
-            return build_validation_result(False, 'MeasurementType', 'Sorry, was that in servings or grams?')
+            return build_validation_result(False, 'MeasurementType', 'Sorry, what was that measured in? I know '
+                                                                     'servings, grams, ounces, cups, tablespoons, '
+                                                                     'slices and more.')
+    return build_validation_result(True, None, None)
+
+
+""" --- Multi-food meals --- """
+
+MEAL_MAX_FOODS = 10
+
+
+def get_meal_foods(names, intent_request, recent_foods):
+    """
+    Look every name of a meal up at once: the user's recent foods first, then the universal food index, then the
+    catalogs with at most one BatchGetItem.
+    """
+
+    meal_foods = {name: recent_foods[name] for name in names if name in recent_foods}
+    missing = [name for name in names if name not in meal_foods]
+    if missing:
+        meal_foods.update(resolve_foods(missing, intent_request))
+    return meal_foods
+
+
+def calculate_meal_nutrition(entries, meal_foods):
+    """
+    Add each entry's FoodNutrition in place and return the nutrition of the whole meal.
+    """
+
+    total = NutritionVector()
+    for entry in entries:
+        entry['FoodNutrition'] = calculate_nutrition(meal_foods[entry['FoodName']], entry['Measurement'],
+                                                     entry['MeasurementType'])
+        total = total + entry['FoodNutrition']
+    return total
+
+
+def validate_record_full_meal(parts, unknown_foods):
+    if not parts:
+        return build_validation_result(False, 'Meal', 'Sorry, what did you eat? You can list several foods, like '
+                                                      '"2 eggs, 150 grams of chicken breast and a banana".')
+    if len(parts) > MEAL_MAX_FOODS:
+        return build_validation_result(False, 'Meal', 'That\'s a big meal! Please tell me at most {} foods at '
+                                                      'a time.'.format(MEAL_MAX_FOODS))
+    if unknown_foods:
+        pronoun = 'it' if len(unknown_foods) == 1 else 'them'
+        return build_validation_result(False, 'Meal', 'I don\'t know {}. Please tell me the meal again without {}, '
+                                                      'or add {} as a food first.'.format(
+            generate_list_string(unknown_foods), pronoun, pronoun))
+    return build_validation_result(True, None, None)
+
+
+""" --- Recent foods --- """
+
+RECENT_FOODS_MAX = int(os.environ.get('RECENT_FOODS_MAX', 20))
+# Universal rows only change with a catalog deploy, so a recent food is resolved again once it is this old.
+RECENT_FOODS_MAX_AGE_DAYS = int(os.environ.get('RECENT_FOODS_MAX_AGE_DAYS', 7))
+MEAL_TIMES = {
+    'breakfast': ('04:00:00', '11:00:00'),
+    'lunch': ('11:00:00', '16:00:00'),
+    'dinner': ('16:00:00', '23:00:00'),
+}
+
+
+def get_recent_foods(user):
+    """
+    Return {name: Food} for the user's recentFoods, most recent first, leaving out rows resolved more than
+    RECENT_FOODS_MAX_AGE_DAYS ago.
+    """
+
+    oldest = time.strftime('%Y-%m-%d', time.localtime(time.time() - RECENT_FOODS_MAX_AGE_DAYS * 24 * 60 * 60))
+    recent_foods = {}
+    for item in user['Item'].get('recentFoods', []):
+        if item['ResolvedOn'] >= oldest:
+            recent_foods[item['FoodName']] = Food.from_item(item)
+    return recent_foods
+
+
+def update_recent_foods(user, logged_foods, recent_foods):
+    """
+    Return recentFoods with the foods just logged moved to the front and the list capped at RECENT_FOODS_MAX.
+    recent_foods is what get_recent_foods returned for the lookups; a food served from it keeps the day it was
+    resolved from the catalog, so an old row still ages out.
+    """
+
+    previous = dict((item['FoodName'], item) for item in user['Item'].get('recentFoods', []))
+    items = []
+    for food in logged_foods:
+        if food.name in [item['FoodName'] for item in items]:
+            continue
+        if recent_foods.get(food.name) is food:
+            items.append(previous[food.name])
+            continue
+        item = {'FoodName': food.name, 'Serving': food.serving, 'ResolvedOn': time.strftime('%Y-%m-%d')}
+        item.update({nutrient.capitalize(): amount for nutrient, amount in food.nutrition.to_item().items()})
+        items.append(item)
+    for name, item in previous.items():
+        if name in recent_foods and name not in [logged['FoodName'] for logged in items]:
+            items.append(item)
+    return items[:RECENT_FOODS_MAX]
+
+
+def get_logged_meal(record, meal_time):
+    """
+    Return the foodLog entries of one day that fall in a meal time, oldest first.
+    """
+
+    start, end = MEAL_TIMES[meal_time]
+    return [record.food_log[logged_at] for logged_at in sorted(record.food_log) if start <= logged_at < end]
+
+
+def validate_repeat_meal(day, meal_time, user):
+    if meal_time is not None and meal_time.lower() not in MEAL_TIMES:
+        return build_validation_result(False, 'MealTime', 'Which meal was that: breakfast, lunch or dinner?')
+    if day is not None:
+        if day not in user['Item']['dailyNutrientsAndWorkouts']:
+            return build_validation_result(False, 'Day', 'I don\'t have any records for that day. Try some other '
+                                                         'day')
+        if meal_time is not None and not get_logged_meal(get_day_record(user, day), meal_time.lower()):
+            return build_validation_result(False, 'Day', 'I don\'t see any {} logged on {}. Which day should I copy '
+                                                         'it from?'.format(meal_time.lower(), day))
     return build_validation_result(True, None, None)
 
 
 """ --- Functions that control the bot's behavior --- """
 
 
+def chain_create_food(session_attributes, food_name):
+    session_attributes['chainRecordMeal'] = True
+    return confirm_intent(
+        session_attributes,
+        'CreateFoods',
+        {
+            'FoodName': food_name,
+            'Serving': None,
+            'Calorie': None,
+            'Protein': None,
+            'Carbohydrate': None,
+            'Fat': None
+        },
+        {
+            'contentType': 'PlainText',
+            'content': '{} is not recognized as one of your foods. Would '
+                       'you like to add it?'.format(food_name)
+
+        }
+    )
+
+
+def record_foods(user, intent_request, entries, nutrition, logged_foods, recent_foods):
+    """
+    Add foodLog entries to today and subtract their combined nutrition with one update_item, which also moves the
+    logged foods to the front of recentFoods. Returns the remaining nutrition and the violations it causes.
+    """
+
+    today = get_day_record(user, time.strftime("%Y-%m-%d"))
+    remaining_nutrition = get_remaining_nutrition(nutrition, today)
+    logged_at = time.strftime('%T')
+    for entry in entries:
+        logged_at = next_log_time(today.food_log, logged_at)
+        today.food_log[logged_at] = entry
+    violations = find_violations(remaining_nutrition, user)
+    for item in violations:
+        if item not in today.violations:
+            today.violations.append(item)
+    today.nutrition_remaining = remaining_nutrition
+    day_item = today.to_item()
+    recent_items = update_recent_foods(user, logged_foods, recent_foods)
+    users.update_item(
+        Key={
+            'user': intent_request['userId']
+        },
+        UpdateExpression="set dailyNutrientsAndWorkouts.#day.nutritionRemaining = :n, "
+                         "dailyNutrientsAndWorkouts.#day.foodLog = :f, dailyNutrientsAndWorkouts.#day.violations = :v, "
+                         "recentFoods = :r",
+        ExpressionAttributeValues={
+            ':n': day_item['nutritionRemaining'],
+            ':f': day_item['foodLog'],
+            ':v': day_item['violations'],
+            ':r': recent_items
+        },
+        ExpressionAttributeNames={
+            '#day': today.day,
+        },
+    )
+    user['Item']['dailyNutrientsAndWorkouts'][today.day] = day_item
+    user['Item']['recentFoods'] = recent_items
+    monitor_item_size(user, intent_request)
+    return remaining_nutrition, violations
+
+
+def start_new_day(user, intent_request, session_attributes):
+    """
+    Create today's record, returning the GiveExcuse prompt when yesterday's workout was left unfinished.
+    """
+
+    exercises_remaining = get_previous_exercises_remaining(user)
+    create_new_day(user, intent_request)
+    if not len(exercises_remaining) == 0 and not exercises_remaining[0] == 'rest':
+        session_attributes['workoutViolationDate'] = \
+            sorted(list(user['Item']['dailyNutrientsAndWorkouts'].keys()))[-1]
+        return confirm_intent(
+            session_attributes,
+            "GiveExcuse",
+            {
+                'Excuse': None,
+                'Violation': 'workout'
+            },
+            {
+                'contentType': 'PlainText',
+                'content': 'Do you have a valid excuse for why you didn\'t finish your workout yesterday? {}'.format(
+                    generate_previous_exercises_remaining_string(exercises_remaining))
+            }
+        )
+    return None
+
+
 def record_meal(intent_request):
     food_name = get_slots(intent_request)["FoodName"]
     measurement = get_slots(intent_request)["Measurement"]
@@ -311,69 +446,55 @@ def record_meal(intent_request):
                              'content': "Glad to see you're so eager! Say \'hey fitfriend\' to get started!"
                          })
         if is_new_day(user):
-            exercises_remaining = get_previous_exercises_remaining(user)
-            create_new_day(user, intent_request)
-            if not len(exercises_remaining) == 0 and not exercises_remaining[0] == 'rest':
-                session_attributes['workoutViolationDate'] = \
-                    sorted(list(user['Item']['dailyNutrientsAndWorkouts'].keys()))[-1]
-                return confirm_intent(
-                    session_attributes,
-                    "GiveExcuse",
-                    {
-                        'Excuse': None,
-                        'Violation': 'workout'
-                    },
-                    {
-                        'contentType': 'PlainText',
-                        'content': 'Do you have a valid excuse for why you didn\'t finish your workout yesterday? {}'.format(
-                            generate_previous_exercises_remaining_string(exercises_remaining))
-                    }
-                )
+            response = start_new_day(user, intent_request, session_attributes)
+            if response is not None:
+                return response
+        suggested_for = try_ex(lambda: session_attributes.pop('foodSuggestedFor'))
         if confirmation_status == 'Denied':
+            if suggested_for:
+                return chain_create_food(session_attributes, suggested_for)
             return close(intent_request['sessionAttributes'],
                          'Fulfilled',
                          {'contentType': 'PlainText',
                           'content': 'Okay, let me know when you do eat something!'})
         slots = get_slots(intent_request)
-        validation_result = validate_record_meal(food_name, measurement, measurement_type, intent_request)
+        food = get_food(food_name, intent_request, get_recent_foods(user))
+        validation_result = validate_record_meal(food_name, food, measurement,
+                                                 get_slots(intent_request)["MeasurementType"])
         if not validation_result['isValid']:
             slots[validation_result['violatedSlot']] = None
-            if not is_valid_food(food_name, intent_request):
-                session_attributes['chainRecordMeal'] = True
-                return confirm_intent(
-                    session_attributes,
-                    'CreateFoods',
-                    {
-                        'FoodName': food_name,
-                        'Serving': None,
-                        'Calorie': None,
-                        'Protein': None,
-                        'Carbohydrate': None,
-                        'Fat': None
-                    },
-                    {
-                        'contentType': 'PlainText',
-                        'content': '{} is not recognized as one of your foods. Would '
-                                   'you like to add it?'.format(food_name)
-
-                    }
-                )
+            if validation_result['violatedSlot'] == 'FoodName':
+                suggestion = suggest_food_name(food_name, intent_request)
+                if suggestion is not None:
+                    session_attributes['foodSuggestedFor'] = food_name
+                    slots['FoodName'] = suggestion
+                    return confirm_intent(
+                        session_attributes,
+                        intent_request['currentIntent']['name'],
+                        slots,
+                        {
+                            'contentType': 'PlainText',
+                            'content': 'I don\'t know {}. Did you mean {}?'.format(food_name, suggestion)
+                        }
+                    )
+                return chain_create_food(session_attributes, food_name)
             return elicit_slot(intent_request['sessionAttributes'],
                                intent_request['currentIntent']['name'],
                                slots,
                                validation_result['violatedSlot'],
                                validation_result['message'])
         if food_name and measurement and measurement_type is not None:
-            food_nutrition = calculate_nutrition(food_name, measurement, measurement_type, intent_request)
-            remaining_nutrition = get_remaining_nutrition(food_nutrition, intent_request)
-            session_attributes['foodCalorie'] = food_nutrition['calorie']
-            session_attributes['foodProtein'] = food_nutrition['protein']
-            session_attributes['foodCarbohydrate'] = food_nutrition['carbohydrate']
-            session_attributes['foodFat'] = food_nutrition['fat']
-            session_attributes['calorieRemaining'] = remaining_nutrition['calorie']
-            session_attributes['proteinRemaining'] = remaining_nutrition['protein']
-            session_attributes['carbohydrateRemaining'] = remaining_nutrition['carbohydrate']
-            session_attributes['fatRemaining'] = remaining_nutrition['fat']
+            food_nutrition = calculate_nutrition(food, measurement, measurement_type)
+            remaining_nutrition = get_remaining_nutrition(food_nutrition,
+                                                          get_day_record(user, time.strftime("%Y-%m-%d")))
+            session_attributes['foodCalorie'] = food_nutrition.calorie
+            session_attributes['foodProtein'] = food_nutrition.protein
+            session_attributes['foodCarbohydrate'] = food_nutrition.carbohydrate
+            session_attributes['foodFat'] = food_nutrition.fat
+            session_attributes['calorieRemaining'] = remaining_nutrition.calorie
+            session_attributes['proteinRemaining'] = remaining_nutrition.protein
+            session_attributes['carbohydrateRemaining'] = remaining_nutrition.carbohydrate
+            session_attributes['fatRemaining'] = remaining_nutrition.fat
             session_attributes['violationWarning'] = generate_violation_message(remaining_nutrition, user)
         else:
             try_ex(lambda: session_attributes.pop('foodCalorie'))
@@ -387,45 +508,193 @@ def record_meal(intent_request):
             try_ex(lambda: session_attributes.pop('violationWarning'))
 
         return delegate(session_attributes, get_slots(intent_request))
-    food_nutrition = calculate_nutrition(food_name, measurement, measurement_type, intent_request)
-    remaining_nutrition = get_remaining_nutrition(food_nutrition, intent_request)
-    current_food_log = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]['foodLog']
-    current_food_log[time.strftime('%T')] = {
+    recent_foods = get_recent_foods(user)
+    food = get_food(food_name, intent_request, recent_foods)
+    food_nutrition = calculate_nutrition(food, measurement, measurement_type)
+    violations = record_foods(user, intent_request, [{
         "FoodName": food_name,
-        "Measurement": measurement,
+        "Measurement": to_number(measurement),
         "MeasurementType": measurement_type,
-        "FoodNutrition": food_nutrition, }
-    users.update_item(
-        Key={
-            'user': intent_request['userId']
-        },
-        UpdateExpression="set dailyNutrientsAndWorkouts.#day.nutritionRemaining = :n, dailyNutrientsAndWorkouts.#day.foodLog = :f",
-        ExpressionAttributeValues={
-            ':n': remaining_nutrition,
-            ':f': current_food_log
-        },
-        ExpressionAttributeNames={
-            '#day': time.strftime("%Y-%m-%d"),
-        },
-    )
-    violations = find_violations(remaining_nutrition, user)
+        "FoodNutrition": food_nutrition, }], food_nutrition, [food], recent_foods)[1]
     if len(violations) != 0:
-        current_violations = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]['violations']
-        for item in violations:
-            if item not in current_violations:
-                current_violations.append(item)
-        users.update_item(
-            Key={
-                'user': intent_request['userId']
-            },
-            UpdateExpression="set dailyNutrientsAndWorkouts.#day.violations = :v",
-            ExpressionAttributeValues={
-                ':v': current_violations
+        return confirm_intent(
+            session_attributes,
+            "GiveExcuse",
+            {
+                'Excuse': None,
+                'Violation': generate_violation_string(violations)
             },
-            ExpressionAttributeNames={
-                '#day': time.strftime("%Y-%m-%d"),
+            {
+                'contentType': 'PlainText',
+                'content': 'Do you have a valid excuse for why you went over your limits?'
+            }
+        )
+    else:
+        return close(intent_request['sessionAttributes'],
+                     'Fulfilled',
+                     {
+                         'contentType': 'PlainText',
+                         'content': "Sounds yummy! :)"
+                     })
+
+
+def suggest_meal(meal_entries, unknown_foods, intent_request):
+    """
+    Return the meal with every unknown food swapped for its closest catalog name, or None when one has no close
+    match.
+    """
+
+    suggestions = {}
+    for food_name in unknown_foods:
+        suggestion = suggest_food_name(food_name, intent_request)
+        if suggestion is None:
+            return None
+        suggestions[food_name] = suggestion
+    return [dict(entry, FoodName=suggestions.get(entry['FoodName'], entry['FoodName'])) for entry in meal_entries]
+
+
+def record_full_meal(intent_request):
+    meal = get_slots(intent_request)['Meal']
+    user = get_user(intent_request)
+    source = intent_request['invocationSource']
+    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    confirmation_status = intent_request['currentIntent']['confirmationStatus']
+
+    if source == 'DialogCodeHook':
+        if not is_valid_user(user):
+            return close(intent_request['sessionAttributes'],
+                         'Fulfilled',
+                         {
+                             'contentType': 'PlainText',
+                             'content': "Glad to see you're so eager! Say \'hey fitfriend\' to get started!"
+                         })
+        if is_new_day(user):
+            response = start_new_day(user, intent_request, session_attributes)
+            if response is not None:
+                return response
+        slots = get_slots(intent_request)
+        suggested_for = try_ex(lambda: session_attributes.pop('mealSuggestedFor'))
+        if confirmation_status == 'Denied':
+            if suggested_for:
+                slots['Meal'] = None
+                return elicit_slot(session_attributes,
+                                   intent_request['currentIntent']['name'],
+                                   slots,
+                                   'Meal',
+                                   {
+                                       'contentType': 'PlainText',
+                                       'content': 'Okay. Please tell me the meal again without {}, or add it as a '
+                                                  'food first.'.format(suggested_for)
+                                   })
+            return close(intent_request['sessionAttributes'],
+                         'Fulfilled',
+                         {'contentType': 'PlainText',
+                          'content': 'Okay, let me know when you do eat something!'})
+        if meal is None:
+            return delegate(session_attributes, slots)
+        parts = parse_meal(meal)
+        meal_entries, unknown_foods = [], []
+        if 0 < len(parts) <= MEAL_MAX_FOODS:
+            meal_foods = get_meal_foods(meal_food_names(parts), intent_request, get_recent_foods(user))
+            meal_entries = assemble_meal(parts, meal_foods)
+            unknown_foods = [entry['FoodName'] for entry in meal_entries if entry['FoodName'] not in meal_foods]
+        validation_result = validate_record_full_meal(parts, unknown_foods)
+        if not validation_result['isValid']:
+            slots['Meal'] = None
+            if unknown_foods:
+                suggested_entries = suggest_meal(meal_entries, unknown_foods, intent_request)
+                if suggested_entries is not None:
+                    session_attributes['mealSuggestedFor'] = generate_list_string(unknown_foods)
+                    slots['Meal'] = generate_meal_string(suggested_entries)
+                    return confirm_intent(
+                        session_attributes,
+                        intent_request['currentIntent']['name'],
+                        slots,
+                        {
+                            'contentType': 'PlainText',
+                            'content': 'I don\'t know {}. Did you mean {}?'.format(
+                                generate_list_string(unknown_foods), slots['Meal'])
+                        }
+                    )
+            return elicit_slot(session_attributes,
+                               intent_request['currentIntent']['name'],
+                               slots,
+                               validation_result['violatedSlot'],
+                               validation_result['message'])
+        return delegate(session_attributes, slots)
+    parts = parse_meal(meal)
+    recent_foods = get_recent_foods(user)
+    meal_foods = get_meal_foods(meal_food_names(parts), intent_request, recent_foods)
+    meal_entries = assemble_meal(parts, meal_foods)
+    meal_nutrition = calculate_meal_nutrition(meal_entries, meal_foods)
+    remaining_nutrition, violations = record_foods(user, intent_request, meal_entries, meal_nutrition,
+                                                   [meal_foods[entry['FoodName']] for entry in meal_entries],
+                                                   recent_foods)
+    meal_string = '{} ({})'.format(generate_meal_string(meal_entries), generate_nutrition_string(meal_nutrition))
+    if len(violations) != 0:
+        return confirm_intent(
+            session_attributes,
+            "GiveExcuse",
+            {
+                'Excuse': None,
+                'Violation': generate_violation_string(violations)
             },
+            {
+                'contentType': 'PlainText',
+                'content': 'I logged {}. {} Do you have a valid excuse for why you went over your limits?'.format(
+                    meal_string, generate_violation_message(remaining_nutrition, user))
+            }
         )
+    else:
+        return close(intent_request['sessionAttributes'],
+                     'Fulfilled',
+                     {
+                         'contentType': 'PlainText',
+                         'content': "I logged {}. Sounds yummy! :)".format(meal_string)
+                     })
+
+
+def repeat_meal(intent_request):
+    meal_time = get_slots(intent_request)['MealTime']
+    day = get_slots(intent_request)['Day']
+    user = get_user(intent_request)
+    source = intent_request['invocationSource']
+    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+
+    if source == 'DialogCodeHook':
+        if not is_valid_user(user):
+            return close(intent_request['sessionAttributes'],
+                         'Fulfilled',
+                         {
+                             'contentType': 'PlainText',
+                             'content': "Glad to see you're so eager! Say \'hey fitfriend\' to get started!"
+                         })
+        if is_new_day(user):
+            response = start_new_day(user, intent_request, session_attributes)
+            if response is not None:
+                return response
+        slots = get_slots(intent_request)
+        validation_result = validate_repeat_meal(day, meal_time, user)
+        if not validation_result['isValid']:
+            slots[validation_result['violatedSlot']] = None
+            return elicit_slot(session_attributes,
+                               intent_request['currentIntent']['name'],
+                               slots,
+                               validation_result['violatedSlot'],
+                               validation_result['message'])
+        return delegate(session_attributes, slots)
+    # The foodLog already holds each entry's nutrition, so the meal is copied without looking any food up.
+    meal_entries = [dict(entry) for entry in get_logged_meal(get_day_record(user, day), meal_time.lower())]
+    meal_nutrition = NutritionVector()
+    for entry in meal_entries:
+        meal_nutrition = meal_nutrition + entry['FoodNutrition']
+    recent_foods = get_recent_foods(user)
+    logged_foods = [recent_foods[entry['FoodName'].lower()] for entry in meal_entries
+                    if entry['FoodName'].lower() in recent_foods]
+    remaining_nutrition, violations = record_foods(user, intent_request, meal_entries, meal_nutrition, logged_foods,
+                                                   recent_foods)
+    meal_string = '{} ({})'.format(generate_meal_string(meal_entries), generate_nutrition_string(meal_nutrition))
+    if len(violations) != 0:
         return confirm_intent(
             session_attributes,
             "GiveExcuse",
@@ -435,7 +704,8 @@ def record_meal(intent_request):
             },
             {
                 'contentType': 'PlainText',
-                'content': 'Do you have a valid excuse for why you went over your limits?'
+                'content': 'I logged {} again. {} Do you have a valid excuse for why you went over your '
+                           'limits?'.format(meal_string, generate_violation_message(remaining_nutrition, user))
             }
         )
     else:
@@ -443,7 +713,7 @@ def record_meal(intent_request):
                      'Fulfilled',
                      {
                          'contentType': 'PlainText',
-                         'content': "Sounds yummy! :)"
+                         'content': "I logged {} again. Sounds yummy! :)".format(meal_string)
                      })
 
 
@@ -463,6 +733,10 @@ def dispatch(intent_request):
     # Dispatch to your bot's intent handlers
     if intent_name == 'RecordMeal':
         return record_meal(intent_request)
+    elif intent_name == 'RecordFullMeal':
+        return record_full_meal(intent_request)
+    elif intent_name == 'RepeatMeal':
+        return repeat_meal(intent_request)
 
     raise Exception('Intent with name ' + intent_name + ' not supported')
 
@@ -479,5 +753,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
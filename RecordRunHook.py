@@ -1,10 +1,12 @@
-import boto3
 import time
 import os
 import logging
+import re
+
+from fitfriend.energy import estimate_run_calories, generate_burn_string, record_exercises
+from fitfriend.model import ExerciseEntry, next_log_time, to_number
+from fitfriend.tables import emit_invocation_metrics, start_invocation_metrics, users
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-users = dynamodb.Table('Users')
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -95,12 +97,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -158,7 +155,18 @@ def build_validation_result(is_valid, violated_slot, message_content):
     }
 
 
+# Distance is in the user's measurement system and incline in percent.
+RUN_NUMBER = re.compile(r'^\d+(?:\.\d+)?$')
+
+
 def validate_record_run(distance, duration, incline, intent_request):
+    if distance is not None:
+        if RUN_NUMBER.match(distance.strip()) is None:
+            return build_validation_result(False, 'Distance', 'How far did you run?')
+    if incline:
+        if RUN_NUMBER.match(incline.strip()) is None:
+            return build_validation_result(False, 'Incline', 'What incline did you run at? Say 0 if it was flat.')
+
     return build_validation_result(True, None, None)
 
 
@@ -211,33 +219,23 @@ def record_run(intent_request):
                                validation_result['violatedSlot'],
                                validation_result['message'])
         return delegate(session_attributes, get_slots(intent_request))
-    current_exercise_log = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]['exerciseLog']
-    current_exercise_log[time.strftime('%T')] = {
-        "ExerciseName": 'run',
-        "Distance": distance,
-        "Duration": duration,
-        "Incline": incline}
-    exercises_remaining = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]['exercisesRemaining']
+    today = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]
+    exercises_remaining = today['exercisesRemaining']
     if 'run' in exercises_remaining:
         exercises_remaining.remove('run')
-    users.update_item(
-        Key={
-            'user': intent_request['userId']
-        },
-        UpdateExpression="set dailyNutrientsAndWorkouts.#day.exercisesRemaining = :e, dailyNutrientsAndWorkouts.#day.exerciseLog = :l",
-        ExpressionAttributeValues={
-            ':e': exercises_remaining,
-            ':l': current_exercise_log
-        },
-        ExpressionAttributeNames={
-            '#day': time.strftime("%Y-%m-%d"),
-        },
-    )
+    logged_at = next_log_time(today['exerciseLog'], time.strftime('%T'))
+    # Incline is optional; a run without one is stored without it.
+    run = ExerciseEntry('run', distance=to_number(distance), duration=duration,
+                        incline=to_number(incline) if incline else None)
+    entry = run.to_item()
+    entry['CaloriesBurned'] = estimate_run_calories(distance, duration, incline, user)
+    calories_burned, credited = record_exercises(user, intent_request, {logged_at: entry}, exercises_remaining)
     return close(intent_request['sessionAttributes'],
                  'Fulfilled',
                  {
                      'contentType': 'PlainText',
-                     'content': 'Good job!! {}'.format(generate_workout_string(exercises_remaining))
+                     'content': 'Good job!! {}{}'.format(generate_burn_string(calories_burned, credited),
+                                                         generate_workout_string(exercises_remaining))
                  })
 
 
@@ -273,5 +271,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
@@ -1,11 +1,15 @@
-import boto3
 import time
 import os
 import logging
+import re
+from decimal import Decimal
+
+from fitfriend.aliases import canonical_exercise_name
+from fitfriend.catalog import get_catalog_item, suggest_name
+from fitfriend.energy import estimate_lift_calories, generate_burn_string, record_exercises
+from fitfriend.model import ExerciseEntry, next_log_time, to_number
+from fitfriend.tables import emit_invocation_metrics, exercises, start_invocation_metrics, users
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-exercises = dynamodb.Table('Exercises')
-users = dynamodb.Table('Users')
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -110,12 +114,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -174,24 +173,7 @@ def generate_workout_string(workout):
 
 
 def is_valid_exercise(exercise, intent_request):
-    response = exercises.get_item(
-        Key={
-            'UserID': 'universal',
-            'ExerciseName': exercise.lower()
-        }
-    )
-    if 'Item' in response:
-        return True
-    else:
-        response = exercises.get_item(
-            Key={
-                'UserID': intent_request['userId'],
-                'ExerciseName': exercise.lower()
-            }
-        )
-        if 'Item' in response:
-            return True
-    return False
+    return get_catalog_item(exercise.lower(), exercises, 'ExerciseName', intent_request) is not None
 
 
 def validate_record_weightlift(exercise, weight, reps, sets, intent_request):
@@ -199,15 +181,213 @@ def validate_record_weightlift(exercise, weight, reps, sets, intent_request):
         if not is_valid_exercise(exercise, intent_request):
             return build_validation_result(False, 'Exercise', '{} is not recognized as one of your exercises. Would '
                                                               'you like to add it?'.format(exercise))
+    if weight is not None:
+        if LIFT_WEIGHT.match(' '.join(weight.lower().split())) is None:
+            return build_validation_result(False, 'Weight', 'How much weight did you lift? You can say it in pounds '
+                                                            'or kilograms.')
+    if reps is not None:
+        if not reps.strip().isdigit() or int(reps) < 1:
+            return build_validation_result(False, 'Reps', 'How many reps did you do in each set?')
+    if sets is not None:
+        if not sets.strip().isdigit() or not 1 <= int(sets) <= SESSION_MAX_SETS:
+            return build_validation_result(False, 'Sets', 'How many sets did you do?')
 
     return build_validation_result(True, None, None)
 
 
+""" --- Weightlifting sessions --- """
+
+SESSION_MAX_EXERCISES = 12
+SESSION_MAX_SETS = 20
+MAX_RPE = 10
+# Sets and exercises are separated by commas, semicolons, new lines, "then" and "and". An "and" after a part without
+# a number is inside an exercise name, so names like "clean and jerk" stay whole.
+SESSION_SEPARATOR = re.compile(r'\s*([,;\n]|\bthen\b|\band\b)\s*')
+# A weight said without a unit is in the user's own measurement system.
+WEIGHT_UNIT = r'(?:\s*(lbs?|pounds?|kgs?|kilos?|kilograms?))?'
+KILOGRAMS_PER_POUND = Decimal('0.45359237')
+SET_RPE = r'(?:\s*(?:@|at rpe|rpe)\s*(\d+(?:\.\d+)?))?'
+# "185 for 8", "185x8 @ 9", "100 kg by 5 rpe 8"
+LIFT_SET = re.compile(r'^(\d+(?:\.\d+)?)' + WEIGHT_UNIT + r'\s*(?:x|for|by)\s*(\d+)(?:\s*reps?)?' + SET_RPE + '$')
+# "3 sets of 8 at 185"
+LIFT_REPEATED_SETS = re.compile(r'^(\d+)\s*sets?\s+of\s+(\d+)(?:\s*reps?)?\s+(?:at|with)\s+(\d+(?:\.\d+)?)' +
+                                WEIGHT_UNIT + SET_RPE + '$')
+# "100 kg" or "225"
+LIFT_WEIGHT = re.compile(r'^(\d+(?:\.\d+)?)' + WEIGHT_UNIT + '$')
+# An exercise name starts a chunk and runs up to the first number.
+LIFT_NAME = re.compile(r'^(\D+?)\s*[:-]?\s*(?=\d)')
+
+
+def user_weight_unit(user):
+    return 'lbs' if user['Item']['measurementSystem'] == 'imperial system' else 'kgs'
+
+
+def convert_weight(weight, unit, measurement):
+    """
+    Return a weight said in unit, or in the user's own unit when None, in measurement ('lbs' or 'kgs'). Converted
+    weights are kept to a tenth.
+    """
+
+    weight = to_number(weight)
+    if unit is None or unit.startswith('k') == (measurement == 'kgs'):
+        return weight
+    factor = KILOGRAMS_PER_POUND if measurement == 'kgs' else 1 / KILOGRAMS_PER_POUND
+    return to_number((weight * factor).quantize(Decimal('0.1')))
+
+
+def parse_weight(text, measurement):
+    match = LIFT_WEIGHT.match(' '.join(text.lower().split()))
+    if match is None:
+        return None
+    return convert_weight(match.group(1), match.group(2), measurement)
+
+
+def get_weight(intent_request, measurement):
+    """
+    Read the Weight slot in the user's unit. The slot resolves to a bare number, so the unit, when one was said, is
+    taken from the words behind it.
+    """
+
+    slot_details = intent_request['currentIntent'].get('slotDetails') or {}
+    said = (slot_details.get('Weight') or {}).get('originalValue')
+    weight = parse_weight(said, measurement) if said is not None else None
+    if weight is None:
+        weight = parse_weight(get_slots(intent_request)['Weight'], measurement)
+    return weight
+
+
+def parse_set(text, measurement):
+    match = LIFT_SET.match(text)
+    if match is not None:
+        sets = 1
+        weight, unit, reps, rpe = match.groups()
+    else:
+        match = LIFT_REPEATED_SETS.match(text)
+        if match is None:
+            return None
+        sets, reps, weight, unit, rpe = match.groups()
+    sets = int(sets)
+    weight = convert_weight(weight, unit, measurement)
+    return [weight] * sets, [int(reps)] * sets, [to_number(rpe) if rpe else 0] * sets
+
+
+def parse_session(session, measurement):
+    """
+    Split a session such as "bench press 185x8, 185x8, 175x6 @ 9; squat 3 sets of 5 at 225" into ExerciseEntry
+    lifts, with every weight in measurement ('lbs' or 'kgs'). Returns (lifts, chunk), where chunk is the first part
+    that could not be read, or None.
+    """
+
+    parts = SESSION_SEPARATOR.split(session.lower())
+    texts = [parts[0]]
+    for separator, text in zip(parts[1::2], parts[2::2]):
+        if separator == 'and' and not any(character.isdigit() for character in texts[-1]):
+            texts[-1] += ' and ' + text
+        else:
+            texts.append(text)
+    lifts = []
+    for text in texts:
+        chunk = ' '.join(text.split())
+        if not chunk:
+            continue
+        match = LIFT_NAME.match(chunk)
+        if match is not None:
+            lifts.append(ExerciseEntry(canonical_exercise_name(match.group(1))))
+            chunk = chunk[match.end():]
+        parsed = parse_set(chunk, measurement)
+        if parsed is None or not lifts:
+            return lifts, ' '.join(text.split())
+        weights, reps, rpes = parsed
+        lifts[-1].weights.extend(weights)
+        lifts[-1].reps.extend(reps)
+        lifts[-1].rpes.extend(rpes)
+    return lifts, None
+
+
+def generate_session_string(lifts, measurement=''):
+    lift_strings = []
+    for lift in lifts:
+        sets = ', '.join('{}{} x {}{}'.format(weight, measurement, reps, ' @ {}'.format(rpe) if rpe else '')
+                         for weight, reps, rpe in zip(lift.weights, lift.reps, lift.rpes))
+        lift_strings.append('{} {}'.format(lift.name, sets))
+    return '; '.join(lift_strings)
+
+
+def validate_record_weightlift_session(lifts, unreadable, unknown_exercises):
+    if unreadable is not None or not lifts:
+        return build_validation_result(False, 'Session', 'Sorry, I didn\'t follow "{}". Try something like "bench '
+                                                         'press 185 for 8, 185 for 8; squat 3 sets of 5 at '
+                                                         '225".'.format(unreadable or ''))
+    if len(lifts) > SESSION_MAX_EXERCISES:
+        return build_validation_result(False, 'Session', 'Please tell me at most {} exercises at a '
+                                                         'time.'.format(SESSION_MAX_EXERCISES))
+    for lift in lifts:
+        if len(lift.reps) > SESSION_MAX_SETS:
+            return build_validation_result(False, 'Session', 'Did you really do {} sets of {}? Please tell me the '
+                                                             'session again.'.format(len(lift.reps), lift.name))
+        if max(lift.rpes) > MAX_RPE or min(lift.reps) < 1:
+            return build_validation_result(False, 'Session', 'RPE goes up to {} and every set needs at least one '
+                                                             'rep. Please tell me the session again.'.format(MAX_RPE))
+    if unknown_exercises:
+        return build_validation_result(False, 'Session', '{} is not recognized as one of your exercises. Please tell '
+                                                         'me the session again without it, or add it '
+                                                         'first.'.format(unknown_exercises[0]))
+    return build_validation_result(True, None, None)
+
+
 """ --- Functions that control the bot's behavior --- """
 
 
+def chain_create_exercise(session_attributes, exercise_name):
+    session_attributes['chainRecordWeightLift'] = True
+    return confirm_intent(
+        session_attributes,
+        'CreateExercise',
+        {
+            'Exercise': exercise_name,
+            'MuscleGroup': None
+        },
+        {
+            'contentType': 'PlainText',
+            'content': '{} is not recognized as one of your exercises. Would '
+                       'you like to add it?'.format(exercise_name)
+
+        }
+    )
+
+
+def start_new_day(user, intent_request, session_attributes):
+    """
+    Create today's record, returning the GiveExcuse prompt when yesterday's workout was left unfinished.
+    """
+
+    exercises_remaining = get_previous_exercises_remaining(user)
+    create_new_day(user, intent_request)
+    if not len(exercises_remaining) == 0 and not exercises_remaining[0] == 'rest':
+        session_attributes['workoutViolationDate'] = \
+            sorted(list(user['Item']['dailyNutrientsAndWorkouts'].keys()))[-1]
+        return confirm_intent(
+            session_attributes,
+            "GiveExcuse",
+            {
+                'Excuse': None,
+                'Violation': 'workout'
+            },
+            {
+                'contentType': 'PlainText',
+                'content': 'Do you have a valid excuse for why you didn\'t finish your workout yesterday? {}'.format(
+                    generate_previous_exercises_remaining_string(exercises_remaining))
+            }
+        )
+    return None
+
+
 def record_weightlift(intent_request):
     exercise_name = get_slots(intent_request)["Exercise"]
+    if exercise_name is not None:
+        # Log every variant under its catalog name so GetExerciseHistory sees one exercise.
+        exercise_name = canonical_exercise_name(exercise_name)
+        get_slots(intent_request)["Exercise"] = exercise_name
     weight = get_slots(intent_request)["Weight"]
     reps = get_slots(intent_request)["Reps"]
     sets = get_slots(intent_request)["Sets"]
@@ -224,25 +404,13 @@ def record_weightlift(intent_request):
                              'content': "Glad to see you're so eager! Say \'hey fitfriend\' to get started!"
                          })
         if is_new_day(user):
-            exercises_remaining = get_previous_exercises_remaining(user)
-            create_new_day(user, intent_request)
-            if not len(exercises_remaining) == 0 and not exercises_remaining[0] == 'rest':
-                session_attributes['workoutViolationDate'] = \
-                    sorted(list(user['Item']['dailyNutrientsAndWorkouts'].keys()))[-1]
-                return confirm_intent(
-                    session_attributes,
-                    "GiveExcuse",
-                    {
-                        'Excuse': None,
-                        'Violation': 'workout'
-                    },
-                    {
-                        'contentType': 'PlainText',
-                        'content': 'Do you have a valid excuse for why you didn\'t finish your workout yesterday? {}'.format(
-                            generate_previous_exercises_remaining_string(exercises_remaining))
-                    }
-                )
+            response = start_new_day(user, intent_request, session_attributes)
+            if response is not None:
+                return response
+        suggested_for = try_ex(lambda: session_attributes.pop('exerciseSuggestedFor'))
         if confirmation_status == 'Denied':
+            if suggested_for:
+                return chain_create_exercise(session_attributes, suggested_for)
             return close(intent_request['sessionAttributes'],
                          'Fulfilled',
                          {'contentType': 'PlainText',
@@ -251,57 +419,133 @@ def record_weightlift(intent_request):
         validation_result = validate_record_weightlift(exercise_name, weight, reps, sets, intent_request)
         if not validation_result['isValid']:
             slots[validation_result['violatedSlot']] = None
-            if not is_valid_exercise(exercise_name, intent_request):
-                session_attributes['chainRecordWeightLift'] = True
-                return confirm_intent(
-                    session_attributes,
-                    'CreateExercise',
-                    {
-                        'Exercise': exercise_name,
-                        'MuscleGroup': None
-                    },
-                    {
-                        'contentType': 'PlainText',
-                        'content': '{} is not recognized as one of your exercises. Would '
-                                   'you like to add it?'.format(exercise_name)
-
-                    }
-                )
+            if validation_result['violatedSlot'] == 'Exercise':
+                suggestion = suggest_name(exercise_name, exercises, 'ExerciseName', intent_request)
+                if suggestion is not None:
+                    session_attributes['exerciseSuggestedFor'] = exercise_name
+                    slots['Exercise'] = suggestion
+                    return confirm_intent(
+                        session_attributes,
+                        intent_request['currentIntent']['name'],
+                        slots,
+                        {
+                            'contentType': 'PlainText',
+                            'content': 'I don\'t know {}. Did you mean {}?'.format(exercise_name, suggestion)
+                        }
+                    )
+                return chain_create_exercise(session_attributes, exercise_name)
             return elicit_slot(intent_request['sessionAttributes'],
                                intent_request['currentIntent']['name'],
                                slots,
                                validation_result['violatedSlot'],
                                validation_result['message'])
         return delegate(session_attributes, get_slots(intent_request))
-    current_exercise_log = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]['exerciseLog']
-    current_exercise_log[time.strftime('%T')] = {
-        "ExerciseName": exercise_name,
-        "Weight": weight,
-        "Reps": reps,
-        "Sets": sets}
+    lift = ExerciseEntry(exercise_name, [get_weight(intent_request, user_weight_unit(user))] * int(sets),
+                         [int(reps)] * int(sets))
+    entry = lift.to_item()
+    entry['CaloriesBurned'] = estimate_lift_calories(lift, user)
 
+    current_exercise_log = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]['exerciseLog']
     exercises_remaining = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]['exercisesRemaining']
     if exercise_name in exercises_remaining:
         exercises_remaining.remove(exercise_name)
-    users.update_item(
-        Key={
-            'user': intent_request['userId']
-        },
-        UpdateExpression="set dailyNutrientsAndWorkouts.#day.exercisesRemaining = :e, dailyNutrientsAndWorkouts.#day.exerciseLog = :l",
-        ExpressionAttributeValues={
-            ':e': exercises_remaining,
-            ':l': current_exercise_log
-        },
-        ExpressionAttributeNames={
-            '#day': time.strftime("%Y-%m-%d"),
-        },
-    )
+    logged_at = next_log_time(current_exercise_log, time.strftime('%T'))
+    calories_burned, credited = record_exercises(user, intent_request, {logged_at: entry}, exercises_remaining)
 
     return close(intent_request['sessionAttributes'],
                  'Fulfilled',
                  {
                      'contentType': 'PlainText',
-                     'content': 'Good job!! {}'.format(generate_workout_string(exercises_remaining))
+                     'content': 'Good job!! {}{}'.format(generate_burn_string(calories_burned, credited),
+                                                         generate_workout_string(exercises_remaining))
+                 })
+
+
+def record_weightlift_session(intent_request):
+    session = get_slots(intent_request)["Session"]
+    user = get_user(intent_request)
+    source = intent_request['invocationSource']
+    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    confirmation_status = intent_request['currentIntent']['confirmationStatus']
+    if source == 'DialogCodeHook':
+        if not is_valid_user(user):
+            return close(intent_request['sessionAttributes'],
+                         'Fulfilled',
+                         {
+                             'contentType': 'PlainText',
+                             'content': "Glad to see you're so eager! Say \'hey fitfriend\' to get started!"
+                         })
+        if is_new_day(user):
+            response = start_new_day(user, intent_request, session_attributes)
+            if response is not None:
+                return response
+        slots = get_slots(intent_request)
+        suggested_for = try_ex(lambda: session_attributes.pop('exerciseSuggestedFor'))
+        if confirmation_status == 'Denied':
+            if suggested_for:
+                return chain_create_exercise(session_attributes, suggested_for)
+            return close(intent_request['sessionAttributes'],
+                         'Fulfilled',
+                         {'contentType': 'PlainText',
+                          'content': 'Okay, let me know when you do work out!'})
+        if session is None:
+            return delegate(session_attributes, slots)
+        lifts, unreadable = parse_session(session, user_weight_unit(user))
+        unknown_exercises = []
+        if unreadable is None:
+            unknown_exercises = [lift.name for lift in lifts if not is_valid_exercise(lift.name, intent_request)]
+        validation_result = validate_record_weightlift_session(lifts, unreadable, unknown_exercises)
+        if not validation_result['isValid']:
+            slots['Session'] = None
+            if unknown_exercises:
+                suggestion = suggest_name(unknown_exercises[0], exercises, 'ExerciseName', intent_request)
+                if suggestion is not None:
+                    session_attributes['exerciseSuggestedFor'] = unknown_exercises[0]
+                    for lift in lifts:
+                        if lift.name == unknown_exercises[0]:
+                            lift.name = suggestion
+                    slots['Session'] = generate_session_string(lifts)
+                    return confirm_intent(
+                        session_attributes,
+                        intent_request['currentIntent']['name'],
+                        slots,
+                        {
+                            'contentType': 'PlainText',
+                            'content': 'I don\'t know {}. Did you mean {}?'.format(unknown_exercises[0], suggestion)
+                        }
+                    )
+            return elicit_slot(intent_request['sessionAttributes'],
+                               intent_request['currentIntent']['name'],
+                               slots,
+                               validation_result['violatedSlot'],
+                               validation_result['message'])
+        return delegate(session_attributes, slots)
+    measurement = user_weight_unit(user)
+    lifts = parse_session(session, measurement)[0]
+    current_exercise_log = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]['exerciseLog']
+    exercises_remaining = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]['exercisesRemaining']
+    entries = {}
+    taken = set(current_exercise_log)
+    logged_at = time.strftime('%T')
+    for lift in lifts:
+        logged_at = next_log_time(taken, logged_at)
+        taken.add(logged_at)
+        entries[logged_at] = lift.to_item()
+        entries[logged_at]['CaloriesBurned'] = estimate_lift_calories(lift, user)
+        if lift.name in exercises_remaining:
+            exercises_remaining.remove(lift.name)
+    calories_burned, credited = record_exercises(user, intent_request, entries, exercises_remaining)
+
+    set_count = sum(len(lift.reps) for lift in lifts)
+    volume = sum(lift.volume() for lift in lifts)
+    return close(intent_request['sessionAttributes'],
+                 'Fulfilled',
+                 {
+                     'contentType': 'PlainText',
+                     'content': 'Good job!! I logged {} {} for {}{} of volume. {}{}'.format(
+                         set_count, 'set' if set_count == 1 else 'sets', volume, measurement,
+                         generate_burn_string(calories_burned, credited),
+                         generate_workout_string(exercises_remaining))
                  })
 
 
@@ -321,6 +565,8 @@ def dispatch(intent_request):
     # Dispatch to your bot's intent handlers
     if intent_name == 'RecordWeightlift':
         return record_weightlift(intent_request)
+    elif intent_name == 'RecordWeightliftSession':
+        return record_weightlift_session(intent_request)
 
     raise Exception('Intent with name ' + intent_name + ' not supported')
 
@@ -337,5 +583,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
@@ -0,0 +1,241 @@
+import argparse
+import random
+import sys
+
+import FakeDynamoDB
+import LexEventHarness
+
+""" --- DynamoDB round-trip budgets for every intent --- """
+
+BUDGET_USER = 'budget-user'
+BUDGET_FOOD = {'UserID': BUDGET_USER, 'FoodName': 'protein shake', 'Serving': '1', 'Calorie': '160', 'Protein': '30',
+               'Carbohydrate': '5', 'Fat': '2'}
+# Stored the way CreateRecipe writes it: one serving's share of its ingredients.
+BUDGET_RECIPE = {'UserID': BUDGET_USER, 'FoodName': 'shake and banana', 'Serving': 60, 'Calorie': 132, 'Protein': 15,
+                 'Carbohydrate': 16, 'Fat': 1, 'Servings': 2,
+                 'Ingredients': [{'FoodName': 'protein shake', 'Measurement': 1, 'MeasurementType': 'servings'},
+                                 {'FoodName': 'banana', 'Measurement': 1, 'MeasurementType': 'servings'}]}
+BUDGET_RECIPE_INDEX = {'banana': ['shake and banana'], 'protein shake': ['shake and banana']}
+BUDGET_RECENT_FOOD = {'UserID': BUDGET_USER, 'FoodName': 'overnight oats', 'Serving': 250, 'Calorie': 350,
+                      'Protein': 20, 'Carbohydrate': 50, 'Fat': 8}
+BUDGET_EXERCISE = {'UserID': BUDGET_USER, 'ExerciseName': 'hip thrust', 'MuscleGroup': 'legs'}
+
+READ_OPERATIONS = ['GetItem', 'Query', 'Scan', 'BatchGetItem']
+WRITE_OPERATIONS = ['PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem']
+
+MEAL = {'FoodName': 'protein shake', 'Measurement': '2', 'MeasurementType': 'servings'}
+UNIVERSAL_MEAL = {'FoodName': 'chicken breast', 'Measurement': '150', 'MeasurementType': 'grams'}
+FULL_MEAL = {'Meal': '2 servings of protein shake, 150 grams of chicken breast and a banana'}
+UNKNOWN_FULL_MEAL = {'Meal': 'a protein shake, 150 grams of chicken breast and dragon fruit'}
+RECIPE_MEAL = {'FoodName': 'shake and banana', 'Measurement': '1', 'MeasurementType': 'servings'}
+RECIPE = {'RecipeName': 'chicken rice bowl', 'Ingredients': '150 grams of chicken breast, a protein shake and a banana',
+          'Servings': '2'}
+UNIT_MEAL = {'FoodName': 'oatmeal', 'Measurement': '1', 'MeasurementType': 'cup'}
+RECENT_MEAL = {'FoodName': 'overnight oats', 'Measurement': '1', 'MeasurementType': 'servings'}
+REPEAT_MEAL = {'MealTime': 'breakfast', 'Day': 'yesterday'}
+UNKNOWN_MEAL = {'FoodName': 'dragon fruit', 'Measurement': '1', 'MeasurementType': 'servings'}
+LIFT = {'Exercise': 'bench press', 'Weight': '185', 'Reps': '8', 'Sets': '3'}
+USER_LIFT = {'Exercise': 'hip thrust', 'Weight': '225', 'Reps': '10', 'Sets': '3'}
+SESSION = {'Session': 'bench press 185x8, 185x8, 175x6 @ 9; hip thrust 3 sets of 10 at 225; squat 225 for 5'}
+UNKNOWN_SESSION = {'Session': 'bench press 185x8; face pull 40x15, 40x15'}
+UNKNOWN_LIFT = {'Exercise': 'face pull', 'Weight': '40', 'Reps': '15', 'Sets': '3'}
+RUN = {'Distance': '5', 'Duration': 'PT30M', 'Incline': '1'}
+WORKOUT = {'Monday': 'bench press, fly, biceps curl', 'Tuesday': 'run', 'Wednesday': 'deadlift, pull up, hip thrust',
+           'Thursday': 'rest', 'Friday': 'overhead press, shoulder press', 'Saturday': 'bench press, fly',
+           'Sunday': 'squat, leg press'}
+UNKNOWN_WORKOUT = dict(WORKOUT, Sunday='squat, leg press, face pull')
+MUSCLE_GROUP_WORKOUT = dict(WORKOUT, Sunday='legs')
+GOALS = {'CalorieGoal': '2500', 'ProteinGoal': '190', 'CarbohydrateGoal': '250', 'FatGoal': '80'}
+PROFILE = {'Name': 'Sam', 'Gender': 'female', 'Age': '31', 'MeasurementSystem': 'metric system', 'Height': '170',
+           'Weight': '65', 'Goal': 'maintain weight', 'Activity': 'moderate'}
+
+# (case, intent, invocation source, slots, session attributes, confirmation status, today logged?, max reads,
+#  max writes)
+BUDGETS = [
+    # A cold container reads the catalog version stamp and prefetches the universal and user catalogs once; later
+    # lookups in the conversation are answered from the prefetch.
+    ('record meal', 'RecordMeal', 'DialogCodeHook', MEAL, {}, 'None', True, 4, 0),
+    ('record meal of a universal food', 'RecordMeal', 'DialogCodeHook', UNIVERSAL_MEAL, {}, 'None', True, 2, 0),
+    # Unknown names are ranked against the prefetched catalogs, so the "did you mean" lookup adds no reads once the
+    # cold container has loaded them.
+    # Units other than grams and servings are converted from the unit table loaded with the container.
+    ('record meal in cups', 'RecordMeal', 'DialogCodeHook', UNIT_MEAL, {}, 'None', True, 2, 0),
+    ('record meal in cups', 'RecordMeal', 'FulfillmentCodeHook', UNIT_MEAL, {}, 'None', True, 3, 1),
+    ('record meal of an unknown food', 'RecordMeal', 'DialogCodeHook', UNKNOWN_MEAL, {}, 'None', True, 4, 0),
+    ('record meal on a new day', 'RecordMeal', 'DialogCodeHook', MEAL, {}, 'None', False, 3, 1),
+    ('record meal', 'RecordMeal', 'FulfillmentCodeHook', MEAL, {}, 'None', True, 3, 1),
+    # Foods on the user's recentFoods list come with the Users item every hook reads anyway.
+    ('record meal of a recent food', 'RecordMeal', 'DialogCodeHook', RECENT_MEAL, {}, 'None', True, 1, 0),
+    ('record meal of a recent food', 'RecordMeal', 'FulfillmentCodeHook', RECENT_MEAL, {}, 'None', True, 1, 1),
+    # A past meal is copied from its foodLog entries, nutrition included, in the same single update.
+    ('repeat meal', 'RepeatMeal', 'DialogCodeHook', REPEAT_MEAL, {}, 'None', True, 1, 0),
+    ('repeat meal', 'RepeatMeal', 'FulfillmentCodeHook', REPEAT_MEAL, {}, 'None', True, 1, 1),
+    # A recipe is one Foods row carrying its per-serving nutrition, so it costs what any other food costs.
+    ('record meal of a recipe', 'RecordMeal', 'DialogCodeHook', RECIPE_MEAL, {}, 'None', True, 2, 0),
+    ('record meal of a recipe', 'RecordMeal', 'FulfillmentCodeHook', RECIPE_MEAL, {}, 'None', True, 3, 1),
+    # Every food of a meal is resolved together: on a cold container the catalog stamp and universal prefetch are
+    # read once, and names the caches cannot answer share one BatchGetItem.
+    ('record full meal', 'RecordFullMeal', 'DialogCodeHook', FULL_MEAL, {}, 'None', True, 4, 0),
+    ('record full meal with an unknown food', 'RecordFullMeal', 'DialogCodeHook', UNKNOWN_FULL_MEAL, {}, 'None',
+     True, 5, 0),
+    ('record full meal', 'RecordFullMeal', 'FulfillmentCodeHook', FULL_MEAL, {}, 'None', True, 2, 1),
+    ('record weightlift', 'RecordWeightlift', 'DialogCodeHook', LIFT, {}, 'None', True, 3, 0),
+    ('record weightlift of a user exercise', 'RecordWeightlift', 'DialogCodeHook', USER_LIFT, {}, 'None', True, 3,
+     0),
+    ('record weightlift of an unknown exercise', 'RecordWeightlift', 'DialogCodeHook', UNKNOWN_LIFT, {}, 'None',
+     True, 4, 0),
+    ('record weightlift', 'RecordWeightlift', 'FulfillmentCodeHook', LIFT, {}, 'None', True, 1, 1),
+    # A whole session is checked against the same catalog caches as a single lift, so a cold container still reads the
+    # stamp and prefetches once, and is written with one update.
+    ('record weightlift session', 'RecordWeightliftSession', 'DialogCodeHook', SESSION, {}, 'None', True, 4, 0),
+    ('record weightlift session with an unknown exercise', 'RecordWeightliftSession', 'DialogCodeHook',
+     UNKNOWN_SESSION, {}, 'None', True, 4, 0),
+    ('record weightlift session', 'RecordWeightliftSession', 'FulfillmentCodeHook', SESSION, {}, 'None', True, 1, 1),
+    ('record run', 'RecordRun', 'DialogCodeHook', RUN, {}, 'None', True, 1, 0),
+    ('record run', 'RecordRun', 'FulfillmentCodeHook', RUN, {}, 'None', True, 1, 1),
+    ('create workout', 'CreateWorkout', 'DialogCodeHook', WORKOUT, {}, 'None', True, 4, 0),
+    ('create workout with an unknown exercise', 'CreateWorkout', 'DialogCodeHook', UNKNOWN_WORKOUT, {}, 'None', True,
+     4, 0),
+    ('create workout with a muscle group', 'CreateWorkout', 'DialogCodeHook', MUSCLE_GROUP_WORKOUT, {}, 'None', True,
+     4, 0),
+    ('create workout', 'CreateWorkout', 'FulfillmentCodeHook', WORKOUT, {}, 'None', True, 1, 1),
+    ('create exercise', 'CreateExercise', 'DialogCodeHook', {'Exercise': 'face pull', 'MuscleGroup': 'back'}, {},
+     'Confirmed', True, 1, 0),
+    ('create exercise', 'CreateExercise', 'FulfillmentCodeHook', {'Exercise': 'face pull', 'MuscleGroup': 'back'},
+     {}, 'Confirmed', True, 1, 1),
+    ('create food', 'CreateFoods', 'DialogCodeHook',
+     {'FoodName': 'tempeh', 'Serving': '100', 'Calorie': '190', 'Protein': '20', 'Carbohydrate': '8', 'Fat': '11'},
+     {}, 'Confirmed', True, 1, 0),
+    ('create food', 'CreateFoods', 'FulfillmentCodeHook',
+     {'FoodName': 'tempeh', 'Serving': '100', 'Calorie': '190', 'Protein': '20', 'Carbohydrate': '8', 'Fat': '11'},
+     {}, 'Confirmed', True, 1, 1),
+    # Changing a food rewrites the recipes made from it: one BatchGetItem for the recipes, one for their other
+    # ingredients, and a put per recipe.
+    ('create food used by a recipe', 'CreateFoods', 'FulfillmentCodeHook',
+     {'FoodName': 'protein shake', 'Serving': '1', 'Calorie': '160', 'Protein': '30', 'Carbohydrate': '5', 'Fat': '2'},
+     {}, 'Confirmed', True, 3, 2),
+    # The recipe name and its ingredients share one BatchGetItem.
+    ('create recipe', 'CreateRecipe', 'DialogCodeHook', RECIPE, {}, 'None', True, 2, 0),
+    ('create recipe', 'CreateRecipe', 'FulfillmentCodeHook', RECIPE, {}, 'None', True, 2, 2),
+    ('give excuse', 'GiveExcuse', 'DialogCodeHook', {'Violation': 'calorie', 'Excuse': None}, {}, 'Confirmed', True,
+     1, 0),
+    ('give excuse', 'GiveExcuse', 'FulfillmentCodeHook', {'Violation': 'calorie', 'Excuse': 'I was sick'}, {},
+     'Confirmed', True, 1, 1),
+    ('get day information', 'GetDayInformation', 'DialogCodeHook', {'Day': None}, {}, 'None', True, 1, 0),
+    ('get day information', 'GetDayInformation', 'FulfillmentCodeHook', {'Day': 'today'}, {}, 'None', True, 1, 0),
+    ('get exercise history', 'GetExerciseHistory', 'DialogCodeHook', {'Exercise': 'bench press'}, {}, 'None', True,
+     2, 0),
+    ('get exercise history', 'GetExerciseHistory', 'FulfillmentCodeHook', {'Exercise': 'bench press'}, {}, 'None',
+     True, 1, 0),
+    ('get excuses', 'GetExcuses', 'DialogCodeHook', {}, {}, 'None', True, 1, 0),
+    ('get excuses', 'GetExcuses', 'FulfillmentCodeHook', {}, {}, 'None', True, 1, 0),
+    # The first lookup on a cold container reads the catalog stamp and prefetches the universal exercises, which
+    # also serve the fulfillment and the known-exercise listing.
+    ('how to exercise', 'GetHowToExercise', 'DialogCodeHook', {'Exercise': 'squat'}, {}, 'None', True, 3, 0),
+    ('how to exercise', 'GetHowToExercise', 'FulfillmentCodeHook', {'Exercise': 'squat'}, {}, 'None', True, 1, 0),
+    ('how to do an unknown exercise', 'GetHowToExercise', 'DialogCodeHook', {'Exercise': 'face pull'}, {}, 'None',
+     True, 1, 0),
+    ('exercises for a muscle group', 'GetExercisesForMuscleGroup', 'DialogCodeHook', {'MuscleGroup': 'legs'}, {},
+     'None', True, 1, 0),
+    # The user's exercises come from one MuscleGroupIndex query. The universal ones come from the catalog cache, which
+    # a cold container fills with the stamp read and one prefetch Query.
+    ('exercises for a muscle group', 'GetExercisesForMuscleGroup', 'FulfillmentCodeHook', {'MuscleGroup': 'legs'},
+     {}, 'None', True, 4, 0),
+    ('set own goal', 'SetOwnGoal', 'DialogCodeHook', GOALS, {}, 'None', True, 1, 0),
+    ('set own goal', 'SetOwnGoal', 'FulfillmentCodeHook', GOALS, {}, 'None', True, 1, 1),
+    # The user's own violation rules and exercise crediting are written in the same update as the goals.
+    ('set own goal with rules', 'SetOwnGoal', 'FulfillmentCodeHook',
+     dict(GOALS, NutrientRules='sodium under 2300', CreditExerciseCalories='yes'), {}, 'None', True, 1, 1),
+    ('personalize', 'Personalize', 'DialogCodeHook', PROFILE, {}, 'None', True, 0, 0),
+    ('personalize', 'Personalize', 'FulfillmentCodeHook', PROFILE, {}, 'None', True, 0, 1),
+    ('help', 'Help', 'FulfillmentCodeHook', {}, {}, 'None', True, 0, 0),
+]
+
+""" --- Helper Functions --- """
+
+
+def count_calls(stats, operations):
+    return sum(count for name, count in stats['calls'].items() if name.split('.')[-1] in operations)
+
+
+def prepare(seed=0):
+    fake = FakeDynamoDB.FakeDynamoDB()
+    LexEventHarness.seed_catalog(fake)
+    fake.Table('Foods').put_item(Item=BUDGET_FOOD)
+    fake.Table('Foods').put_item(Item=BUDGET_RECIPE)
+    fake.Table('Foods').put_item(Item=BUDGET_RECENT_FOOD)
+    fake.Table('Exercises').put_item(Item=BUDGET_EXERCISE)
+    LexEventHarness.prepare(fake)
+    users = {}
+    for today_logged in (True, False):
+        users[today_logged] = LexEventHarness.generate_user(BUDGET_USER, 14, random.Random(seed), today_logged)
+        users[today_logged]['recipeIndex'] = BUDGET_RECIPE_INDEX
+        recent_food = dict((key, value) for key, value in BUDGET_RECENT_FOOD.items() if key != 'UserID')
+        recent_food['ResolvedOn'] = LexEventHarness.day_string(LexEventHarness.local_today())
+        users[today_logged]['recentFoods'] = [recent_food]
+    return fake, users
+
+
+def check(fake, users, budget):
+    """
+    Run one budgeted invocation against a freshly seeded user and return (reads, writes, error).
+    """
+
+    case, intent_name, source, slots, session_attributes, confirmation_status, today_logged, max_reads, \
+        max_writes = budget
+    user = users[today_logged]
+    fake.Table('Users').put_item(Item=user)
+    slots = dict(slots)
+    if slots.get('Day') == 'today':
+        slots['Day'] = sorted(user['dailyNutrientsAndWorkouts'].keys())[-1]
+    elif slots.get('Day') == 'yesterday':
+        slots['Day'] = sorted(user['dailyNutrientsAndWorkouts'].keys())[-2]
+    event = LexEventHarness.build_event(BUDGET_USER, intent_name, slots, source, confirmation_status,
+                                        session_attributes)
+    error = None
+    FakeDynamoDB.start_recording()
+    try:
+        LexEventHarness.route_to_hook(event, None)
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+    stats = FakeDynamoDB.stop_recording()
+    return count_calls(stats, READ_OPERATIONS), count_calls(stats, WRITE_OPERATIONS), error
+
+
+def run(budgets=None, seed=0):
+    fake, users = prepare(seed)
+    results = []
+    for budget in budgets or BUDGETS:
+        reads, writes, error = check(fake, users, budget)
+        passed = error is None and reads <= budget[7] and writes <= budget[8]
+        results.append((budget, reads, writes, error, passed))
+    return results
+
+
+def print_report(results):
+    header = ('case', 'intent', 'source', 'reads', 'writes')
+    rows = [(budget[0], budget[1], budget[2], '{}/{}'.format(reads, budget[7]), '{}/{}'.format(writes, budget[8]),
+             'ok' if passed else 'FAIL' + (' ' + error if error else ''))
+            for budget, reads, writes, error, passed in results]
+    # Size every column to its longest entry so long case names don't push the counts out of line.
+    widths = [max(len(row[column]) for row in [header] + rows) for column in range(len(header))]
+    for row in [header + ('result',)] + rows:
+        print('{}  {}  {}  {}  {}  {}'.format(row[0].ljust(widths[0]), row[1].ljust(widths[1]), row[2].ljust(widths[2]),
+                                              row[3].rjust(widths[3]), row[4].rjust(widths[4]), row[5]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail when an intent makes more DynamoDB calls than its budget.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = run(seed=args.seed)
+    print_report(results)
+    failures = sum(1 for result in results if not result[4])
+    if failures:
+        print('{} of {} round-trip budgets exceeded'.format(failures, len(results)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,10 @@
-import boto3
 import time
 import os
 import logging
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-users = dynamodb.Table('Users')
+from fitfriend.rules import RULE_MAX_PERCENT, generate_own_rules_string, merge_violation_rules, parse_violation_rules
+from fitfriend.tables import emit_invocation_metrics, start_invocation_metrics, users
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -95,12 +95,7 @@ def create_new_day(user, intent_request):
         UpdateExpression="set dailyNutrientsAndWorkouts.#day = :d",
         ExpressionAttributeValues={
             ':d': {
-                "nutritionRemaining": {
-                    'calorie': user['Item']['nutrientGoal']['calorie'],
-                    'protein': user['Item']['nutrientGoal']['protein'],
-                    'carbohydrate': user['Item']['nutrientGoal']['carbohydrate'],
-                    'fat': user['Item']['nutrientGoal']['fat'],
-                },
+                "nutritionRemaining": dict(user['Item']['nutrientGoal']),
                 "exercisesRemaining": user['Item']['workoutSchedule'][time.strftime('%A')],
                 "violations": [],
                 "foodLog": {},
@@ -144,7 +139,38 @@ def build_validation_result(is_valid, violated_slot, message_content):
     }
 
 
-def validate_set_own_goal(calorie_goal, protein_goal, fat_goal, carbohydrate_goal):
+# Answers to whether burned calories should be added back to the day's calorie budget.
+CREDIT_ANSWERS = {'yes': True, 'yeah': True, 'sure': True, 'true': True, 'on': True, 'add them back': True,
+                  'no': False, 'nope': False, 'false': False, 'off': False, 'don\'t': False}
+
+
+def parse_credit_answer(answer):
+    return CREDIT_ANSWERS.get(' '.join(answer.lower().split()))
+
+
+def generate_credit_string(credit_exercise_calories):
+    if credit_exercise_calories:
+        return ' Calories you burn working out will be added back to that day\'s budget.'
+    return ' Calories you burn working out won\'t change your daily budget.'
+
+
+def validate_set_own_goal(calorie_goal, protein_goal, fat_goal, carbohydrate_goal, nutrient_rules,
+                          credit_exercise_calories):
+    if nutrient_rules is not None:
+        rules, unreadable = parse_violation_rules(nutrient_rules)
+        if unreadable is not None:
+            return build_validation_result(False, 'NutrientRules', 'Sorry, I didn\'t follow "{}". Try something '
+                                                                   'like "sodium under 2300 and at least 150 grams '
+                                                                   'of protein", or say "reset".'.format(unreadable))
+        for rule in rules:
+            if 'percent' in rule and not 1 <= rule['percent'] <= RULE_MAX_PERCENT:
+                return build_validation_result(False, 'NutrientRules', 'Please keep percentages of a goal between '
+                                                                       '1 and {}.'.format(RULE_MAX_PERCENT))
+    if credit_exercise_calories is not None:
+        if parse_credit_answer(credit_exercise_calories) is None:
+            return build_validation_result(False, 'CreditExerciseCalories', 'Should calories you burn working out '
+                                                                            'be added back to your daily budget? '
+                                                                            'Please say yes or no.')
     return build_validation_result(True, None, None)
 
 
@@ -156,6 +182,10 @@ def set_own_goal(intent_request):
     protein_goal = get_slots(intent_request)["ProteinGoal"]
     carbohydrate_goal = get_slots(intent_request)["CarbohydrateGoal"]
     fat_goal = get_slots(intent_request)["FatGoal"]
+    # Optional, and never elicited: the user's own violation rules, which replace the defaults per nutrient, and
+    # whether exercise earns calories back.
+    nutrient_rules = get_slots(intent_request).get("NutrientRules")
+    credit_exercise_calories = get_slots(intent_request).get("CreditExerciseCalories")
     user = get_user(intent_request)
     source = intent_request['invocationSource']
     session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
@@ -189,7 +219,8 @@ def set_own_goal(intent_request):
                 )
         slots = get_slots(intent_request)
 
-        validation_result = validate_set_own_goal(calorie_goal, protein_goal, carbohydrate_goal, fat_goal)
+        validation_result = validate_set_own_goal(calorie_goal, protein_goal, carbohydrate_goal, fat_goal,
+                                                  nutrient_rules, credit_exercise_calories)
         if not validation_result['isValid']:
             slots[validation_result['violatedSlot']] = None
             return elicit_slot(intent_request['sessionAttributes'],
@@ -202,24 +233,38 @@ def set_own_goal(intent_request):
         return delegate(output_session_attributes, get_slots(intent_request))
 
     # call to a backend service.
+    update_expression = "set calorieGoal = :cal, proteinGoal=:p, carbohydrateGoal=:car, fatGoal=:f"
+    expression_attribute_values = {
+        ':cal': calorie_goal,
+        ':p': protein_goal,
+        ':car': carbohydrate_goal,
+        ':f': fat_goal
+    }
+    rules_string = ''
+    if nutrient_rules is not None:
+        violation_rules = merge_violation_rules(user['Item'].get('violationRules', []),
+                                                parse_violation_rules(nutrient_rules)[0])
+        update_expression += ", violationRules = :r"
+        expression_attribute_values[':r'] = violation_rules
+        rules_string = '. I\'ll hold your days to {}'.format(generate_own_rules_string(violation_rules))
+    credit_string = ''
+    if credit_exercise_calories is not None:
+        update_expression += ", creditExerciseCalories = :x"
+        expression_attribute_values[':x'] = parse_credit_answer(credit_exercise_calories)
+        credit_string = generate_credit_string(expression_attribute_values[':x'])
     users.update_item(
         Key={
             'user': intent_request['userId']
         },
-        UpdateExpression="set calorieGoal = :cal, proteinGoal=:p, carbohydrateGoal=:car, fatGoal=:f",
-        ExpressionAttributeValues={
-            ':cal': calorie_goal,
-            ':p': protein_goal,
-            ':car': carbohydrate_goal,
-            ':f': fat_goal
-        }
+        UpdateExpression=update_expression,
+        ExpressionAttributeValues=expression_attribute_values
     )
     return close(intent_request['sessionAttributes'],
                  'Fulfilled',
                  {'contentType': 'PlainText',
                   'content': 'Okay, your calorie goal has been set to {}, your protein goal has been set to {}, '
-                             'your carbohydrate goal has been set to {}, and your fat goal has been set to {}'.format(
-                      calorie_goal, protein_goal, fat_goal, carbohydrate_goal)})
+                             'your carbohydrate goal has been set to {}, and your fat goal has been set to {}{}.{}'.format(
+                      calorie_goal, protein_goal, fat_goal, carbohydrate_goal, rules_string, credit_string)})
 
 
 """ --- Intents --- """
@@ -254,5 +299,8 @@ def lambda_handler(event, context):
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
     logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    start_invocation_metrics()
+    try:
+        return dispatch(event)
+    finally:
+        emit_invocation_metrics(event)
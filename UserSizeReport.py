@@ -0,0 +1,92 @@
+import argparse
+import heapq
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from fitfriend.archive import ITEM_SIZE_LIMIT
+from fitfriend.tables import estimate_item_size
+
+""" --- Largest Users items, measured against DynamoDB's 400 KB item limit --- """
+
+
+def describe_user(item):
+    history = item.get('dailyNutrientsAndWorkouts', {})
+    days = sorted(history.keys())
+    size = estimate_item_size(item)
+    return {
+        'user': item['user'],
+        'bytes': size,
+        'limitPercent': round(100.0 * size / ITEM_SIZE_LIMIT, 2),
+        'days': len(days),
+        'oldestDay': days[0] if days else None,
+        'bytesPerDay': size // len(days) if days else 0,
+        'archivedMonths': len(item.get('archivedMonths', ())),
+    }
+
+
+def scan_segment(table, segment, segments, top):
+    """
+    Scan one parallel segment of the Users table and keep only its `top` largest users.
+    """
+
+    largest, scanned = [], 0
+    kwargs = {'Segment': segment, 'TotalSegments': segments}
+    while True:
+        response = table.scan(**kwargs)
+        for item in response['Items']:
+            scanned += 1
+            description = describe_user(item)
+            entry = (description['bytes'], description['user'], description)
+            if len(largest) < top:
+                heapq.heappush(largest, entry)
+            elif entry > largest[0]:
+                heapq.heapreplace(largest, entry)
+        if 'LastEvaluatedKey' not in response:
+            return largest, scanned
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def largest_users(table, top=20, segments=4):
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        results = list(executor.map(lambda segment: scan_segment(table, segment, segments, top), range(segments)))
+    scanned = sum(count for _, count in results)
+    entries = heapq.nlargest(top, (entry for largest, _ in results for entry in largest))
+    return [description for _, _, description in entries], scanned
+
+
+def print_report(users, scanned, warning_percent):
+    print('{} users scanned'.format(scanned))
+    print('{:<6}{:<40}{:>10}{:>9}{:>7}{:>12}{:>12}{:>10}'.format('rank', 'user', 'bytes', '% limit', 'days',
+                                                                 'oldest day', 'bytes/day', 'archived'))
+    for rank, user in enumerate(users, 1):
+        print('{:<6}{:<40}{:>10}{:>9.1f}{:>7}{:>12}{:>12}{:>10}{}'.format(
+            rank, user['user'], user['bytes'], user['limitPercent'], user['days'], user['oldestDay'] or '-',
+            user['bytesPerDay'], user['archivedMonths'], '  !' if user['limitPercent'] >= warning_percent else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List the largest Users items and how close they are to 400 KB.')
+    parser.add_argument('--table', default='Users')
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--segments', type=int, default=4, help='parallel scan segments')
+    parser.add_argument('--warning-percent', type=float, default=75.0,
+                        help='flag users at or above this share of the item size limit')
+    parser.add_argument('--output', help='also write the report as JSON to this file')
+    args = parser.parse_args()
+
+    table = boto3.resource('dynamodb', region_name=args.region).Table(args.table)
+    users, scanned = largest_users(table, args.top, args.segments)
+    print_report(users, scanned, args.warning_percent)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'scanned': scanned, 'users': users}, output, indent=2)
+    if any(user['limitPercent'] >= args.warning_percent for user in users):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
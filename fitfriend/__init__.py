@@ -0,0 +1,10 @@
+"""
+Code shared by every FitFriend Lambda hook: table instrumentation, the domain model, the catalog caches and the
+cold-tier archive. The package is bundled next to each *Hook.py in its function's deployment package (or published
+once as a Lambda layer), so a change here reaches every intent instead of being pasted into each hook.
+"""
+
+import os
+
+# catalog/ ships next to the hooks and this package.
+CATALOG_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'catalog')
@@ -0,0 +1,75 @@
+"""
+Spoken exercise names mapped to their catalog ExerciseName through catalog/exercise_aliases.json.
+"""
+
+import json
+import logging
+import os
+
+from fitfriend import CATALOG_DIRECTORY
+
+logger = logging.getLogger(__name__)
+
+EXERCISE_ALIASES_PATH = os.environ.get('EXERCISE_ALIASES_PATH',
+                                       os.path.join(CATALOG_DIRECTORY, 'exercise_aliases.json'))
+# Endings a spoken name may add to an alias or catalog name, as in "squats" or "bench presses".
+PLURAL_ENDINGS = ('', 's', 'es')
+# Trie key holding the canonical name of the alias that ends at a node. Never clashes with a character.
+ALIAS_END = ''
+
+
+def normalize_exercise_name(name):
+    return ' '.join(name.lower().replace('-', ' ').split())
+
+
+def build_alias_trie(aliases):
+    root = {}
+    for alias, canonical in aliases.items():
+        node = root
+        for character in alias:
+            node = node.setdefault(character, {})
+        node[ALIAS_END] = canonical
+    return root
+
+
+def load_exercise_aliases(path):
+    """
+    Compile catalog/exercise_aliases.json into a character trie once per container. Canonical names are inserted
+    too, so plurals of them resolve the same way aliases do.
+    """
+
+    if not os.path.exists(path):
+        logger.info('no exercise aliases at {}, exercise names are used as spoken'.format(path))
+        return {}
+    with open(path) as aliases_file:
+        data = json.load(aliases_file)
+    aliases = {}
+    for canonical, variants in data['aliases'].items():
+        aliases[canonical] = canonical
+        for variant in variants:
+            aliases[normalize_exercise_name(variant)] = canonical
+    return build_alias_trie(aliases)
+
+
+exercise_aliases = load_exercise_aliases(EXERCISE_ALIASES_PATH)
+
+
+def canonical_exercise_name(name):
+    """
+    Map a spoken exercise name such as "Bicep Curls" or "OHP" to its catalog ExerciseName in one walk of the trie.
+    Names the alias table does not know come back lowercased, so users' own exercises still match.
+    """
+
+    normalized = normalize_exercise_name(name)
+    canonical, node = None, exercise_aliases
+    for position in range(len(normalized) + 1):
+        if ALIAS_END in node and normalized[position:] in PLURAL_ENDINGS:
+            canonical = node[ALIAS_END]
+        if position == len(normalized):
+            break
+        node = node.get(normalized[position])
+        if node is None:
+            break
+    if canonical is None:
+        return ' '.join(name.lower().split())
+    return canonical
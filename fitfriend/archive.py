@@ -0,0 +1,233 @@
+"""
+The cold tier for old days of the Users item: compressed per-month blobs in UsersArchive (or a local object store),
+and the size monitor that moves days there before the item nears DynamoDB's 400 KB limit.
+"""
+
+import json
+import logging
+import os
+import time
+import zlib
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+
+from fitfriend.tables import archive, estimate_item_size, estimate_value_size, metrics_logger, users
+
+logger = logging.getLogger(__name__)
+
+""" --- Cold-tier archive --- """
+
+# Archived months live in the UsersArchive table unless ARCHIVE_DIRECTORY points at a local object store.
+ARCHIVE_DIRECTORY = os.environ.get('ARCHIVE_DIRECTORY')
+ARCHIVE_CHUNK_BYTES = int(os.environ.get('ARCHIVE_CHUNK_BYTES', 300 * 1024))
+
+
+def encode_archive_value(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError('{} is not archivable'.format(type(value).__name__))
+
+
+def compress_days(days):
+    return zlib.compress(json.dumps(days, default=encode_archive_value, sort_keys=True).encode('utf-8'), 9)
+
+
+def decompress_days(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'), parse_float=Decimal, parse_int=Decimal)
+
+
+def archive_path(user_id, month, directory=None):
+    return os.path.join(directory or ARCHIVE_DIRECTORY, user_id, month + '.json.zlib')
+
+
+def load_archived_month(user_id, month, table=None, directory=None):
+    """
+    Return (days, head) for one archived month, where head is the month's first chunk item (None when the month
+    was never archived or lives in the local object store). Tools run outside Lambda pass their own UsersArchive
+    table, and the local object store when they read one instead.
+    """
+
+    if table is None:
+        table, directory = archive, ARCHIVE_DIRECTORY
+    if directory:
+        path = archive_path(user_id, month, directory)
+        if not os.path.exists(path):
+            return {}, None
+        with open(path, 'rb') as archived:
+            return decompress_days(archived.read()), None
+    response = table.query(
+        KeyConditionExpression=Key('user').eq(user_id) & Key('month').begins_with(month)
+    )
+    items = {item['month']: item for item in response['Items']}
+    head = items.get(month)
+    if head is None:
+        return {}, None
+    if 'data' not in head:
+        # Months archived before compression kept every day as a plain attribute.
+        return {day: value for day, value in head.items() if day not in ('user', 'month')}, head
+    chunks = [head['data'].value]
+    for index in range(1, int(head['chunks'])):
+        chunks.append(items['{}#{}#{}'.format(month, head['generation'], index)]['data'].value)
+    return decompress_days(b''.join(chunks)), head
+
+
+def store_archived_month(user_id, month, days, head):
+    """
+    Write one month of days as a compressed blob. In DynamoDB the blob is split into ARCHIVE_CHUNK_BYTES chunks;
+    the trailing chunks of a new generation are written first and the head item switches to them last, so a failed
+    write never leaves a month half replaced.
+    """
+
+    blob = compress_days(days)
+    if ARCHIVE_DIRECTORY:
+        path = archive_path(user_id, month)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path + '.tmp', 'wb') as archived:
+            archived.write(blob)
+        os.replace(path + '.tmp', path)
+        return
+    chunks = [blob[start:start + ARCHIVE_CHUNK_BYTES] for start in range(0, len(blob), ARCHIVE_CHUNK_BYTES)]
+    previous_generation = int(head.get('generation', 0)) if head else 0
+    previous_chunks = int(head.get('chunks', 1)) if head else 1
+    generation = previous_generation + 1
+    for index, chunk in enumerate(chunks[1:], 1):
+        archive.put_item(
+            Item={
+                'user': user_id,
+                'month': '{}#{}#{}'.format(month, generation, index),
+                'data': chunk
+            }
+        )
+    archive.put_item(
+        Item={
+            'user': user_id,
+            'month': month,
+            'generation': generation,
+            'chunks': len(chunks),
+            'days': len(days),
+            'data': chunks[0]
+        }
+    )
+    for index in range(1, previous_chunks):
+        archive.delete_item(
+            Key={
+                'user': user_id,
+                'month': '{}#{}#{}'.format(month, previous_generation, index)
+            }
+        )
+
+
+def load_archived_days(user, intent_request, months):
+    """
+    Merge the given archived months into the user's in-memory history, oldest days first.
+    """
+
+    history = user['Item']['dailyNutrientsAndWorkouts']
+    archived = {}
+    for month in sorted(months):
+        archived.update(load_archived_month(intent_request['userId'], month)[0])
+    archived.update(history)
+    user['Item']['dailyNutrientsAndWorkouts'] = archived
+
+
+""" --- User item size monitor --- """
+
+ITEM_SIZE_LIMIT = 400 * 1024
+ITEM_SIZE_WARNING = int(os.environ.get('ITEM_SIZE_WARNING', 300 * 1024))
+ITEM_SIZE_ARCHIVE = int(os.environ.get('ITEM_SIZE_ARCHIVE', 350 * 1024))
+ITEM_SIZE_TARGET = int(os.environ.get('ITEM_SIZE_TARGET', 250 * 1024))
+ARCHIVE_KEEP_DAYS = int(os.environ.get('ARCHIVE_KEEP_DAYS', 30))
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 28))
+
+
+def select_days_to_archive(user_item, item_size):
+    """
+    Pick every day of the months that ended before the last ARCHIVE_AFTER_DAYS days, then, while the item is still
+    past ITEM_SIZE_ARCHIVE, the oldest remaining days until it is back under ITEM_SIZE_TARGET.
+    """
+
+    history = user_item['dailyNutrientsAndWorkouts']
+    days = sorted(history.keys())
+    cutoff_month = time.strftime('%Y-%m', time.localtime(time.time() - ARCHIVE_AFTER_DAYS * 24 * 60 * 60))
+    over_limit = item_size > ITEM_SIZE_ARCHIVE
+    selected = []
+    for day in days[:max(len(days) - ARCHIVE_KEEP_DAYS, 0)]:
+        if day[:7] >= cutoff_month and not (over_limit and item_size > ITEM_SIZE_TARGET):
+            break
+        selected.append(day)
+        item_size -= len(day.encode('utf-8')) + estimate_value_size(history[day]) + 1
+    return selected
+
+
+def archive_days(user, intent_request, days):
+    """
+    Fold the given days into the user's compressed per-month archive, then remove them from the Users item.
+    """
+
+    history = user['Item']['dailyNutrientsAndWorkouts']
+    months = {}
+    for day in days:
+        months.setdefault(day[:7], {})[day] = history[day]
+    for month, month_days in sorted(months.items()):
+        archived, head = load_archived_month(intent_request['userId'], month)
+        archived.update(month_days)
+        store_archived_month(intent_request['userId'], month, archived, head)
+    users.update_item(
+        Key={
+            'user': intent_request['userId']
+        },
+        UpdateExpression='remove ' + ', '.join(
+            'dailyNutrientsAndWorkouts.#d{}'.format(index) for index in range(len(days))) + ' add archivedMonths :m',
+        ExpressionAttributeValues={
+            ':m': set(months.keys())
+        },
+        ExpressionAttributeNames={'#d{}'.format(index): day for index, day in enumerate(days)},
+    )
+    for day in days:
+        del history[day]
+
+
+def emit_item_size_metric(intent_request, item_size, archived_days):
+    names = ['UserItemBytes', 'UserItemLimitPercent', 'ArchivedDays']
+    units = ['Bytes', 'Percent', 'Count']
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': 'FitFriend',
+                'Dimensions': [['IntentName']],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, unit in zip(names, units)],
+            }],
+        },
+        'IntentName': intent_request['currentIntent']['name'],
+        'UserItemBytes': item_size,
+        'UserItemLimitPercent': round(100.0 * item_size / ITEM_SIZE_LIMIT, 2),
+        'ArchivedDays': archived_days,
+    }
+    metrics_logger.info(json.dumps(record))
+
+
+def monitor_item_size(user, intent_request):
+    """
+    Estimate the size of the user's item once this invocation's write has landed, report it, and move months that
+    fell out of the recent window (or, past ITEM_SIZE_ARCHIVE, the oldest days) into the cold-tier archive.
+    """
+
+    item_size = estimate_item_size(user['Item'])
+    if item_size > ITEM_SIZE_WARNING:
+        logger.warning('user={} item is {} bytes, {:.1f}% of the item size limit'.format(
+            intent_request['userId'], item_size, 100.0 * item_size / ITEM_SIZE_LIMIT))
+    archived_days = select_days_to_archive(user['Item'], item_size)
+    if archived_days:
+        try:
+            archive_days(user, intent_request, archived_days)
+        except Exception:
+            # The user's own write already succeeded; archival is retried on the next write.
+            logger.exception('archiving {} days for user={} failed'.format(len(archived_days),
+                                                                           intent_request['userId']))
+            archived_days = []
+    emit_item_size_metric(intent_request, item_size, len(archived_days))
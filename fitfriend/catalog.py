@@ -0,0 +1,348 @@
+"""
+Lookups in the Foods and Exercises catalogs: the universal partition and each user's own, cached per container, and
+"did you mean" suggestions for names that match neither.
+"""
+
+import hashlib
+import heapq
+import os
+import struct
+import time
+
+from boto3.dynamodb.conditions import Key
+
+""" --- Catalog lookup caches --- """
+
+CATALOG_CACHE_SECONDS = int(os.environ.get('CATALOG_CACHE_SECONDS', 300))
+# Catalogs with more items than this are looked up one name at a time instead of prefetched.
+CATALOG_PREFETCH_ITEMS = int(os.environ.get('CATALOG_PREFETCH_ITEMS', 1000))
+CATALOG_CACHE_USERS = 256
+NEGATIVE_CACHE_SECONDS = int(os.environ.get('NEGATIVE_CACHE_SECONDS', 60))
+NEGATIVE_CACHE_SIZE = 2048
+BLOOM_MAGIC = b'FFBF'
+# magic, format version, hash count, reserved, bit count
+BLOOM_HEADER = struct.Struct('<4sBBHI')
+# name attribute -> (checked at, catalog version, {name: item} or None, BloomFilter or None)
+universal_catalogs = {}
+# (name attribute, user) -> (fetched at, session catalog version, {name: item} or None)
+user_catalogs = {}
+# (name attribute, user, name) -> when this container last saw the name miss both the universal and the user catalog
+negative_cache = {}
+
+
+class BloomFilter(object):
+    """
+    Every universal name, as written into the catalog version stamp by CatalogSync.py. A miss is definite, so the
+    universal get_item can be skipped; about 1% of names not in the catalog still test positive.
+    """
+
+    def __init__(self, blob):
+        _, _, self.hash_count, _, self.bit_count = BLOOM_HEADER.unpack_from(blob)
+        self.bits = blob[BLOOM_HEADER.size:]
+
+    def __contains__(self, name):
+        digest = hashlib.blake2b(name.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        for index in range(self.hash_count):
+            position = (first + index * step) % self.bit_count
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+def prefetch_catalog(table, owner, name_key):
+    """
+    Load one owner's whole partition with a single paginated Query, or return None once it passes
+    CATALOG_PREFETCH_ITEMS.
+    """
+
+    items = {}
+    kwargs = {'KeyConditionExpression': Key('UserID').eq(owner)}
+    while True:
+        response = table.query(**kwargs)
+        for item in response['Items']:
+            items[item[name_key]] = item
+        if len(items) > CATALOG_PREFETCH_ITEMS:
+            return None
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_universal_catalog(table, name_key):
+    """
+    Return (items, bloom) for the universal partition. The version stamp is re-read every CATALOG_CACHE_SECONDS and
+    the partition is only queried again when its version changed.
+    """
+
+    cached = universal_catalogs.get(name_key)
+    if cached is not None and time.time() - cached[0] <= CATALOG_CACHE_SECONDS:
+        return cached[2], cached[3]
+    response = table.get_item(
+        Key={
+            'UserID': 'catalog',
+            name_key: 'version'
+        }
+    )
+    stamp = response.get('Item')
+    if stamp is None:
+        # Catalog never synced: nothing to key a cache on, so every name is looked up.
+        universal_catalogs[name_key] = (time.time(), None, None, None)
+        return None, None
+    version = stamp['Version']
+    blob = stamp['Bloom'].value if 'Bloom' in stamp else None
+    bloom = BloomFilter(blob) if blob is not None and blob[:4] == BLOOM_MAGIC else None
+    if cached is not None and cached[1] == version:
+        items = cached[2]
+    elif int(stamp.get('Items', CATALOG_PREFETCH_ITEMS + 1)) <= CATALOG_PREFETCH_ITEMS:
+        items = prefetch_catalog(table, 'universal', name_key)
+    else:
+        items = None
+    universal_catalogs[name_key] = (time.time(), version, items, bloom)
+    return items, bloom
+
+
+def get_user_catalog(table, name_key, intent_request, prefetch=True):
+    """
+    Return (items, fresh) for the user's custom catalog, prefetched on its first lookup in a conversation and
+    reused while the session's catalogUpdatedAt, which CreateFoods and CreateExercise bump, stays the same. With
+    prefetch off, only a copy already warm in this container is returned.
+    """
+
+    session_attributes = intent_request['sessionAttributes'] or {}
+    version = session_attributes.get('catalogUpdatedAt', '0')
+    key = (name_key, intent_request['userId'])
+    cached = user_catalogs.get(key)
+    if cached is not None and cached[1] == version and time.time() - cached[0] <= CATALOG_CACHE_SECONDS:
+        return cached[2], False
+    if not prefetch:
+        return None, False
+    if cached is None and len(user_catalogs) >= CATALOG_CACHE_USERS:
+        user_catalogs.pop(next(iter(user_catalogs)))
+    items = prefetch_catalog(table, intent_request['userId'], name_key)
+    user_catalogs[key] = (time.time(), version, items)
+    return items, True
+
+
+def is_known_missing(name, name_key, intent_request):
+    """
+    True when this container saw the name miss both catalogs within NEGATIVE_CACHE_SECONDS and nothing was added to
+    the user's catalog in this session since.
+    """
+
+    key = (name_key, intent_request['userId'], name)
+    missed_at = negative_cache.get(key)
+    if missed_at is None:
+        return False
+    session_attributes = intent_request['sessionAttributes'] or {}
+    if time.time() - missed_at > NEGATIVE_CACHE_SECONDS or \
+            missed_at <= float(session_attributes.get('catalogUpdatedAt', 0)):
+        negative_cache.pop(key, None)
+        return False
+    return True
+
+
+def remember_missing(name, name_key, intent_request):
+    if len(negative_cache) >= NEGATIVE_CACHE_SIZE:
+        negative_cache.pop(next(iter(negative_cache)))
+    negative_cache[(name_key, intent_request['userId'], name)] = time.time()
+
+
+def get_catalog_item(name, table, name_key, intent_request):
+    """
+    Find a name in the universal catalog, then in the user's own, answering from the prefetched catalogs whenever
+    they hold it. A name missing from a user catalog prefetched by an earlier invocation is confirmed with one
+    get_item, since another session may have added it since.
+    """
+
+    if is_known_missing(name, name_key, intent_request):
+        return None
+    universal_items, bloom = get_universal_catalog(table, name_key)
+    if universal_items is not None:
+        if name in universal_items:
+            return universal_items[name]
+    elif bloom is None or name in bloom:
+        response = table.get_item(
+            Key={
+                'UserID': 'universal',
+                name_key: name
+            }
+        )
+        if 'Item' in response:
+            return response['Item']
+    user_items, fresh = get_user_catalog(table, name_key, intent_request)
+    if user_items is not None and name in user_items:
+        return user_items[name]
+    if user_items is not None and fresh:
+        remember_missing(name, name_key, intent_request)
+        return None
+    response = table.get_item(
+        Key={
+            'UserID': intent_request['userId'],
+            name_key: name
+        }
+    )
+    if 'Item' in response:
+        return response['Item']
+    remember_missing(name, name_key, intent_request)
+    return None
+
+
+def batch_get_catalog_items(names, table, name_key, intent_request):
+    """
+    Resolve several names the way get_catalog_item resolves one, returning {name: item} for those found. Names the
+    caches cannot answer are fetched from both the universal and the user partition with a single BatchGetItem.
+    """
+
+    found, pending = {}, []
+    universal_items, bloom = get_universal_catalog(table, name_key)
+    user_items, _ = get_user_catalog(table, name_key, intent_request, prefetch=False)
+    for name in names:
+        if name in found or name in pending or is_known_missing(name, name_key, intent_request):
+            continue
+        if universal_items is not None and name in universal_items:
+            found[name] = universal_items[name]
+        elif user_items is not None and name in user_items:
+            found[name] = user_items[name]
+        else:
+            pending.append(name)
+    keys = []
+    for name in pending:
+        if universal_items is None and (bloom is None or name in bloom):
+            keys.append({'UserID': 'universal', name_key: name})
+        keys.append({'UserID': intent_request['userId'], name_key: name})
+    if not keys:
+        return found
+    items = {}
+    for item in table.batch_get_item(keys):
+        if item['UserID'] == 'universal' or item[name_key] not in items:
+            items[item[name_key]] = item
+    for name in pending:
+        if name in items:
+            found[name] = items[name]
+        else:
+            remember_missing(name, name_key, intent_request)
+    return found
+
+
+""" --- Name suggestions --- """
+
+SUGGESTION_CANDIDATES = 50
+# name attribute -> (catalog version, NameMatcher)
+universal_matchers = {}
+
+
+def trigrams(name):
+    padded = '  ' + name + ' '
+    return set(padded[index:index + 3] for index in range(len(padded) - 2))
+
+
+def edit_distance(first, second, limit):
+    """
+    Optimal string alignment distance (insertions, deletions, substitutions and adjacent swaps). Gives up and
+    returns limit + 1 as soon as every alignment is already past limit.
+    """
+
+    before_previous, previous = None, list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        current = [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = 0 if first[i - 1] == second[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]:
+                current[j] = min(current[j], before_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+class NameMatcher(object):
+    """
+    Trigram index over catalog names. Names sharing the most trigrams with the query are re-ranked by edit distance,
+    so typos, dropped letters and swapped letters still find the intended name. Subclasses with postings stored
+    elsewhere override positions and name_at.
+    """
+
+    def __init__(self, names):
+        self.names = sorted(set(names))
+        self.postings = {}
+        for position, name in enumerate(self.names):
+            for gram in trigrams(name):
+                self.postings.setdefault(gram, []).append(position)
+
+    def positions(self, gram):
+        return self.postings.get(gram, ())
+
+    def name_at(self, position):
+        return self.names[position]
+
+    def rank(self, query, max_distance):
+        grams = trigrams(query)
+        shared = {}
+        for gram in grams:
+            for position in self.positions(gram):
+                shared[position] = shared.get(position, 0) + 1
+        # Every edit destroys at most three of the query's trigrams.
+        min_shared = len(grams) - 3 * max_distance
+        ranked = []
+        for position, count in heapq.nlargest(SUGGESTION_CANDIDATES, shared.items(), key=lambda item: item[1]):
+            name = self.name_at(position)
+            if count < min_shared or abs(len(name) - len(query)) > max_distance:
+                continue
+            distance = edit_distance(query, name, max_distance)
+            if distance <= max_distance:
+                ranked.append((distance, -count, name))
+        return sorted(ranked)
+
+
+def query_catalog_names(table, owner, name_key):
+    names = []
+    kwargs = {
+        'KeyConditionExpression': Key('UserID').eq(owner),
+        'ProjectionExpression': '#n',
+        'ExpressionAttributeNames': {'#n': name_key},
+    }
+    while True:
+        response = table.query(**kwargs)
+        names.extend(item[name_key] for item in response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return names
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_universal_matcher(table, name_key):
+    """
+    Return the NameMatcher over every universal name, rebuilt only when the catalog version stamp changes. Its names
+    come from the prefetched catalog when there is one, and from a names-only Query otherwise.
+    """
+
+    items, _ = get_universal_catalog(table, name_key)
+    version = universal_catalogs[name_key][1]
+    cached = universal_matchers.get(name_key)
+    if cached is not None and version is not None and cached[0] == version:
+        return cached[1]
+    matcher = NameMatcher(items if items is not None else query_catalog_names(table, 'universal', name_key))
+    universal_matchers[name_key] = (version, matcher)
+    return matcher
+
+
+def suggest_name(name, table, name_key, intent_request, matchers=()):
+    """
+    Return the universal or user catalog name closest to a name that matched nothing exactly, or None when nothing
+    is within a quarter of its length in edits. matchers rank names kept outside DynamoDB alongside the catalogs.
+    """
+
+    query = name.lower().strip()
+    max_distance = max(1, len(query) // 4)
+    ranked = get_universal_matcher(table, name_key).rank(query, max_distance)
+    user_items = get_user_catalog(table, name_key, intent_request)[0]
+    if user_items is None:
+        user_items = query_catalog_names(table, intent_request['userId'], name_key)
+    ranked += NameMatcher(user_items).rank(query, max_distance)
+    for matcher in matchers:
+        ranked += matcher.rank(query, max_distance)
+    if not ranked:
+        return None
+    return min(ranked)[2]
@@ -0,0 +1,172 @@
+"""
+Calories burned by runs and lifts, estimated from the MET table in catalog/mets.json, and the write that logs
+exercise and optionally credits those calories to the day.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+
+from fitfriend import CATALOG_DIRECTORY
+from fitfriend.archive import monitor_item_size
+from fitfriend.tables import users
+
+logger = logging.getLogger(__name__)
+
+METS_PATH = os.environ.get('METS_PATH', os.path.join(CATALOG_DIRECTORY, 'mets.json'))
+# Whether burned calories are added back to the day's calorie budget, for users who haven't chosen.
+CREDIT_EXERCISE_CALORIES = os.environ.get('CREDIT_EXERCISE_CALORIES', 'false').lower() == 'true'
+# Running METs are precomputed for every tenth of a km/h up to the fastest speed in the table.
+SPEED_STEPS_PER_KMH = 10
+POUNDS_PER_KILOGRAM = 2.20462
+KILOMETERS_PER_MILE = 1.60934
+ISO_DURATION = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+
+
+class MetTable(object):
+    """
+    Metabolic equivalents from catalog/mets.json: running by speed, with the ACSM grade term for incline, and
+    lifting by exercise and intensity. A MET burns one calorie per kilogram of body weight per hour.
+    """
+
+    __slots__ = ('run_mets', 'incline_factor', 'lift_mets', 'rpe_from', 'default_intensity', 'seconds_per_set')
+
+    def __init__(self, data):
+        speeds = data['running']['speeds']
+        self.run_mets = []
+        for step in range(int(speeds[-1][0] * SPEED_STEPS_PER_KMH) + 1):
+            self.run_mets.append(interpolate(speeds, float(step) / SPEED_STEPS_PER_KMH))
+        self.incline_factor = data['running'].get('inclineFactor', 0)
+        lifting = data['lifting']
+        self.lift_mets = {'': lifting['intensities']}
+        for exercise_name, intensities in lifting.get('exercises', {}).items():
+            self.lift_mets[exercise_name] = dict(lifting['intensities'], **intensities)
+        # Highest RPE first, so the first threshold an RPE reaches names its intensity.
+        self.rpe_from = sorted(lifting.get('rpeFrom', {}).items(), key=lambda threshold: -threshold[1])
+        self.default_intensity = lifting.get('defaultIntensity', 'moderate')
+        self.seconds_per_set = lifting.get('secondsPerSet', 120)
+
+    def run_met(self, speed, incline):
+        met = self.run_mets[min(int(speed * SPEED_STEPS_PER_KMH), len(self.run_mets) - 1)]
+        # ACSM: 0.9 ml/kg/min of oxygen per m/min of speed per unit of grade, and one MET is 3.5 ml/kg/min.
+        return met + self.incline_factor * (speed * 1000 / 60) * (incline / 100.0) / 3.5
+
+    def lift_met(self, exercise_name, rpe):
+        intensity = self.default_intensity
+        if rpe:
+            for name, threshold in self.rpe_from:
+                if rpe >= threshold:
+                    intensity = name
+                    break
+        return self.lift_mets.get(exercise_name, self.lift_mets[''])[intensity]
+
+
+def interpolate(points, x):
+    if x <= points[0][0]:
+        return points[0][1]
+    for (low_x, low_y), (high_x, high_y) in zip(points, points[1:]):
+        if x <= high_x:
+            return low_y + (high_y - low_y) * (x - low_x) / (high_x - low_x)
+    return points[-1][1]
+
+
+def load_met_table(path):
+    if not os.path.exists(path):
+        logger.info('no MET table at {}, exercise burns no calories'.format(path))
+        return None
+    with open(path) as mets_file:
+        return MetTable(json.load(mets_file))
+
+
+met_table = load_met_table(METS_PATH)
+
+
+def parse_duration(duration):
+    """
+    Hours in a Lex AMAZON.DURATION value such as PT45M or PT1H10M, or None when it can't be read.
+    """
+
+    match = ISO_DURATION.match(str(duration or '').upper())
+    if match is None or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = [float(part or 0) for part in match.groups()]
+    return days * 24 + hours + minutes / 60 + seconds / 3600
+
+
+def body_weight_kilograms(user):
+    weight = float(user['Item']['weight'])
+    if user['Item']['measurementSystem'] == 'imperial system':
+        return weight / POUNDS_PER_KILOGRAM
+    return weight
+
+
+def credits_exercise_calories(user):
+    return bool(user['Item'].get('creditExerciseCalories', CREDIT_EXERCISE_CALORIES))
+
+
+def generate_burn_string(calories_burned, credited):
+    if calories_burned <= 0:
+        return ''
+    if credited:
+        return 'That burned about {} calories, which I added back to today\'s budget. '.format(calories_burned)
+    return 'That burned about {} calories. '.format(calories_burned)
+
+
+def estimate_run_calories(distance, duration, incline, user):
+    hours = parse_duration(duration)
+    try:
+        distance = float(distance)
+        incline = float(incline or 0)
+    except (TypeError, ValueError):
+        return 0
+    if met_table is None or not hours or distance <= 0:
+        return 0
+    if user['Item']['measurementSystem'] == 'imperial system':
+        distance *= KILOMETERS_PER_MILE
+    met = met_table.run_met(distance / hours, incline)
+    return int(round(met * body_weight_kilograms(user) * hours))
+
+
+def estimate_lift_calories(lift, user):
+    if met_table is None:
+        return 0
+    rpes = lift.rpes + [0] * (len(lift.reps) - len(lift.rpes))
+    met_hours = sum(met_table.lift_met(lift.name, rpe) for rpe in rpes) * met_table.seconds_per_set / 3600.0
+    return int(round(met_hours * body_weight_kilograms(user)))
+
+
+def record_exercises(user, intent_request, entries, exercises_remaining):
+    """
+    Append entries ({log time: exerciseLog item}) to today's exerciseLog in one update_item. When the user credits
+    exercise, the same write adds the calories the entries burned to today's remaining calories, so nothing is read
+    back first. Returns (calories burned, whether they were credited).
+    """
+
+    today = user['Item']['dailyNutrientsAndWorkouts'][time.strftime("%Y-%m-%d")]
+    today['exerciseLog'].update(entries)
+    assignments = ['dailyNutrientsAndWorkouts.#day.exercisesRemaining = :e']
+    values = {':e': exercises_remaining}
+    names = {'#day': time.strftime("%Y-%m-%d")}
+    for index, (logged_at, entry) in enumerate(sorted(entries.items())):
+        assignments.append('dailyNutrientsAndWorkouts.#day.exerciseLog.#t{0} = :x{0}'.format(index))
+        values[':x{}'.format(index)] = entry
+        names['#t{}'.format(index)] = logged_at
+    update_expression = 'set ' + ', '.join(assignments)
+    calories_burned = sum(entry.get('CaloriesBurned', 0) for entry in entries.values())
+    credited = calories_burned > 0 and credits_exercise_calories(user)
+    if credited:
+        update_expression += ' add dailyNutrientsAndWorkouts.#day.nutritionRemaining.calorie :c'
+        values[':c'] = calories_burned
+        today['nutritionRemaining']['calorie'] += calories_burned
+    users.update_item(
+        Key={
+            'user': intent_request['userId']
+        },
+        UpdateExpression=update_expression,
+        ExpressionAttributeValues=values,
+        ExpressionAttributeNames=names,
+    )
+    monitor_item_size(user, intent_request)
+    return calories_burned, credited
@@ -0,0 +1,205 @@
+"""
+The memory-mapped universal food index and the food lookups built on it. Every hook and tool resolves food names
+here, so a food that only the index holds is found, suggested and protected from being shadowed the same way
+everywhere.
+"""
+
+import logging
+import mmap
+import os
+import struct
+
+from fitfriend import CATALOG_DIRECTORY
+from fitfriend.catalog import NameMatcher, batch_get_catalog_items, get_catalog_item, suggest_name
+from fitfriend.model import Food, NutritionVector
+from fitfriend.tables import foods
+
+logger = logging.getLogger(__name__)
+
+""" --- Universal food index --- """
+
+FOOD_INDEX_PATH = os.environ.get('FOOD_INDEX_PATH', os.path.join(CATALOG_DIRECTORY, 'foods.idx'))
+
+
+class FoodIndex(object):
+    """
+    Read-only, memory-mapped universal food catalog written by BuildFoodIndex.py. Records are fixed size and sorted
+    by name, so a lookup is a binary search that only pages in the few records it compares against. Version 3 files
+    also carry the trigram postings of every name for "did you mean", stored the same way.
+    """
+
+    HEADER = struct.Struct('<4sHHII')
+    TRIGRAM_HEADER = struct.Struct('<II')
+    # Version 1 records stop at fat; version 2 adds fiber, sugar and sodium, and version 3 the trigram postings.
+    RECORDS = {1: struct.Struct('<IHHHHHH'), 2: struct.Struct('<IHHHHHHHHH'), 3: struct.Struct('<IHHHHHHHHH')}
+    TRIGRAM_BYTES = 12
+    TRIGRAM = struct.Struct('<{}sII'.format(TRIGRAM_BYTES))
+
+    def __init__(self, path):
+        with open(path, 'rb') as index_file:
+            self.data = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, self.names_offset = self.HEADER.unpack_from(self.data, 0)
+        if magic != b'FFDX' or version not in self.RECORDS:
+            raise ValueError('{} is not a version 1, 2 or 3 food index'.format(path))
+        self.RECORD = self.RECORDS[version]
+        self.records_offset = self.HEADER.size
+        self.trigram_count, self.trigrams_offset = 0, None
+        if version >= 3:
+            self.trigram_count, self.trigrams_offset = self.TRIGRAM_HEADER.unpack_from(self.data, self.HEADER.size)
+            self.records_offset += self.TRIGRAM_HEADER.size
+        self.matcher = None
+
+    def __len__(self):
+        return self.count
+
+    def record(self, position):
+        return self.RECORD.unpack_from(self.data, self.records_offset + position * self.RECORD.size)
+
+    def name(self, record):
+        start = self.names_offset + record[0]
+        return self.data[start:start + record[1]]
+
+    def names(self):
+        for position in range(self.count):
+            yield self.name(self.record(position)).decode('utf-8')
+
+    def get(self, food_name):
+        key = food_name.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record = self.record(middle)
+            name = self.name(record)
+            if name < key:
+                low = middle + 1
+            elif name > key:
+                high = middle
+            else:
+                return Food(food_name, record[2], NutritionVector(*record[3:]))
+        return None
+
+    def trigram_positions(self, gram):
+        """
+        The positions of the records whose names hold a trigram, found by binary search over the trigram table.
+        """
+
+        key = gram.encode('utf-8').ljust(self.TRIGRAM_BYTES, b'\0')
+        low, high = 0, self.trigram_count
+        while low < high:
+            middle = (low + high) // 2
+            start = self.trigrams_offset + middle * self.TRIGRAM.size
+            entry, offset, count = self.TRIGRAM.unpack_from(self.data, start)
+            if entry < key:
+                low = middle + 1
+            elif entry > key:
+                high = middle
+            else:
+                return struct.unpack_from('<{}I'.format(count), self.data, offset)
+        return ()
+
+    def name_matcher(self):
+        # Older files without postings are indexed on the first "did you mean" a container answers, then kept.
+        if self.matcher is None:
+            self.matcher = FoodIndexMatcher(self) if self.trigrams_offset is not None else NameMatcher(self.names())
+        return self.matcher
+
+
+class FoodIndexMatcher(NameMatcher):
+    """
+    NameMatcher reading the trigram postings BuildFoodIndex.py wrote into the index, so nothing is built at runtime.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def positions(self, gram):
+        return self.index.trigram_positions(gram)
+
+    def name_at(self, position):
+        return self.index.name(self.index.record(position)).decode('utf-8')
+
+
+def load_food_index(path):
+    if not os.path.exists(path):
+        logger.info('no food index at {}, universal foods come from DynamoDB'.format(path))
+        return None
+    return FoodIndex(path)
+
+
+food_index = load_food_index(FOOD_INDEX_PATH)
+
+""" --- Food lookups --- """
+
+BATCH_GET_KEYS = 100
+
+
+def get_indexed_food(food_name):
+    """
+    Return the index's Food for a lowercase name, or None when there is no index or it lacks the name. Index foods
+    are universal, so they win over a user's food of the same name.
+    """
+
+    if food_index is None:
+        return None
+    return food_index.get(food_name)
+
+
+def resolve_food(food_name, intent_request):
+    """
+    Find one food: the universal index, then the cached universal and user catalogs.
+    """
+
+    food = get_indexed_food(food_name)
+    if food is not None:
+        return food
+    item = get_catalog_item(food_name, foods, 'FoodName', intent_request)
+    return Food.from_item(item) if item is not None else None
+
+
+def resolve_foods(names, intent_request):
+    """
+    Resolve several names the way resolve_food resolves one, returning {name: Food} for those found. Names the
+    index lacks share the catalogs' single BatchGetItem.
+    """
+
+    found = {}
+    for name in names:
+        food = get_indexed_food(name)
+        if food is not None:
+            found[name] = food
+    missing = [name for name in names if name not in found]
+    if missing:
+        for name, item in batch_get_catalog_items(missing, foods, 'FoodName', intent_request).items():
+            found[name] = Food.from_item(item)
+    return found
+
+
+def get_food_items(names, intent_request):
+    """
+    Fetch the current Foods rows for several names, bypassing the catalog caches, returning {name: item} for those
+    found. Index foods come back as universal rows; the rest are read from both the universal and the user
+    partition with BatchGetItem, and a universal row wins.
+    """
+
+    items, keys = {}, []
+    for name in sorted(set(names)):
+        food = get_indexed_food(name)
+        if food is not None:
+            items[name] = food.to_item('universal')
+            continue
+        keys.append({'UserID': 'universal', 'FoodName': name})
+        keys.append({'UserID': intent_request['userId'], 'FoodName': name})
+    for start in range(0, len(keys), BATCH_GET_KEYS):
+        for item in foods.batch_get_item(keys[start:start + BATCH_GET_KEYS]):
+            if item['UserID'] == 'universal' or item['FoodName'] not in items:
+                items[item['FoodName']] = item
+    return items
+
+
+def suggest_food_name(food_name, intent_request):
+    """
+    Return the index or catalog food name closest to one that matched nothing, or None.
+    """
+
+    matchers = [food_index.name_matcher()] if food_index is not None else []
+    return suggest_name(food_name, foods, 'FoodName', intent_request, matchers)
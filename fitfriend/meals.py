@@ -0,0 +1,186 @@
+"""
+Meals as people say them: the unit table that converts cups, slices and ounces to grams, and the parser that splits
+"1.5 cups of rice and 2 eggs" into foodLog entries. RecordMeal logs meals and CreateRecipe stores ingredients with
+the same parser, so anything one accepts the other does too.
+"""
+
+import json
+import logging
+import os
+import re
+from decimal import Decimal
+
+from fitfriend import CATALOG_DIRECTORY
+from fitfriend.model import to_number
+from fitfriend.text import generate_list_string
+
+logger = logging.getLogger(__name__)
+
+""" --- Unit conversion --- """
+
+UNITS_PATH = os.environ.get('UNITS_PATH', os.path.join(CATALOG_DIRECTORY, 'units.json'))
+
+
+def normalize_unit_name(name):
+    return ' '.join(name.lower().replace('.', ' ').split())
+
+
+class UnitTable(object):
+    """
+    The measurement units a meal may be given in: mass units in grams, volume units in milliliters and piece units
+    such as slices, with each food's density and piece weights.
+    """
+
+    __slots__ = ('names', 'grams', 'milliliters', 'densities', 'default_density', 'piece_grams')
+
+    def __init__(self, data):
+        self.names, self.grams, self.milliliters = {}, {}, {}
+        for unit, definition in data['units'].items():
+            for name in [unit] + definition.get('aliases', []):
+                self.names[normalize_unit_name(name)] = unit
+            if 'grams' in definition:
+                self.grams[unit] = definition['grams']
+            elif 'milliliters' in definition:
+                self.milliliters[unit] = definition['milliliters']
+        self.densities = data.get('densities', {})
+        self.default_density = data.get('defaultDensity', 1)
+        self.piece_grams = data.get('pieces', {})
+
+    def unit(self, name):
+        if name is None:
+            return None
+        return self.names.get(normalize_unit_name(name))
+
+    def to_grams(self, food, measurement, unit):
+        """
+        Convert an amount of a food to grams. Volumes go through the food's density, or water's when it has none;
+        pieces use the food's piece weight, and count as servings when it has none.
+        """
+
+        if unit in self.grams:
+            return measurement * self.grams[unit]
+        if unit in self.milliliters:
+            return measurement * self.milliliters[unit] * self.densities.get(food.name, self.default_density)
+        weight = self.piece_grams.get(food.name, {}).get(unit)
+        if weight is not None:
+            return measurement * weight
+        return measurement * food.serving
+
+
+def load_unit_table(path):
+    """
+    Read catalog/units.json once per container, keeping its decimals exact.
+    """
+
+    if not os.path.exists(path):
+        logger.info('no unit table at {}, meals are measured in grams and servings only'.format(path))
+        return UnitTable({'units': {'grams': {'grams': 1, 'aliases': ['g', 'gram']},
+                                    'servings': {'servings': 1, 'aliases': ['serving']}}})
+    with open(path) as units_file:
+        return UnitTable(json.load(units_file, parse_float=Decimal))
+
+
+unit_table = load_unit_table(UNITS_PATH)
+
+""" --- Multi-food meals --- """
+
+NUMBER_WORDS = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+                'eight': 8, 'nine': 9, 'ten': 10}
+# Commas always separate foods. "and", "with", "plus" and "&" separate them too, unless the catalog knows the joined
+# name, as with "macaroni and cheese".
+MEAL_SEPARATOR = re.compile(r'\s*[,;]\s*(?:and\s+)?')
+MEAL_JOINER = re.compile(r'\s+(and|with|plus|&)\s+')
+# Longest unit names first, so "fl oz" wins over "fl" and "tbsps" over "tbsp".
+MEAL_UNITS = '|'.join(re.escape(name) for name in sorted(unit_table.names, key=len, reverse=True))
+MEAL_QUANTITY = re.compile(r'^(?:(\d+(?:\.\d+)?)\s*|(' + '|'.join(NUMBER_WORDS) + r')\s+)(?:(' + MEAL_UNITS +
+                           r')\s+)?(?:of\s+)?(.+)$')
+
+
+def parse_meal(meal):
+    """
+    Split a meal such as "2 eggs, 150 grams of chicken breast and a banana" into (joiner, entry) pairs. Each entry
+    is shaped like a foodLog entry; joiner is the word that may glue a food without an amount onto the one before
+    it, or None.
+    """
+
+    parts = []
+    for piece in MEAL_SEPARATOR.split(' '.join(meal.lower().split())):
+        # Splitting on a capturing pattern alternates food text and the joiner between them.
+        words = MEAL_JOINER.split(piece)
+        for index in range(0, len(words), 2):
+            text = words[index].strip()
+            if not text:
+                continue
+            joiner = words[index - 1] if index and parts else None
+            match = MEAL_QUANTITY.match(text)
+            if match is None:
+                parts.append((joiner, {'FoodName': text, 'Measurement': 1, 'MeasurementType': 'servings'}))
+            else:
+                measurement = match.group(1) or str(NUMBER_WORDS[match.group(2)])
+                parts.append((None, {'FoodName': match.group(4), 'Measurement': to_number(measurement),
+                                     'MeasurementType': unit_table.unit(match.group(3)) or 'servings'}))
+    return parts
+
+
+def joined_food_name(parts, index):
+    joiner, entry = parts[index]
+    return '{} {} {}'.format(parts[index - 1][1]['FoodName'], joiner, entry['FoodName'])
+
+
+def singular_food_name(name):
+    # "2 bananas" should find "banana"; only the last word is changed, as in "3 chicken wings".
+    for ending, replacement in (('ies', 'y'), ('oes', 'o'), ('s', '')):
+        if name.endswith(ending) and not name.endswith('ss'):
+            return name[:-len(ending)] + replacement
+    return None
+
+
+def meal_food_names(parts):
+    names = []
+    for index, (joiner, entry) in enumerate(parts):
+        names.append(entry['FoodName'])
+        if singular_food_name(entry['FoodName']) is not None:
+            names.append(singular_food_name(entry['FoodName']))
+        if joiner is not None:
+            names.append(joined_food_name(parts, index))
+    return names
+
+
+def assemble_meal(parts, meal_foods):
+    """
+    Turn parsed parts into the meal's foodLog entries, gluing a part onto the one before it when the catalog knows
+    the joined name and falling back to the singular name when only that is known.
+    """
+
+    entries = []
+    for index, (joiner, entry) in enumerate(parts):
+        if joiner is not None and entries[-1]['FoodName'] == parts[index - 1][1]['FoodName']:
+            name = joined_food_name(parts, index)
+            if name in meal_foods:
+                entries[-1]['FoodName'] = name
+                continue
+        entries.append(dict(entry))
+        singular = singular_food_name(entry['FoodName'])
+        if entry['FoodName'] not in meal_foods and singular in meal_foods:
+            entries[-1]['FoodName'] = singular
+    return entries
+
+
+def calculate_nutrition(food, measurement, measurement_type):
+    if measurement_type in ('grams', 'servings'):
+        return food.nutrition_for(to_number(measurement), measurement_type)
+    return food.nutrition_for(unit_table.to_grams(food, to_number(measurement), measurement_type), 'grams')
+
+
+def generate_meal_string(entries):
+    amounts = []
+    for entry in entries:
+        measurement_type = entry['MeasurementType']
+        if entry['Measurement'] == 1:
+            measurement_type = measurement_type[:-1]
+        amounts.append('{} {} of {}'.format(entry['Measurement'], measurement_type, entry['FoodName']))
+    return generate_list_string(amounts)
+
+
+def generate_nutrition_string(nutrition):
+    return str(nutrition)
@@ -0,0 +1,204 @@
+"""
+Foods, nutrition, exercise entries and days of the Users item, parsed once from their stored form.
+"""
+
+from decimal import Decimal
+
+# Every nutrient tracked, in vector order. Sodium is in milligrams and the rest in grams, calories aside. The core
+# nutrients are always stored; the others only when nonzero, so rows and days written before them read as zero.
+NUTRIENTS = ('calorie', 'protein', 'carbohydrate', 'fat', 'fiber', 'sugar', 'sodium')
+CORE_NUTRIENTS = NUTRIENTS[:4]
+NUTRIENT_LABELS = ('cal', 'p', 'c', 'f', 'g fiber', 'g sugar', 'mg sodium')
+
+
+def to_number(value):
+    # Slot strings and DynamoDB Decimals become int when whole and Decimal otherwise, never float.
+    number = value if isinstance(value, Decimal) else Decimal(str(value).strip())
+    return int(number) if number == number.to_integral_value() else number.normalize()
+
+
+class NutritionVector(object):
+    """
+    The amount of every nutrient in NUTRIENTS, held as one tuple of ints and parsed once from a stored nutrition
+    map or catalog row. Arithmetic and threshold checks run over the whole tuple, so a new nutrient only has to be
+    added to NUTRIENTS.
+    """
+
+    __slots__ = ('values',)
+
+    def __init__(self, *values):
+        self.values = tuple(values) + (0,) * (len(NUTRIENTS) - len(values))
+
+    def __getattr__(self, nutrient):
+        if nutrient in NUTRIENTS:
+            return self.values[NUTRIENTS.index(nutrient)]
+        raise AttributeError(nutrient)
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(*[int(item.get(nutrient, 0)) for nutrient in NUTRIENTS])
+
+    @classmethod
+    def from_catalog_item(cls, item):
+        return cls(*[int(item.get(nutrient.capitalize(), 0)) for nutrient in NUTRIENTS])
+
+    def to_item(self):
+        return {nutrient: amount for nutrient, amount in zip(NUTRIENTS, self.values)
+                if amount or nutrient in CORE_NUTRIENTS}
+
+    def items(self):
+        return list(zip(NUTRIENTS, self.values))
+
+    def scaled(self, factor):
+        return NutritionVector(*[int(factor * amount) for amount in self.values])
+
+    def below(self, floor, nutrients=NUTRIENTS):
+        return [nutrient for nutrient, amount, lowest in zip(NUTRIENTS, self.values, floor.values)
+                if amount < lowest and nutrient in nutrients]
+
+    def __add__(self, other):
+        return NutritionVector(*[amount + other_amount for amount, other_amount in zip(self.values, other.values)])
+
+    def __sub__(self, other):
+        return NutritionVector(*[amount - other_amount for amount, other_amount in zip(self.values, other.values)])
+
+    def __str__(self):
+        return ', '.join('{} {}'.format(amount, label) for nutrient, amount, label in
+                         zip(NUTRIENTS, self.values, NUTRIENT_LABELS) if amount or nutrient in CORE_NUTRIENTS)
+
+
+class Food(object):
+    """
+    A Foods row: the serving size in grams and the nutrition of one serving.
+    """
+
+    __slots__ = ('name', 'serving', 'nutrition')
+
+    def __init__(self, name, serving, nutrition):
+        self.name = name
+        self.serving = serving
+        self.nutrition = nutrition
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(item['FoodName'], to_number(item['Serving']), NutritionVector.from_catalog_item(item))
+
+    def to_item(self, owner):
+        item = {'UserID': owner, 'FoodName': self.name, 'Serving': self.serving}
+        item.update({nutrient.capitalize(): amount for nutrient, amount in self.nutrition.to_item().items()})
+        return item
+
+    def nutrition_for(self, measurement, measurement_type):
+        if measurement_type == 'grams':
+            return self.nutrition.scaled(measurement / self.serving)
+        return self.nutrition.scaled(measurement)
+
+
+class ExerciseEntry(object):
+    """
+    One exerciseLog entry. Lifts carry per-set weight, reps and RPE arrays (0 marks a set logged without an RPE);
+    runs carry a distance, an ISO 8601 duration and an optional incline.
+    """
+
+    __slots__ = ('name', 'weights', 'reps', 'rpes', 'distance', 'duration', 'incline')
+
+    def __init__(self, name, weights=(), reps=(), rpes=(), distance=None, duration=None, incline=None):
+        self.name = name
+        self.weights = list(weights)
+        self.reps = list(reps)
+        self.rpes = list(rpes)
+        self.distance = distance
+        self.duration = duration
+        self.incline = incline
+
+    @classmethod
+    def from_item(cls, item):
+        if 'Reps' not in item:
+            incline = item.get('Incline')
+            return cls(item['ExerciseName'], distance=to_number(item['Distance']), duration=item['Duration'],
+                       incline=to_number(incline) if incline is not None else None)
+        if isinstance(item['Reps'], list):
+            return cls(item['ExerciseName'], [to_number(weight) for weight in item['Weight']],
+                       [int(reps) for reps in item['Reps']], [to_number(rpe) for rpe in item.get('RPE', [])])
+        # Lifts logged before per-set arrays repeat one Weight/Reps pair Sets times and have no RPE.
+        sets = int(to_number(item['Sets']))
+        return cls(item['ExerciseName'], [to_number(item['Weight'])] * sets, [int(to_number(item['Reps']))] * sets)
+
+    def is_run(self):
+        return self.distance is not None
+
+    def to_item(self):
+        if self.is_run():
+            item = {'ExerciseName': self.name, 'Distance': self.distance, 'Duration': self.duration}
+            if self.incline is not None:
+                item['Incline'] = self.incline
+            return item
+        item = {'ExerciseName': self.name, 'Weight': self.weights, 'Reps': self.reps}
+        if any(self.rpes):
+            item['RPE'] = self.rpes
+        return item
+
+    def volume(self):
+        return sum(weight * reps for weight, reps in zip(self.weights, self.reps))
+
+    def sets_string(self, measurement):
+        if len(self.reps) == 1:
+            return '{}{} for {} reps'.format(self.weights[0], measurement, self.reps[0])
+        if len(set(self.weights)) == 1 and len(set(self.reps)) == 1:
+            return '{}{} for {} reps and {} sets'.format(self.weights[0], measurement, self.reps[0], len(self.reps))
+        return ', '.join('{}{} x {}'.format(weight, measurement, reps) for weight, reps in zip(self.weights, self.reps))
+
+
+class DayRecord(object):
+    """
+    One day of dailyNutrientsAndWorkouts with every number parsed once: remaining and logged nutrition as
+    NutritionVector, food measurements as numbers and exerciseLog entries as ExerciseEntry.
+    """
+
+    __slots__ = ('day', 'nutrition_remaining', 'exercises_remaining', 'violations', 'food_log', 'exercise_log',
+                 'excuses')
+
+    def __init__(self, day, nutrition_remaining, exercises_remaining, violations, food_log, exercise_log, excuses):
+        self.day = day
+        self.nutrition_remaining = nutrition_remaining
+        self.exercises_remaining = exercises_remaining
+        self.violations = violations
+        self.food_log = food_log
+        self.exercise_log = exercise_log
+        self.excuses = excuses
+
+    @classmethod
+    def from_item(cls, day, components):
+        food_log = {}
+        for logged_at, entry in components['foodLog'].items():
+            food_log[logged_at] = dict(entry, Measurement=to_number(entry['Measurement']),
+                                       FoodNutrition=NutritionVector.from_item(entry['FoodNutrition']))
+        exercise_log = {logged_at: ExerciseEntry.from_item(entry) for logged_at, entry in
+                        components['exerciseLog'].items()}
+        return cls(day, NutritionVector.from_item(components['nutritionRemaining']),
+                   list(components['exercisesRemaining']), list(components['violations']), food_log, exercise_log,
+                   components.get('excuses', {}))
+
+    def to_item(self):
+        return {
+            'nutritionRemaining': self.nutrition_remaining.to_item(),
+            'exercisesRemaining': self.exercises_remaining,
+            'violations': self.violations,
+            'foodLog': {logged_at: dict(entry, FoodNutrition=entry['FoodNutrition'].to_item())
+                        for logged_at, entry in self.food_log.items()},
+            'exerciseLog': {logged_at: entry.to_item() for logged_at, entry in self.exercise_log.items()},
+            'excuses': self.excuses,
+        }
+
+
+def get_day_record(user, day):
+    return DayRecord.from_item(day, user['Item']['dailyNutrientsAndWorkouts'][day])
+
+
+def next_log_time(log, logged_at):
+    # Entries logged in the same second move to the next free second, so each one in a day's log keeps its own key.
+    while logged_at in log:
+        hours, minutes, seconds = [int(part) for part in logged_at.split(':')]
+        total = (hours * 3600 + minutes * 60 + seconds + 1) % 86400
+        logged_at = '{:02d}:{:02d}:{:02d}'.format(total // 3600, total // 60 % 60, total % 60)
+    return logged_at
@@ -0,0 +1,56 @@
+"""
+The muscle groups exercises are filed under, and the exercises of one group from both catalogs.
+"""
+
+from boto3.dynamodb.conditions import Key
+
+from fitfriend.catalog import get_universal_catalog, get_user_catalog
+from fitfriend.tables import exercises
+
+MUSCLE_GROUPS = ['shoulder', 'arms', 'back', 'legs', 'chest', 'core']
+MUSCLE_GROUP_SYNONYMS = {
+    'shoulders': 'shoulder', 'delts': 'shoulder', 'arm': 'arms', 'biceps': 'arms', 'triceps': 'arms', 'lats': 'back',
+    'leg': 'legs', 'quads': 'legs', 'hamstrings': 'legs', 'glutes': 'legs', 'pecs': 'chest', 'abs': 'core'
+}
+# Global secondary index on the Exercises table: UserID hash key, MuscleGroup range key.
+MUSCLE_GROUP_INDEX = 'MuscleGroupIndex'
+
+
+def canonical_muscle_group(name):
+    name = ' '.join(name.lower().split())
+    if name in MUSCLE_GROUPS:
+        return name
+    return MUSCLE_GROUP_SYNONYMS.get(name)
+
+
+def query_muscle_group(owner, muscle_group):
+    names = []
+    kwargs = {
+        'IndexName': MUSCLE_GROUP_INDEX,
+        'KeyConditionExpression': Key('UserID').eq(owner) & Key('MuscleGroup').eq(muscle_group),
+        'ProjectionExpression': 'ExerciseName'
+    }
+    while True:
+        response = exercises.query(**kwargs)
+        names.extend(item['ExerciseName'] for item in response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return names
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_muscle_group_exercises(muscle_group, intent_request, prefetch=True):
+    """
+    Return (universal names, user names) for one muscle group. Catalogs held by the warm cache are filtered in
+    memory; anything else is read from the MuscleGroupIndex, so the tables are never scanned.
+    """
+
+    found = []
+    for owner, items in [('universal', get_universal_catalog(exercises, 'ExerciseName')[0]),
+                         (intent_request['userId'],
+                          get_user_catalog(exercises, 'ExerciseName', intent_request, prefetch)[0])]:
+        if items is None:
+            found.append(sorted(query_muscle_group(owner, muscle_group)))
+        else:
+            found.append(sorted(name for name, item in items.items()
+                                if item.get('MuscleGroup', '').lower() == muscle_group))
+    return found[0], [name for name in found[1] if name not in found[0]]
@@ -0,0 +1,173 @@
+"""
+Declarative nutrient rules a day's eating is checked against, and the phrases users set their own with.
+"""
+
+import re
+
+from fitfriend.model import NUTRIENTS, NutritionVector, to_number
+from fitfriend.text import generate_list_string
+
+# A rule checks how much of one nutrient a day has eaten against a threshold: 'limit' rules break once the day goes
+# over it, 'floor' rules when a finished day stays under it. The threshold is an absolute 'amount' or a 'percent' of
+# the nutrient's goal. Users can keep their own rules in violationRules; each one replaces the default for the same
+# nutrient and kind. The defaults allow no calories over the goal and 10% over every other goal.
+DEFAULT_VIOLATION_RULES = [{'nutrient': 'calorie', 'kind': 'limit', 'percent': 100}] + [
+    {'nutrient': nutrient, 'kind': 'limit', 'percent': 110} for nutrient in NUTRIENTS[1:]]
+
+# Phrases for the broken rules, keyed by kind and by whether the rule is a percentage of the goal or an amount.
+# Rules that share a phrase are listed together, as in "over 10% of your protein and fat limits".
+VIOLATION_TEMPLATES = {
+    ('limit', 'goal'): 'over your {nutrients} {limit}',
+    ('limit', 'percent'): 'over {over}% of your {nutrients} {limit}',
+    ('limit', 'amount'): 'over your {amount} {nutrients} {limit}',
+    ('floor', 'percent'): 'under {percent}% of your {nutrients} {goal}',
+    ('floor', 'amount'): 'under your {amount} {nutrients} {minimum}',
+}
+VIOLATION_NOUNS = ('limit', 'goal', 'minimum')
+
+
+class ViolationRules(object):
+    """
+    A user's rules compiled against their goal into at most one limit and one floor per nutrient, so checking a day
+    is a single pass over its nutrition vector.
+    """
+
+    __slots__ = ('limits', 'floors')
+
+    def __init__(self, rules, nutrient_goal):
+        goal = NutritionVector.from_item(nutrient_goal)
+        self.limits = [None] * len(NUTRIENTS)
+        self.floors = [None] * len(NUTRIENTS)
+        for rule in rules:
+            if rule.get('nutrient') not in NUTRIENTS:
+                continue
+            position = NUTRIENTS.index(rule['nutrient'])
+            if 'amount' in rule:
+                threshold = to_number(rule['amount'])
+            elif 'percent' in rule and rule['nutrient'] in nutrient_goal:
+                threshold = int(goal.values[position] * to_number(rule['percent']) / 100)
+            else:
+                continue
+            # The strictest rule for a nutrient wins.
+            if rule.get('kind') == 'floor':
+                if self.floors[position] is None or threshold > self.floors[position][0]:
+                    self.floors[position] = (threshold, rule)
+            elif self.limits[position] is None or threshold < self.limits[position][0]:
+                self.limits[position] = (threshold, rule)
+
+    @classmethod
+    def for_user(cls, user):
+        own_rules = user['Item'].get('violationRules', [])
+        replaced = set((rule.get('nutrient'), rule.get('kind')) for rule in own_rules)
+        rules = [rule for rule in DEFAULT_VIOLATION_RULES
+                 if (rule['nutrient'], rule['kind']) not in replaced] + list(own_rules)
+        return cls(rules, user['Item']['nutrientGoal'])
+
+    def broken(self, eaten, kind='limit'):
+        """
+        The rules of the given kind the eaten nutrition breaks, in NUTRIENTS order.
+        """
+
+        checks = self.limits if kind == 'limit' else self.floors
+        broken = []
+        for amount, check in zip(eaten.values, checks):
+            if check is not None and (amount > check[0] if kind == 'limit' else amount < check[0]):
+                broken.append(check[1])
+        return broken
+
+
+def generate_rules_string(broken):
+    """
+    Fill in the template for every broken rule, listing the nutrients of rules that read the same together.
+    """
+
+    phrases = {}
+    for rule in broken:
+        if 'amount' in rule:
+            key = (rule['kind'], 'amount', rule['amount'])
+        elif rule['kind'] == 'limit' and to_number(rule['percent']) == 100:
+            key = ('limit', 'goal', None)
+        else:
+            key = (rule['kind'], 'percent', rule['percent'])
+        phrases.setdefault(key, []).append(rule['nutrient'])
+    strings = []
+    for (kind, threshold, value), nutrients in phrases.items():
+        nouns = {noun: noun + ('s' if len(nutrients) > 1 else '') for noun in VIOLATION_NOUNS}
+        strings.append(VIOLATION_TEMPLATES[(kind, threshold)].format(
+            nutrients=generate_list_string(nutrients), amount=value, percent=value,
+            over=to_number(value) - 100 if value is not None else None, **nouns))
+    return generate_list_string(strings)
+
+
+# "sodium under 2300 mg", "protein at least 150", "at least 90% of my protein goal", "no more than 120 percent fat".
+# Commas, semicolons and "and" separate rules; "reset" goes back to the defaults.
+RULE_NUTRIENTS = {'calorie': 'calorie', 'calories': 'calorie', 'protein': 'protein', 'carb': 'carbohydrate',
+                  'carbs': 'carbohydrate', 'carbohydrate': 'carbohydrate', 'carbohydrates': 'carbohydrate',
+                  'fat': 'fat', 'fiber': 'fiber', 'fibre': 'fiber', 'sugar': 'sugar', 'sodium': 'sodium',
+                  'salt': 'sodium'}
+RULE_KINDS = {'under': 'limit', 'below': 'limit', 'at most': 'limit', 'no more than': 'limit', 'up to': 'limit',
+              'less than': 'limit', 'over': 'floor', 'above': 'floor', 'at least': 'floor', 'no less than': 'floor',
+              'more than': 'floor'}
+RULE_RESET = ('reset', 'default', 'defaults', 'the defaults')
+RULE_MAX_PERCENT = 1000
+RULE_SEPARATOR = re.compile(r'\s*(?:[,;]|\band\b)\s*')
+RULE_NAME = r'(?:my\s+)?(' + '|'.join(sorted(RULE_NUTRIENTS, key=len, reverse=True)) + r')(?:\s+goal)?'
+RULE_KIND = r'(' + '|'.join(sorted(RULE_KINDS, key=len, reverse=True)) + r')'
+RULE_AMOUNT = r'(\d+(?:\.\d+)?)\s*(%|percent)?(?:\s*(?:grams?|g|milligrams?|mg|calories|kcal))?'
+RULE_NAME_FIRST = re.compile(r'^' + RULE_NAME + r'\s+' + RULE_KIND + r'\s+' + RULE_AMOUNT +
+                             r'(?:\s+of\s+(?:my|the)\s+goal)?$')
+RULE_NAME_LAST = re.compile(r'^' + RULE_KIND + r'\s+' + RULE_AMOUNT + r'\s+(?:of\s+)?' + RULE_NAME + '$')
+
+
+def parse_violation_rules(text):
+    """
+    Read the rules a user said into rule dicts. Returns (rules, chunk), where chunk is the first part that could not
+    be read, or None; asking for the defaults back gives no rules at all.
+    """
+
+    text = ' '.join(text.lower().split())
+    if text in RULE_RESET:
+        return [], None
+    rules = []
+    for chunk in RULE_SEPARATOR.split(text):
+        if not chunk:
+            continue
+        match = RULE_NAME_FIRST.match(chunk)
+        if match is not None:
+            nutrient, kind, amount, percent = match.groups()
+        else:
+            match = RULE_NAME_LAST.match(chunk)
+            if match is None:
+                return rules, chunk
+            kind, amount, percent, nutrient = match.groups()
+        rule = {'nutrient': RULE_NUTRIENTS[nutrient], 'kind': RULE_KINDS[kind]}
+        rule['percent' if percent else 'amount'] = to_number(amount)
+        rules.append(rule)
+    if not rules:
+        return rules, text
+    return rules, None
+
+
+def merge_violation_rules(own_rules, rules):
+    """
+    Return the user's violationRules with rules added, each replacing their rule for the same nutrient and kind. No
+    rules clears them, so the defaults apply again.
+    """
+
+    if not rules:
+        return []
+    replaced = set((rule['nutrient'], rule['kind']) for rule in rules)
+    return [rule for rule in own_rules if (rule.get('nutrient'), rule.get('kind')) not in replaced] + list(rules)
+
+
+def generate_own_rules_string(rules):
+    if not rules:
+        return 'the default limits'
+    phrases = []
+    for rule in rules:
+        bound = 'at most' if rule['kind'] == 'limit' else 'at least'
+        if 'amount' in rule:
+            phrases.append('{} {} {}'.format(rule['nutrient'], bound, rule['amount']))
+        else:
+            phrases.append('{} {} {}% of your goal'.format(rule['nutrient'], bound, rule['percent']))
+    return generate_list_string(phrases)
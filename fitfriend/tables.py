@@ -0,0 +1,178 @@
+"""
+DynamoDB tables shared by the hooks, wrapped so every call is counted in the invocation's CloudWatch Embedded Metric
+Format record.
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from decimal import Decimal
+
+import boto3
+
+metrics = threading.local()
+READ_OPERATIONS = ('get_item', 'query', 'scan', 'batch_get_item')
+BATCH_GET_ATTEMPTS = 5
+metrics_logger = logging.getLogger('metrics')
+metrics_logger.propagate = False
+metrics_logger.setLevel(logging.INFO)
+if not metrics_logger.handlers:
+    metrics_logger.addHandler(logging.StreamHandler(sys.stdout))
+
+
+def estimate_value_size(value):
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (int, float, Decimal)):
+        return (max(len(str(abs(value)).replace('.', '').strip('0')), 1) + 1) // 2 + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(key.encode('utf-8')) + estimate_value_size(item) + 1 for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(estimate_value_size(item) + 1 for item in value)
+    if isinstance(value, (set, frozenset)):
+        return sum(estimate_value_size(item) for item in value)
+    return len(getattr(value, 'value', b''))
+
+
+def estimate_item_size(item):
+    if not item:
+        return 0
+    return sum(len(key.encode('utf-8')) + estimate_value_size(value) for key, value in item.items())
+
+
+def start_invocation_metrics():
+    metrics.calls = []
+
+
+def record_table_call(table_name, operation, latency, item_bytes, response):
+    if getattr(metrics, 'calls', None) is None:
+        return
+    capacity = float(response.get('ConsumedCapacity', {}).get('CapacityUnits', 0))
+    is_read = operation in READ_OPERATIONS
+    metrics.calls.append({
+        'table': table_name,
+        'operation': operation,
+        'latencyMs': round(latency * 1000, 3),
+        'itemBytes': item_bytes,
+        'readCapacityUnits': capacity if is_read else 0.0,
+        'writeCapacityUnits': 0.0 if is_read else capacity,
+    })
+
+
+def emit_invocation_metrics(intent_request):
+    """
+    Log one CloudWatch Embedded Metric Format record summarizing every table call of this invocation.
+    """
+
+    calls = getattr(metrics, 'calls', None) or []
+    metrics.calls = None
+    reads = [call for call in calls if call['operation'] in READ_OPERATIONS]
+    writes = [call for call in calls if call['operation'] not in READ_OPERATIONS]
+    names = ['DynamoDBCalls', 'DynamoDBReads', 'DynamoDBWrites', 'DynamoDBLatency', 'ReadCapacityUnits',
+             'WriteCapacityUnits', 'ItemBytesRead', 'ItemBytesWritten']
+    units = ['Count', 'Count', 'Count', 'Milliseconds', 'Count', 'Count', 'Bytes', 'Bytes']
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': 'FitFriend',
+                'Dimensions': [['IntentName', 'InvocationSource']],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, unit in zip(names, units)],
+            }],
+        },
+        'IntentName': intent_request['currentIntent']['name'],
+        'InvocationSource': intent_request['invocationSource'],
+        'DynamoDBCalls': len(calls),
+        'DynamoDBReads': len(reads),
+        'DynamoDBWrites': len(writes),
+        'DynamoDBLatency': round(sum(call['latencyMs'] for call in calls), 3),
+        'ReadCapacityUnits': sum(call['readCapacityUnits'] for call in calls),
+        'WriteCapacityUnits': sum(call['writeCapacityUnits'] for call in calls),
+        'ItemBytesRead': sum(call['itemBytes'] for call in reads),
+        'ItemBytesWritten': sum(call['itemBytes'] for call in writes),
+        'calls': calls,
+    }
+    metrics_logger.info(json.dumps(record))
+
+
+class InstrumentedTable(object):
+    """
+    Wraps a boto3 Table so every call reports its latency, item bytes and consumed capacity.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+    def call(self, operation, **kwargs):
+        kwargs['ReturnConsumedCapacity'] = 'TOTAL'
+        started = time.time()
+        response = getattr(self.table, operation)(**kwargs)
+        latency = time.time() - started
+        if operation == 'put_item':
+            item_bytes = estimate_item_size(kwargs['Item'])
+        elif operation == 'update_item':
+            item_bytes = estimate_item_size(kwargs.get('ExpressionAttributeValues'))
+        elif 'Items' in response:
+            item_bytes = sum(estimate_item_size(item) for item in response['Items'])
+        else:
+            item_bytes = estimate_item_size(response.get('Item'))
+        record_table_call(self.table.name, operation, latency, item_bytes, response)
+        return response
+
+    def get_item(self, **kwargs):
+        return self.call('get_item', **kwargs)
+
+    def put_item(self, **kwargs):
+        return self.call('put_item', **kwargs)
+
+    def update_item(self, **kwargs):
+        return self.call('update_item', **kwargs)
+
+    def delete_item(self, **kwargs):
+        return self.call('delete_item', **kwargs)
+
+    def query(self, **kwargs):
+        return self.call('query', **kwargs)
+
+    def scan(self, **kwargs):
+        return self.call('scan', **kwargs)
+
+    def batch_get_item(self, keys):
+        """
+        Fetch up to 100 keys of this table with one BatchGetItem, retrying with backoff whatever DynamoDB leaves
+        unprocessed.
+        """
+
+        items = []
+        request = {self.table.name: {'Keys': keys}}
+        for attempt in range(BATCH_GET_ATTEMPTS):
+            started = time.time()
+            response = dynamodb.batch_get_item(RequestItems=request, ReturnConsumedCapacity='TOTAL')
+            latency = time.time() - started
+            batch = response['Responses'].get(self.table.name, [])
+            capacity = sum(float(consumed.get('CapacityUnits', 0)) for consumed in response.get('ConsumedCapacity', []))
+            record_table_call(self.table.name, 'batch_get_item', latency,
+                              sum(estimate_item_size(item) for item in batch),
+                              {'ConsumedCapacity': {'CapacityUnits': capacity}})
+            items.extend(batch)
+            request = response.get('UnprocessedKeys')
+            if not request:
+                return items
+            time.sleep(0.05 * 2 ** attempt)
+        raise Exception('BatchGetItem left {} keys unprocessed'.format(len(request[self.table.name]['Keys'])))
+
+
+dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+users = InstrumentedTable(dynamodb.Table('Users'))
+foods = InstrumentedTable(dynamodb.Table('Foods'))
+exercises = InstrumentedTable(dynamodb.Table('Exercises'))
+archive = InstrumentedTable(dynamodb.Table('UsersArchive'))
@@ -0,0 +1,9 @@
+"""
+Phrasing shared by the hooks' replies.
+"""
+
+
+def generate_list_string(items):
+    if len(items) == 1:
+        return items[0]
+    return ', '.join(items[:-1]) + ' and ' + items[-1]
@@ -0,0 +1,50 @@
+import os
+import random
+import sys
+
+import pytest
+
+# The hooks, the fitfriend package and the tooling scripts all live at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import FakeDynamoDB  # noqa: E402
+import LexEventHarness  # noqa: E402
+
+
+@pytest.fixture
+def fake():
+    """
+    An empty DynamoDB stand-in holding the universal catalog, installed into every hook of a cold container.
+    """
+
+    fake = FakeDynamoDB.FakeDynamoDB()
+    LexEventHarness.seed_catalog(fake)
+    LexEventHarness.prepare(fake)
+    return fake
+
+
+@pytest.fixture
+def user(fake):
+    """
+    A Users item with two weeks of history and today already logged, stored in the stand-in.
+    """
+
+    return LexEventHarness.seed_user(fake, 'test-user', 14, random.Random(0))
+
+
+@pytest.fixture
+def invoke(user):
+    """
+    Send one Lex event for the seeded user to the hook that owns its intent and return the hook's response.
+    """
+
+    def invoke(intent_name, slots, source='FulfillmentCodeHook', confirmation_status='None',
+               session_attributes=None, slot_details=None):
+        event = LexEventHarness.build_event(user['user'], intent_name, slots, source, confirmation_status,
+                                            session_attributes or {})
+        # What the user actually said, where Lex resolved it to something shorter.
+        for slot, original_value in (slot_details or {}).items():
+            event['currentIntent']['slotDetails'][slot]['originalValue'] = original_value
+        return LexEventHarness.route_to_hook(event, None)
+
+    return invoke
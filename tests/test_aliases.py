@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from fitfriend import aliases
+
+TRIE = aliases.build_alias_trie({'bench press': 'bench press', 'bench': 'bench press', 'ohp': 'overhead press',
+                                 'squat': 'squat', 'back squat': 'squat'})
+
+
+@pytest.mark.parametrize('spoken, canonical', [
+    ('Bench Press', 'bench press'),
+    ('bench', 'bench press'),
+    ('bench presses', 'bench press'),
+    ('OHP', 'overhead press'),
+    ('back-squats', 'squat'),
+    ('  Squat ', 'squat'),
+])
+def test_spoken_names_resolve_to_their_catalog_name(monkeypatch, spoken, canonical):
+    monkeypatch.setattr(aliases, 'exercise_aliases', TRIE)
+    assert aliases.canonical_exercise_name(spoken) == canonical
+
+
+def test_names_the_trie_does_not_know_are_only_lowercased(monkeypatch):
+    monkeypatch.setattr(aliases, 'exercise_aliases', TRIE)
+    # "benchy" runs past the "bench" alias with an ending that is not a plural, so it is not an alias.
+    assert aliases.canonical_exercise_name('Benchy') == 'benchy'
+    assert aliases.canonical_exercise_name('Hip  Thrust') == 'hip thrust'
+
+
+def test_the_shipped_alias_table_loads_as_a_trie():
+    trie = aliases.load_exercise_aliases(aliases.EXERCISE_ALIASES_PATH)
+    node = trie
+    for character in 'military press':
+        node = node[character]
+    assert node[aliases.ALIAS_END] == 'overhead press'
+
+
+def test_aliases_are_logged_under_the_catalog_name(fake, user, invoke):
+    today = time.strftime('%Y-%m-%d')
+    user['dailyNutrientsAndWorkouts'][today]['exerciseLog'] = {}
+    fake.Table('Users').put_item(Item=user)
+    slots = {'Exercise': 'Military Press', 'Weight': '95', 'Reps': '8', 'Sets': '3'}
+    assert invoke('RecordWeightlift', slots, source='DialogCodeHook')['dialogAction']['type'] == 'Delegate'
+    invoke('RecordWeightlift', slots)
+    item = fake.Table('Users').get_item(Key={'user': user['user']})['Item']
+    log = item['dailyNutrientsAndWorkouts'][today]['exerciseLog']
+    assert [entry['ExerciseName'] for entry in log.values()] == ['overhead press']
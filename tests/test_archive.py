@@ -0,0 +1,90 @@
+import time
+
+import FakeDynamoDB
+from fitfriend import archive
+
+RUN = {'Distance': '5', 'Duration': 'PT30M', 'Incline': '0'}
+
+
+def stored_user(fake, user):
+    return fake.Table('Users').get_item(Key={'user': user['user']})['Item']
+
+
+def test_months_past_the_recent_window_are_selected_for_archival(user, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_KEEP_DAYS', 0)
+    history = user['dailyNutrientsAndWorkouts']
+    recent = sorted(history)
+    history['2020-01-15'] = history['2020-01-16'] = history[recent[0]]
+    assert archive.select_days_to_archive(user, archive.ITEM_SIZE_TARGET) == ['2020-01-15', '2020-01-16']
+
+
+def test_an_item_past_the_archive_threshold_sheds_its_oldest_days(user, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_KEEP_DAYS', 7)
+    recent = sorted(user['dailyNutrientsAndWorkouts'])
+    assert archive.select_days_to_archive(user, archive.ITEM_SIZE_ARCHIVE) == []
+    assert archive.select_days_to_archive(user, archive.ITEM_SIZE_LIMIT) == recent[:7]
+
+
+def test_writes_archive_the_days_the_monitor_selects(fake, user, invoke, monkeypatch):
+    # Every item is now past the threshold, so the write leaves only the kept days in the Users item.
+    monkeypatch.setattr(archive, 'ARCHIVE_KEEP_DAYS', 7)
+    monkeypatch.setattr(archive, 'ITEM_SIZE_ARCHIVE', 0)
+    monkeypatch.setattr(archive, 'ITEM_SIZE_TARGET', 0)
+    days = sorted(user['dailyNutrientsAndWorkouts'])
+    invoke('RecordRun', RUN)
+    item = stored_user(fake, user)
+    assert sorted(item['dailyNutrientsAndWorkouts']) == days[7:]
+    assert item['archivedMonths'] == set(day[:7] for day in days[:7])
+    archived = {}
+    for month in item['archivedMonths']:
+        archived.update(archive.load_archived_month(user['user'], month)[0])
+    assert sorted(archived) == days[:7]
+    assert time.strftime('%Y-%m-%d') in item['dailyNutrientsAndWorkouts']
+
+
+def archive_items(fake, user_id):
+    return {item['month']: item for item in fake.Table('UsersArchive').scan()['Items'] if item['user'] == user_id}
+
+
+def test_months_round_trip_through_chunks_and_replace_their_old_generation(fake, user, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_CHUNK_BYTES', 64)
+    days = dict(user['dailyNutrientsAndWorkouts'])
+    archive.store_archived_month(user['user'], '2020-01', days, None)
+    loaded, head = archive.load_archived_month(user['user'], '2020-01')
+    assert loaded == days
+    assert head['generation'] == 1 and head['chunks'] > 1
+    assert len(archive_items(fake, user['user'])) == head['chunks']
+
+    # Fewer days make a shorter blob; the first generation's trailing chunks are deleted once the head moves on.
+    fewer = dict(sorted(days.items())[:2])
+    archive.store_archived_month(user['user'], '2020-01', fewer, head)
+    loaded, head = archive.load_archived_month(user['user'], '2020-01')
+    assert loaded == fewer
+    assert head['generation'] == 2
+    assert sorted(archive_items(fake, user['user'])) == ['2020-01'] + [
+        '2020-01#2#{}'.format(index) for index in range(1, int(head['chunks']))]
+
+
+def test_months_round_trip_through_a_local_object_store(user, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_DIRECTORY', str(tmp_path))
+    days = dict(user['dailyNutrientsAndWorkouts'])
+    archive.store_archived_month(user['user'], '2020-01', days, None)
+    assert archive.load_archived_month(user['user'], '2020-01') == (days, None)
+    assert archive.load_archived_month(user['user'], '2020-02') == ({}, None)
+
+
+def test_day_information_fetches_only_the_archived_month_it_asks_for(fake, user, invoke):
+    history = user['dailyNutrientsAndWorkouts']
+    recent = sorted(history)
+    for month in ('2020-01', '2020-02'):
+        archive.store_archived_month(user['user'], month, {month + '-15': history[recent[0]]}, None)
+    user['archivedMonths'] = {'2020-01', '2020-02'}
+    fake.Table('Users').put_item(Item=user)
+
+    FakeDynamoDB.start_recording()
+    response = invoke('GetDayInformation', {'Day': '2020-02-15'}, source='DialogCodeHook')
+    calls = FakeDynamoDB.stop_recording()['calls']
+    assert response['dialogAction']['type'] == 'Delegate'
+    assert calls.get('UsersArchive.Query') == 1
+    response = invoke('GetDayInformation', {'Day': '2020-03-15'}, source='DialogCodeHook')
+    assert response['dialogAction']['slotToElicit'] == 'Day'
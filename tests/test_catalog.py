@@ -0,0 +1,107 @@
+import time
+
+import CatalogSync
+import FakeDynamoDB
+from fitfriend import catalog
+from fitfriend.tables import exercises
+
+NAMES = ['bench press', 'leg press', 'deadlift', 'overhead press', 'pull up']
+
+
+def test_name_matcher_forgives_typos_dropped_and_swapped_letters():
+    matcher = catalog.NameMatcher(NAMES)
+    assert matcher.rank('bench prses', 2)[0][2] == 'bench press'
+    assert matcher.rank('dedlift', 2)[0][2] == 'deadlift'
+    assert matcher.rank('pull pu', 1)[0][2] == 'pull up'
+    assert matcher.rank('squat', 1) == []
+
+
+def test_unknown_exercise_is_answered_with_the_closest_name(invoke):
+    slots = {'Exercise': 'dedlift', 'Weight': '315', 'Reps': '5', 'Sets': '3'}
+    response = invoke('RecordWeightlift', slots, source='DialogCodeHook')
+    assert response['dialogAction']['type'] == 'ConfirmIntent'
+    assert response['dialogAction']['slots']['Exercise'] == 'deadlift'
+
+
+def test_universal_matcher_is_rebuilt_only_for_a_new_catalog_version(fake):
+    FakeDynamoDB.start_recording()
+    matcher = catalog.get_universal_matcher(exercises, 'ExerciseName')
+    calls = FakeDynamoDB.stop_recording()['calls']
+    # The names come from the prefetched catalog, not a names-only Query of their own.
+    assert calls == {'Exercises.GetItem': 1, 'Exercises.Query': 1}
+    assert catalog.get_universal_matcher(exercises, 'ExerciseName') is matcher
+
+    # The same version read again after the cache window keeps the matcher.
+    checked_at, version, items, bloom = catalog.universal_catalogs['ExerciseName']
+    catalog.universal_catalogs['ExerciseName'] = (0, version, items, bloom)
+    assert catalog.get_universal_matcher(exercises, 'ExerciseName') is matcher
+
+    stamp = fake.Table('Exercises').get_item(Key={'UserID': 'catalog', 'ExerciseName': 'version'})['Item']
+    fake.Table('Exercises').put_item(Item=dict(stamp, Version=stamp['Version'] + 1))
+    catalog.universal_catalogs['ExerciseName'] = (0, version, items, bloom)
+    assert catalog.get_universal_matcher(exercises, 'ExerciseName') is not matcher
+
+
+def lookup(name, session_attributes=None):
+    FakeDynamoDB.start_recording()
+    item = catalog.get_catalog_item(name, exercises, 'ExerciseName',
+                                    {'userId': 'test-user', 'sessionAttributes': session_attributes or {}})
+    return item, FakeDynamoDB.stop_recording()['calls']
+
+
+def test_bloom_filter_holds_every_name_it_was_built_from():
+    names = ['exercise {}'.format(number) for number in range(2000)]
+    bloom = catalog.BloomFilter(CatalogSync.build_bloom(names))
+    assert all(name in bloom for name in names)
+    misses = ['unknown {}'.format(number) for number in range(2000)]
+    assert sum(name in bloom for name in misses) < 2000 * 0.03
+
+
+def test_names_missing_everywhere_are_not_looked_up_again(user):
+    assert lookup('face pull')[0] is None
+    item, calls = lookup('face pull')
+    assert item is None and calls == {}
+    # Adding to the catalog in this session lets the name be found again.
+    item, calls = lookup('face pull', {'catalogUpdatedAt': str(time.time() + 1)})
+    assert item is None and calls
+
+
+def test_bloom_filter_skips_the_universal_read_for_unknown_names(user, monkeypatch):
+    # Too large to prefetch, so every lookup that the filter cannot rule out reads DynamoDB.
+    monkeypatch.setattr(catalog, 'CATALOG_PREFETCH_ITEMS', 0)
+    item, calls = lookup('face pull')
+    assert item is None
+    # Only the stamp and the user's own partition are read; the universal get_item is skipped.
+    assert calls == {'Exercises.GetItem': 1, 'Exercises.Query': 1}
+    item, calls = lookup('squat')
+    assert item['ExerciseName'] == 'squat' and calls == {'Exercises.GetItem': 1}
+
+
+def test_user_catalog_is_prefetched_once_per_catalog_update(fake):
+    table = fake.Table('Exercises')
+    for name in ('zercher squat', 'jefferson curl'):
+        table.put_item(Item={'UserID': 'test-user', 'ExerciseName': name})
+    request = {'userId': 'test-user', 'sessionAttributes': {}}
+    assert catalog.get_user_catalog(exercises, 'ExerciseName', request, prefetch=False) == (None, False)
+
+    FakeDynamoDB.start_recording()
+    items, fresh = catalog.get_user_catalog(exercises, 'ExerciseName', request)
+    assert FakeDynamoDB.stop_recording()['calls'] == {'Exercises.Query': 1}
+    assert sorted(items) == ['jefferson curl', 'zercher squat'] and fresh
+    FakeDynamoDB.start_recording()
+    assert catalog.get_user_catalog(exercises, 'ExerciseName', request) == (items, False)
+    assert FakeDynamoDB.stop_recording()['calls'] == {}
+
+    # CreateExercise bumps catalogUpdatedAt, so the next lookup sees the new exercise.
+    table.put_item(Item={'UserID': 'test-user', 'ExerciseName': 'sissy squat'})
+    request['sessionAttributes']['catalogUpdatedAt'] = str(time.time())
+    items, fresh = catalog.get_user_catalog(exercises, 'ExerciseName', request)
+    assert 'sissy squat' in items and fresh
+
+
+def test_user_catalogs_too_large_to_prefetch_fall_back_to_single_reads(fake, monkeypatch):
+    monkeypatch.setattr(catalog, 'CATALOG_PREFETCH_ITEMS', 1)
+    for name in ('zercher squat', 'jefferson curl'):
+        fake.Table('Exercises').put_item(Item={'UserID': 'test-user', 'ExerciseName': name})
+    request = {'userId': 'test-user', 'sessionAttributes': {}}
+    assert catalog.get_user_catalog(exercises, 'ExerciseName', request) == (None, True)
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import CatalogSync
+import FakeDynamoDB
+
+FOODS = [
+    {'FoodName': 'banana', 'Serving': '118', 'Calorie': '105', 'Protein': '1', 'Carbohydrate': '27', 'Fat': '0'},
+    {'FoodName': 'egg', 'Serving': '50', 'Calorie': '72', 'Protein': '6', 'Carbohydrate': '0', 'Fat': '5'},
+]
+
+
+def write_foods(directory, version, items):
+    with open(str(directory / 'foods.json'), 'w') as data_file:
+        json.dump({'version': version, 'items': items}, data_file)
+
+
+def universal_names(fake):
+    return sorted(item['FoodName'] for item in fake.Table('Foods').scan()['Items'] if item['UserID'] == 'universal')
+
+
+def test_diff_catalog_puts_changed_items_and_prunes_only_when_asked():
+    current = {'banana': FOODS[0], 'apple': {'FoodName': 'apple'}}
+    desired = {'banana': FOODS[0], 'egg': FOODS[1]}
+    assert CatalogSync.diff_catalog(current, desired, False) == ([FOODS[1]], [])
+    assert CatalogSync.diff_catalog(current, desired, True) == ([FOODS[1]], ['apple'])
+    changed = dict(desired, banana=dict(FOODS[0], Calorie='110'))
+    assert CatalogSync.diff_catalog(current, changed, False)[0] == [changed['banana'], FOODS[1]]
+
+
+def test_sync_stamps_the_version_and_rerunning_costs_one_read(tmp_path):
+    fake = FakeDynamoDB.FakeDynamoDB()
+    write_foods(tmp_path, 1, FOODS)
+    result = CatalogSync.sync_catalog(fake, 'foods', str(tmp_path))
+    assert result['changed'] and result['puts'] == 2
+    assert universal_names(fake) == ['banana', 'egg']
+    stamp = CatalogSync.get_version(fake.Table('Foods'), 'FoodName')
+    assert stamp['Version'] == 1 and stamp['Digest'] == CatalogSync.catalog_digest({item['FoodName']: item
+                                                                                     for item in FOODS})
+
+    FakeDynamoDB.start_recording()
+    result = CatalogSync.sync_catalog(fake, 'foods', str(tmp_path))
+    assert FakeDynamoDB.stop_recording()['calls'] == {'Foods.GetItem': 1}
+    assert not result['changed']
+
+
+def test_sync_refuses_edits_without_a_version_bump_and_older_files(tmp_path):
+    fake = FakeDynamoDB.FakeDynamoDB()
+    write_foods(tmp_path, 2, FOODS)
+    CatalogSync.sync_catalog(fake, 'foods', str(tmp_path))
+    write_foods(tmp_path, 2, FOODS[:1])
+    with pytest.raises(CatalogSync.CatalogError, match='without a version bump'):
+        CatalogSync.sync_catalog(fake, 'foods', str(tmp_path))
+    write_foods(tmp_path, 1, FOODS)
+    with pytest.raises(CatalogSync.CatalogError, match='newer than'):
+        CatalogSync.sync_catalog(fake, 'foods', str(tmp_path))
+
+    write_foods(tmp_path, 3, FOODS[:1])
+    result = CatalogSync.sync_catalog(fake, 'foods', str(tmp_path), prune=True)
+    assert result['deletes'] == 1
+    assert universal_names(fake) == ['banana']
@@ -0,0 +1,66 @@
+import time
+import types
+from decimal import Decimal
+
+import pytest
+
+import RecordRunHook
+
+GOALS = {'CalorieGoal': '2500', 'ProteinGoal': '190', 'CarbohydrateGoal': '250', 'FatGoal': '80'}
+RUN = {'Distance': '5', 'Duration': 'PT30M', 'Incline': '0'}
+
+
+def calories_remaining(fake, user):
+    item = fake.Table('Users').get_item(Key={'user': user['user']})['Item']
+    return item['dailyNutrientsAndWorkouts'][time.strftime('%Y-%m-%d')]['nutritionRemaining']['calorie']
+
+
+@pytest.mark.parametrize('answer, credited', [('yes', True), ('no', False)])
+def test_burned_calories_are_credited_only_when_the_user_chose_it(fake, user, invoke, answer, credited):
+    slots = dict(GOALS, CreditExerciseCalories=answer)
+    assert invoke('SetOwnGoal', slots, source='DialogCodeHook')['dialogAction']['type'] == 'Delegate'
+    invoke('SetOwnGoal', slots)
+    item = fake.Table('Users').get_item(Key={'user': user['user']})['Item']
+    assert item['creditExerciseCalories'] is credited
+
+    before = calories_remaining(fake, user)
+    message = invoke('RecordRun', RUN)['dialogAction']['message']['content']
+    assert 'That burned about' in message
+    assert ('added back' in message) is credited
+    assert (calories_remaining(fake, user) > before) is credited
+
+
+def test_unclear_answers_are_elicited_again(invoke):
+    response = invoke('SetOwnGoal', dict(GOALS, CreditExerciseCalories='maybe'), source='DialogCodeHook')
+    assert response['dialogAction']['slotToElicit'] == 'CreditExerciseCalories'
+
+
+def test_runs_logged_in_the_same_second_keep_their_own_entries(fake, user, invoke, monkeypatch):
+    # The hook's own time zone, so the frozen moment falls on the day it reads and writes.
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    now = time.localtime()
+    monkeypatch.setattr(RecordRunHook, 'time', types.SimpleNamespace(
+        strftime=lambda format, moment=now: time.strftime(format, moment), tzset=time.tzset))
+    user['dailyNutrientsAndWorkouts'][time.strftime('%Y-%m-%d')]['exerciseLog'] = {}
+    fake.Table('Users').put_item(Item=user)
+    invoke('RecordRun', RUN)
+    invoke('RecordRun', dict(RUN, Distance='3'))
+    item = fake.Table('Users').get_item(Key={'user': user['user']})['Item']
+    log = item['dailyNutrientsAndWorkouts'][time.strftime('%Y-%m-%d')]['exerciseLog']
+    assert sorted(entry['Distance'] for entry in log.values()) == [3, 5]
+
+
+def test_runs_store_numbers_and_leave_out_a_missing_incline(fake, user, invoke):
+    user['dailyNutrientsAndWorkouts'][time.strftime('%Y-%m-%d')]['exerciseLog'] = {}
+    fake.Table('Users').put_item(Item=user)
+    invoke('RecordRun', {'Distance': '5.5', 'Duration': 'PT30M', 'Incline': None})
+    item = fake.Table('Users').get_item(Key={'user': user['user']})['Item']
+    run, = item['dailyNutrientsAndWorkouts'][time.strftime('%Y-%m-%d')]['exerciseLog'].values()
+    assert run['Distance'] == Decimal('5.5')
+    assert 'Incline' not in run
+
+
+def test_unreadable_distance_is_elicited_again(invoke):
+    response = invoke('RecordRun', dict(RUN, Distance='far'), source='DialogCodeHook')
+    assert response['dialogAction']['slotToElicit'] == 'Distance'
@@ -0,0 +1,69 @@
+import BuildFoodIndex
+import HistoryImport
+import pytest
+from fitfriend import foods
+from fitfriend.catalog import NameMatcher
+
+# (name, serving grams, calorie, protein, carbohydrate, fat, fiber, sugar, sodium) as BuildFoodIndex writes them.
+INDEX_FOODS = [
+    ('quinoa', 185, 222, 8, 39, 4, 5, 2, 13),
+    ('tempeh', 100, 192, 20, 8, 11, 0, 0, 9),
+]
+
+
+@pytest.fixture
+def food_index(tmp_path, monkeypatch):
+    path = str(tmp_path / 'foods.idx')
+    BuildFoodIndex.write_index(INDEX_FOODS, path)
+    index = foods.load_food_index(path)
+    monkeypatch.setattr(foods, 'food_index', index)
+    return index
+
+
+def test_create_food_rejects_a_name_the_index_holds(fake, food_index, invoke):
+    slots = {'FoodName': 'Tempeh', 'Serving': '100', 'Calorie': '190', 'Protein': '20', 'Carbohydrate': '8',
+             'Fat': '11'}
+    response = invoke('CreateFoods', slots, source='DialogCodeHook', confirmation_status='Confirmed')
+    assert response['dialogAction']['type'] == 'ElicitSlot'
+    assert response['dialogAction']['slotToElicit'] == 'FoodName'
+    assert fake.Table('Foods').get_item(Key={'UserID': 'test-user', 'FoodName': 'Tempeh'}).get('Item') is None
+
+
+def test_recipe_ingredients_come_from_the_index(fake, food_index, invoke):
+    slots = {'RecipeName': 'quinoa bowl', 'Ingredients': '370 grams of quinoa and a banana', 'Servings': '2'}
+    response = invoke('CreateRecipe', slots, source='DialogCodeHook')
+    assert response['dialogAction']['type'] == 'Delegate'
+    invoke('CreateRecipe', slots)
+    recipe = fake.Table('Foods').get_item(Key={'UserID': 'test-user', 'FoodName': 'quinoa bowl'})['Item']
+    assert [ingredient['FoodName'] for ingredient in recipe['Ingredients']] == ['quinoa', 'banana']
+    # Two servings of quinoa split over two servings of the bowl, plus half a banana.
+    assert int(recipe['Calorie']) > 222
+
+
+def test_recipe_name_cannot_shadow_an_index_food(food_index, invoke):
+    slots = {'RecipeName': 'quinoa', 'Ingredients': 'a banana', 'Servings': '1'}
+    response = invoke('CreateRecipe', slots, source='DialogCodeHook')
+    assert response['dialogAction']['slotToElicit'] == 'RecipeName'
+
+
+def test_unknown_food_suggests_an_index_name(food_index, invoke):
+    slots = {'FoodName': 'quinao', 'Measurement': '1', 'MeasurementType': 'servings'}
+    response = invoke('RecordMeal', slots, source='DialogCodeHook')
+    assert response['dialogAction']['type'] == 'ConfirmIntent'
+    assert response['dialogAction']['slots']['FoodName'] == 'quinoa'
+
+
+def test_index_suggestions_come_from_its_stored_trigram_postings(food_index):
+    matcher = food_index.name_matcher()
+    assert isinstance(matcher, foods.FoodIndexMatcher)
+    assert [food_index.name(food_index.record(position)) for position in food_index.trigram_positions('emp')] == [
+        b'tempeh']
+    assert matcher.rank('tempe', 1) == NameMatcher(food_index.names()).rank('tempe', 1) == [(1, -5, 'tempeh')]
+
+
+def test_history_import_uses_index_foods_without_creating_them(fake, food_index):
+    catalog = HistoryImport.Catalog(fake, 'test-user', HistoryImport.ImportStats())
+    entry = {'FoodName': 'quinoa', 'Measurement': 2, 'MeasurementType': 'servings'}
+    assert catalog.resolve_foods([('quinoa', entry, None)]) == []
+    assert entry['FoodNutrition']['calorie'] == 444
+    assert fake.Table('Foods').get_item(Key={'UserID': 'test-user', 'FoodName': 'quinoa'}).get('Item') is None
@@ -0,0 +1,3 @@
+def test_help_lists_exercises_for_a_muscle_group(invoke):
+    content = invoke('Help', {})['dialogAction']['message']['content']
+    assert "'Exercises for #MUSCLEGROUP'" in content
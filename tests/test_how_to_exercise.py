@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import HowToExerciseHook
+from fitfriend import catalog
+
+INTRODUCTION = 'Here\'s what I do know: '
+MORE = ' Say "more" to hear the rest.'
+
+
+def universal_exercises(fake):
+    return sorted(item['ExerciseName'] for item in fake.Table('Exercises').scan()['Items']
+                  if item['UserID'] == 'universal')
+
+
+def listed_exercises(message):
+    message = message.split(INTRODUCTION)[-1]
+    if message.endswith(MORE):
+        message = message[:-len(MORE)]
+    return [name for group in message.rstrip('.').split('. ') for name in group.split(': ', 1)[1].split(', ')]
+
+
+def list_every_page(invoke):
+    response = invoke('GetHowToExercise', {'Exercise': 'juggling'}, source='DialogCodeHook')
+    pages = [response['dialogAction']['message']['content']]
+    while 'exerciseListCursor' in response['sessionAttributes']:
+        assert pages[-1].endswith(MORE)
+        response = invoke('GetHowToExercise', {'Exercise': 'more'}, source='DialogCodeHook',
+                          session_attributes=response['sessionAttributes'])
+        assert response['dialogAction']['slotToElicit'] == 'Exercise'
+        pages.append(response['dialogAction']['message']['content'])
+    return pages
+
+
+@pytest.mark.parametrize('prefetch_items', [catalog.CATALOG_PREFETCH_ITEMS, 0])
+def test_more_pages_through_every_known_exercise_once(fake, invoke, monkeypatch, prefetch_items):
+    # Small pages, both from the prefetched catalog and from Query pages when it is too large to prefetch.
+    monkeypatch.setattr(HowToExerciseHook, 'EXERCISE_LIST_MAX_CHARS', 60)
+    monkeypatch.setattr(HowToExerciseHook, 'EXERCISE_LIST_QUERY_LIMIT', 5)
+    monkeypatch.setattr(catalog, 'CATALOG_PREFETCH_ITEMS', prefetch_items)
+    pages = list_every_page(invoke)
+    assert len(pages) > 2
+    assert all(len(page) <= len(INTRODUCTION) + 60 + 100 for page in pages)
+    listed = [name for page in pages for name in listed_exercises(page)]
+    assert sorted(listed) == universal_exercises(fake)
+
+
+def test_a_known_exercise_ends_the_listing(invoke, monkeypatch):
+    monkeypatch.setattr(HowToExerciseHook, 'EXERCISE_LIST_MAX_CHARS', 60)
+    response = invoke('GetHowToExercise', {'Exercise': 'juggling'}, source='DialogCodeHook')
+    cursor = json.loads(response['sessionAttributes']['exerciseListCursor'])
+    assert len(cursor) == 2
+    response = invoke('GetHowToExercise', {'Exercise': 'squat'}, source='DialogCodeHook',
+                      session_attributes=response['sessionAttributes'])
+    assert response['dialogAction']['type'] == 'Delegate'
+    assert 'exerciseListCursor' not in response['sessionAttributes']
@@ -0,0 +1,153 @@
+import time
+from decimal import Decimal
+
+import CreateFoodsHook
+import FakeDynamoDB
+from fitfriend.meals import assemble_meal, parse_meal
+from fitfriend.model import Food, NutritionVector
+
+
+def test_parse_meal_reads_units_and_decimals():
+    assert parse_meal('1.5 cups of white rice and 2 eggs') == [
+        (None, {'FoodName': 'white rice', 'Measurement': Decimal('1.5'), 'MeasurementType': 'cups'}),
+        (None, {'FoodName': 'eggs', 'Measurement': 2, 'MeasurementType': 'servings'}),
+    ]
+
+
+def test_recipe_ingredients_take_the_units_a_meal_does(fake, invoke):
+    slots = {'RecipeName': 'rice and eggs', 'Ingredients': '1.5 cups of white rice and 2 eggs', 'Servings': '1'}
+    response = invoke('CreateRecipe', slots, source='DialogCodeHook')
+    assert response['dialogAction']['type'] == 'Delegate'
+    response = invoke('CreateRecipe', slots)
+    assert '1.5 cups of white rice' in response['dialogAction']['message']['content']
+    recipe = fake.Table('Foods').get_item(Key={'UserID': 'test-user', 'FoodName': 'rice and eggs'})['Item']
+    assert recipe['Ingredients'] == [
+        {'FoodName': 'white rice', 'Measurement': Decimal('1.5'), 'MeasurementType': 'cups'},
+        {'FoodName': 'egg', 'Measurement': 2, 'MeasurementType': 'servings'},
+    ]
+    # 360 ml of rice at 0.66 g/ml is 237.6 g, or 308 calories; two eggs add 144.
+    assert recipe['Calorie'] == 452
+    assert recipe['Serving'] == 338
+
+
+def test_meal_names_are_joined_only_when_the_catalog_knows_the_whole_name():
+    parts = parse_meal('2 eggs, 150 grams of peanut butter and jelly and a banana')
+    meal_foods = {'egg': None, 'peanut butter and jelly': None, 'banana': None}
+    entries = assemble_meal(parts, meal_foods)
+    assert [(entry['FoodName'], entry['Measurement']) for entry in entries] == [
+        ('egg', 2), ('peanut butter and jelly', 150), ('banana', 1)]
+    assert [entry['FoodName'] for entry in assemble_meal(parts, {'egg': None})] == [
+        'egg', 'peanut butter', 'jelly', 'banana']
+
+
+def test_a_full_meal_looks_its_foods_up_in_one_batch(fake, user, invoke):
+    for name in ('overnight oats', 'protein shake'):
+        fake.Table('Foods').put_item(Item={'UserID': 'test-user', 'FoodName': name, 'Serving': Decimal(100),
+                                           'Calorie': Decimal(150), 'Protein': Decimal(20),
+                                           'Carbohydrate': Decimal(10), 'Fat': Decimal(3)})
+    slots = {'Meal': '2 eggs, 200 grams of overnight oats and a protein shake'}
+    assert invoke('RecordFullMeal', slots, source='DialogCodeHook')['dialogAction']['type'] == 'Delegate'
+
+    FakeDynamoDB.start_recording()
+    message = invoke('RecordFullMeal', slots)['dialogAction']['message']['content']
+    calls = FakeDynamoDB.stop_recording()['calls']
+    # The eggs come from the universal catalog the dialog turn prefetched; both custom foods share one BatchGetItem.
+    assert calls == {'Users.GetItem': 1, 'Foods.BatchGetItem': 1, 'Users.UpdateItem': 1}
+    assert message.startswith('I logged 2 servings of egg, 200 grams of overnight oats and 1 serving of protein shake')
+    item = fake.Table('Users').get_item(Key={'user': user['user']})['Item']
+    assert [food['FoodName'] for food in item['recentFoods'][:3]] == ['egg', 'overnight oats', 'protein shake']
+
+
+def test_unknown_foods_in_a_meal_are_offered_their_closest_names(invoke):
+    response = invoke('RecordFullMeal', {'Meal': '2 egs and a bananna'}, source='DialogCodeHook')
+    assert response['dialogAction']['type'] == 'ConfirmIntent'
+    assert response['dialogAction']['slots']['Meal'] == '2 servings of egg and 1 serving of banana'
+    response = invoke('RecordFullMeal', {'Meal': '2 eggs and a quokka'}, source='DialogCodeHook')
+    assert response['dialogAction']['slotToElicit'] == 'Meal'
+    assert 'quokka' in response['dialogAction']['message']['content']
+
+
+def test_recipe_dependents_follow_recipes_made_from_recipes():
+    recipe_index = {'granola': ['parfait', 'trail mix'], 'parfait': ['breakfast bowl'], 'banana': ['breakfast bowl']}
+    assert CreateFoodsHook.recipe_dependents(recipe_index, 'granola') == ['parfait', 'trail mix', 'breakfast bowl']
+    assert CreateFoodsHook.recipe_dependents(recipe_index, 'banana') == ['breakfast bowl']
+    assert CreateFoodsHook.recipe_dependents(recipe_index, 'egg') == []
+
+
+def test_build_recipe_stores_one_serving_and_its_ingredients():
+    granola = Food('granola', 50, NutritionVector(200, 5, 30, 8))
+    entries = [{'FoodName': 'granola', 'Measurement': 150, 'MeasurementType': 'grams'}]
+    item = CreateFoodsHook.build_recipe('granola bars', entries, 3, {'granola': granola}, 'test-user')
+    assert item['UserID'] == 'test-user' and item['Servings'] == 3
+    assert item['Serving'] == 50 and item['Calorie'] == 200
+    assert item['Ingredients'] == entries
+
+
+def create_food(invoke, name, calorie):
+    slots = {'FoodName': name, 'Serving': '50', 'Calorie': str(calorie), 'Protein': '5', 'Carbohydrate': '30',
+             'Fat': '8'}
+    return invoke('CreateFoods', slots)['dialogAction']['message']['content']
+
+
+def create_recipe(invoke, name, ingredients):
+    slots = {'RecipeName': name, 'Ingredients': ingredients, 'Servings': '1'}
+    assert invoke('CreateRecipe', slots, source='DialogCodeHook')['dialogAction']['type'] == 'Delegate'
+    invoke('CreateRecipe', slots)
+
+
+def test_changing_a_food_refreshes_every_recipe_built_on_it(fake, invoke):
+    create_food(invoke, 'granola', 200)
+    create_recipe(invoke, 'parfait', '50 grams of granola')
+    create_recipe(invoke, 'breakfast bowl', '1 parfait and 2 eggs')
+    message = create_food(invoke, 'granola', 250)
+    assert 'I also updated parfait and breakfast bowl' in message
+
+    def stored(name):
+        return fake.Table('Foods').get_item(Key={'UserID': 'test-user', 'FoodName': name})['Item']
+    assert stored('parfait')['Calorie'] == 250
+    # Two eggs add 144 calories on top of the refreshed parfait.
+    assert stored('breakfast bowl')['Calorie'] == 394
+
+
+def recent_food(name, resolved_on):
+    return {'FoodName': name, 'Serving': Decimal(100), 'ResolvedOn': resolved_on, 'Calorie': Decimal(100),
+            'Protein': Decimal(5), 'Carbohydrate': Decimal(10), 'Fat': Decimal(3)}
+
+
+def logged_food(name):
+    return {'FoodName': name, 'Measurement': '1', 'MeasurementType': 'servings',
+            'FoodNutrition': {'calorie': Decimal(100), 'protein': Decimal(5), 'carbohydrate': Decimal(10),
+                              'fat': Decimal(3)}}
+
+
+def test_repeat_meal_copies_only_the_meal_time_and_moves_its_foods_to_the_front(fake, user, invoke):
+    today = time.strftime('%Y-%m-%d')
+    day = sorted(user['dailyNutrientsAndWorkouts'])[-2]
+    user['dailyNutrientsAndWorkouts'][day]['foodLog'] = {
+        '03:30:00': logged_food('apple'), '08:15:00': logged_food('egg'), '10:59:59': logged_food('banana'),
+        '11:00:00': logged_food('salmon')}
+    user['dailyNutrientsAndWorkouts'][today]['foodLog'] = {}
+    user['recentFoods'] = [recent_food('oatmeal', today), recent_food('banana', today), recent_food('egg', today),
+                           recent_food('almonds', '2000-01-01')]
+    fake.Table('Users').put_item(Item=user)
+
+    slots = {'MealTime': 'Breakfast', 'Day': day}
+    assert invoke('RepeatMeal', slots, source='DialogCodeHook')['dialogAction']['type'] == 'Delegate'
+    message = invoke('RepeatMeal', slots)['dialogAction']['message']['content']
+    assert message.startswith('I logged 1 serving of egg and 1 serving of banana (')
+    item = fake.Table('Users').get_item(Key={'user': user['user']})['Item']
+    log = item['dailyNutrientsAndWorkouts'][today]['foodLog']
+    assert [log[logged_at]['FoodName'] for logged_at in sorted(log)] == ['egg', 'banana']
+    # The stale almonds row is dropped; the repeated foods move ahead of the oatmeal.
+    assert [food['FoodName'] for food in item['recentFoods']] == ['egg', 'banana', 'oatmeal']
+
+
+def test_repeat_meal_asks_again_for_a_meal_time_or_day_it_cannot_copy(fake, user, invoke):
+    day = sorted(user['dailyNutrientsAndWorkouts'])[-2]
+    user['dailyNutrientsAndWorkouts'][day]['foodLog'] = {'08:15:00': logged_food('egg')}
+    fake.Table('Users').put_item(Item=user)
+    response = invoke('RepeatMeal', {'MealTime': 'brunch', 'Day': day}, source='DialogCodeHook')
+    assert response['dialogAction']['slotToElicit'] == 'MealTime'
+    response = invoke('RepeatMeal', {'MealTime': 'dinner', 'Day': day}, source='DialogCodeHook')
+    assert response['dialogAction']['slotToElicit'] == 'Day'
+    assert 'dinner' in response['dialogAction']['message']['content']
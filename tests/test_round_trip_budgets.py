@@ -0,0 +1,18 @@
+import pytest
+
+import RoundTripBudget
+
+
+@pytest.fixture(scope='module')
+def results():
+    # The budgets are checked in order against one container, the first ones cold, as RoundTripBudget.py runs them.
+    return RoundTripBudget.run()
+
+
+@pytest.mark.parametrize('index', range(len(RoundTripBudget.BUDGETS)),
+                         ids=['{} ({})'.format(budget[0], budget[2]) for budget in RoundTripBudget.BUDGETS])
+def test_round_trip_budget(results, index):
+    budget, reads, writes, error, _ = results[index]
+    assert error is None
+    assert reads <= budget[7], '{} reads, budget {}'.format(reads, budget[7])
+    assert writes <= budget[8], '{} writes, budget {}'.format(writes, budget[8])
@@ -0,0 +1,38 @@
+import ast
+import glob
+import importlib
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Every hook keeps its own root logger, as the shared modules keep theirs.
+PER_MODULE_NAMES = {'logger'}
+
+
+def top_level_names(path):
+    with open(path) as source:
+        tree = ast.parse(source.read())
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            names.update(target.id for target in node.targets if isinstance(target, ast.Name))
+    return names - PER_MODULE_NAMES
+
+
+def test_hooks_import_shared_code_instead_of_copying_it():
+    shared = {}
+    for path in glob.glob(os.path.join(ROOT, 'fitfriend', '*.py')):
+        for name in top_level_names(path):
+            shared[name] = os.path.relpath(path, ROOT)
+    copies = []
+    for path in sorted(glob.glob(os.path.join(ROOT, '*Hook.py'))):
+        for name in sorted(top_level_names(path) & set(shared)):
+            copies.append('{} redefines {} from {}'.format(os.path.basename(path), name, shared[name]))
+    assert copies == []
+
+
+def test_every_hook_imports():
+    for path in sorted(glob.glob(os.path.join(ROOT, '*Hook.py'))):
+        module = importlib.import_module(os.path.basename(path)[:-3])
+        assert callable(module.lambda_handler)
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from fitfriend.rules import merge_violation_rules, parse_violation_rules
+
+GOALS = {'CalorieGoal': '2500', 'ProteinGoal': '190', 'CarbohydrateGoal': '250', 'FatGoal': '80'}
+
+
+def stored_rules(fake, user):
+    return fake.Table('Users').get_item(Key={'user': user['user']})['Item'].get('violationRules')
+
+
+def test_parse_violation_rules():
+    rules, unreadable = parse_violation_rules('Sodium under 2300 mg, at least 150 grams of protein and fat under 120%')
+    assert unreadable is None
+    assert rules == [{'nutrient': 'sodium', 'kind': 'limit', 'amount': 2300},
+                     {'nutrient': 'protein', 'kind': 'floor', 'amount': 150},
+                     {'nutrient': 'fat', 'kind': 'limit', 'percent': 120}]
+    assert parse_violation_rules('carbs whenever') == ([], 'carbs whenever')
+    assert parse_violation_rules('reset') == ([], None)
+
+
+def test_new_rules_replace_the_same_nutrient_and_kind():
+    own = [{'nutrient': 'sodium', 'kind': 'limit', 'amount': 2300}, {'nutrient': 'fat', 'kind': 'limit', 'percent': 90}]
+    assert merge_violation_rules(own, [{'nutrient': 'sodium', 'kind': 'limit', 'amount': 1500}]) == [
+        {'nutrient': 'fat', 'kind': 'limit', 'percent': 90}, {'nutrient': 'sodium', 'kind': 'limit', 'amount': 1500}]
+
+
+def test_rules_set_with_a_goal_are_checked_when_logging_food(fake, user, invoke):
+    # Nothing eaten yet today, so only the new sodium rule can be broken.
+    today = user['dailyNutrientsAndWorkouts'][time.strftime('%Y-%m-%d')]
+    today['nutritionRemaining'] = dict(user['nutrientGoal'])
+    fake.Table('Users').put_item(Item=user)
+    slots = dict(GOALS, NutrientRules='sodium under 100')
+    assert invoke('SetOwnGoal', slots, source='DialogCodeHook')['dialogAction']['type'] == 'Delegate'
+    response = invoke('SetOwnGoal', slots)
+    assert 'sodium at most 100' in response['dialogAction']['message']['content']
+    assert stored_rules(fake, user) == [{'nutrient': 'sodium', 'kind': 'limit', 'amount': 100}]
+
+    meal = {'FoodName': 'chicken breast', 'Measurement': '300', 'MeasurementType': 'grams'}
+    response = invoke('RecordMeal', meal, source='DialogCodeHook')
+    assert response['sessionAttributes']['violationWarning'] == "You're going over your 100 sodium limit!"
+
+    invoke('SetOwnGoal', dict(GOALS, NutrientRules='reset'))
+    assert stored_rules(fake, user) == []
+
+
+def test_unreadable_rules_are_elicited_again(invoke):
+    response = invoke('SetOwnGoal', dict(GOALS, NutrientRules='less pizza'), source='DialogCodeHook')
+    assert response['dialogAction']['type'] == 'ElicitSlot'
+    assert response['dialogAction']['slotToElicit'] == 'NutrientRules'
+
+
+@pytest.mark.parametrize('rules', ['fat under 0.5%', 'protein at least 1001 percent'])
+def test_percentages_outside_the_allowed_range_are_elicited_again(invoke, rules):
+    response = invoke('SetOwnGoal', dict(GOALS, NutrientRules=rules), source='DialogCodeHook')
+    assert response['dialogAction']['slotToElicit'] == 'NutrientRules'
+    assert 'between 1 and 1000' in response['dialogAction']['message']['content']
+
+
+def test_a_one_percent_rule_is_accepted(invoke):
+    response = invoke('SetOwnGoal', dict(GOALS, NutrientRules='fat under 1%'), source='DialogCodeHook')
+    assert response['dialogAction']['type'] == 'Delegate'
@@ -0,0 +1,78 @@
+import time
+import types
+from decimal import Decimal
+
+import pytest
+
+import RecordWeightLiftHook
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    # The hook's own time zone, so the frozen moment falls on the day it reads and writes.
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    now = time.localtime()
+    monkeypatch.setattr(RecordWeightLiftHook, 'time', types.SimpleNamespace(
+        strftime=lambda format, moment=now: time.strftime(format, moment), tzset=time.tzset))
+    return now
+
+
+def measure_in(fake, user, measurement_system):
+    # Today starts with nothing logged, so the entries below land exactly at the frozen time.
+    user['measurementSystem'] = measurement_system
+    user['dailyNutrientsAndWorkouts'][time.strftime('%Y-%m-%d')]['exerciseLog'] = {}
+    fake.Table('Users').put_item(Item=user)
+
+
+def today_log(fake, user):
+    item = fake.Table('Users').get_item(Key={'user': user['user']})['Item']
+    return item['dailyNutrientsAndWorkouts'][time.strftime('%Y-%m-%d')]['exerciseLog']
+
+
+def test_session_weights_are_converted_to_the_users_unit():
+    lifts, unreadable = RecordWeightLiftHook.parse_session('bench press 100 kg x 5, 100x5; squat 3 sets of 5 at '
+                                                           '225 lbs', 'lbs')
+    assert unreadable is None
+    assert lifts[0].weights == [Decimal('220.5'), 100]
+    lifts = RecordWeightLiftHook.parse_session('squat 3 sets of 5 at 225 lbs; deadlift 140kg for 3', 'kgs')[0]
+    assert [lift.weights for lift in lifts] == [[Decimal('102.1')] * 3, [140]]
+
+
+def test_session_in_the_other_unit_is_logged_in_the_users(fake, user, invoke, frozen_clock):
+    measure_in(fake, user, 'metric system')
+    response = invoke('RecordWeightliftSession', {'Session': 'bench press 225 lbs x 5'})
+    assert 'I logged 1 set for 510.5kgs of volume.' in response['dialogAction']['message']['content']
+    logged = today_log(fake, user)[time.strftime('%T', frozen_clock)]
+    assert logged['Weight'] == [Decimal('102.1')]
+
+
+def test_single_lift_takes_the_unit_that_was_said(fake, user, invoke, frozen_clock):
+    measure_in(fake, user, 'imperial system')
+    slots = {'Exercise': 'bench press', 'Weight': '100', 'Reps': '5', 'Sets': '1'}
+    response = invoke('RecordWeightlift', slots, source='DialogCodeHook', slot_details={'Weight': '100 kg'})
+    assert response['dialogAction']['type'] == 'Delegate'
+    invoke('RecordWeightlift', slots, slot_details={'Weight': '100 kg'})
+    invoke('RecordWeightlift', slots)
+    log = today_log(fake, user)
+    # Both lifts were logged in the same second, and neither replaced the other.
+    first = time.strftime('%T', frozen_clock)
+    second = RecordWeightLiftHook.next_log_time({first: None}, first)
+    assert log[first]['Weight'] == [Decimal('220.5')]
+    assert log[second]['Weight'] == [100]
+
+
+def test_and_separates_complete_entries_but_not_names():
+    lifts, unreadable = RecordWeightLiftHook.parse_session('bench press 185x8 and squat 225x5, clean and jerk 100x3 '
+                                                           'and 100x3', 'lbs')
+    assert unreadable is None
+    assert [(lift.name, lift.reps) for lift in lifts] == [('bench press', [8]), ('squat', [5]),
+                                                          ('clean and jerk', [3, 3])]
+
+
+@pytest.mark.parametrize('slot, value', [('Sets', '3.5'), ('Sets', 'three'), ('Reps', '7.5'), ('Reps', '0')])
+def test_unreadable_sets_and_reps_are_elicited_again(invoke, slot, value):
+    slots = dict({'Exercise': 'bench press', 'Weight': '100', 'Reps': '5', 'Sets': '3'}, **{slot: value})
+    response = invoke('RecordWeightlift', slots, source='DialogCodeHook')
+    assert response['dialogAction']['type'] == 'ElicitSlot'
+    assert response['dialogAction']['slotToElicit'] == slot